@@ -6,7 +6,9 @@ import logging
 from typing import Dict, Any
 
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
 
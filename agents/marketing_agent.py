@@ -1,7 +1,7 @@
 # Marketing agent for social media content generation.
 
 import logging
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 
 try:
     from langchain.prompts import PromptTemplate
@@ -9,7 +9,9 @@ except ImportError:
     PromptTemplate = None
 
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
 
@@ -18,52 +20,81 @@ try:
 except ImportError:
     from llm_service_simple import LLMService
 
+from config import LLM_STRUCTURED_OUTPUT
+from structured_output import post_schema, validate_post
+
 logger = logging.getLogger(__name__)
 
 
 class MarketingAgent:
     # Generates marketing content using LLM and performance data.
     
-    MARKETING_PROMPT_TEMPLATE = """You are a social media marketing expert for a music streaming platform.
+    # Static instructions come first so Ollama can reuse their evaluated context across calls
+    MARKETING_PROMPT_PREFIX = """You are a social media marketing expert for a music streaming platform.
+
+Create a short, engaging post (1-2 lines max) that promotes the track below. Include 2-3 relevant hashtags.
+Keep it casual, exciting, and authentic. Use emojis sparingly.
 
-Create an engaging social media post for:
-Track: {track_title}
+"""
+    
+    MARKETING_PROMPT_TEMPLATE = MARKETING_PROMPT_PREFIX + """Track: {track_title}
 Genre: {genre}
 Mood: {mood}
 
 High-performing template example: {best_template}
-Suggested hashtags: {hashtags}
+Suggested hashtags: {hashtags}"""
+    
+    # Structured mode: the post and its hashtags come back as validated JSON
+    MARKETING_JSON_PROMPT_PREFIX = """You are a social media marketing expert for a music streaming platform.
+
+Create a short, engaging post (1-2 lines max) that promotes the track below, with 2-3 relevant hashtags.
+Keep it casual, exciting, and authentic. Use emojis sparingly.
+
+Respond with a JSON object with the keys "post" (the text, without hashtags) and "hashtags" (a list).
+
+"""
+    
+    MARKETING_JSON_PROMPT_TEMPLATE = MARKETING_JSON_PROMPT_PREFIX + """Track: {track_title}
+Genre: {genre}
+Mood: {mood}
 
-Create a short, engaging post (1-2 lines max) that promotes this track. Include 2-3 relevant hashtags.
-Keep it casual, exciting, and authentic. Use emojis sparingly."""
+High-performing template example: {best_template}
+Suggested hashtags: {hashtags}"""
     
     def __init__(self, knowledge_base: KnowledgeBase, llm_service: LLMService):
         self.kb = knowledge_base
         self.llm = llm_service
-        self.chain = self._create_chain()
+        self.chain = None
+        self.structured = LLM_STRUCTURED_OUTPUT
+        self.llm.register_prefix(
+            self.MARKETING_JSON_PROMPT_PREFIX if self.structured else self.MARKETING_PROMPT_PREFIX
+        )
+    
+    def _get_chain(self):
+        # Built on first use so an Ollama that comes up after startup is still picked up
+        if self.chain is None and PromptTemplate and self.llm.is_available():
+            self.chain = self._create_chain()
+        return self.chain
     
     def _create_chain(self):
-        if not self.llm.is_available() or not PromptTemplate:
-            logger.warning("LLM not available, using template-based generation")
-            return None
-        
         prompt = PromptTemplate(
             input_variables=["track_title", "genre", "mood", "best_template", "hashtags"],
             template=self.MARKETING_PROMPT_TEMPLATE
         )
-        return self.llm.create_chain(prompt)
+        return self.llm.create_chain(prompt, caller="MarketingAgent", prefix=self.MARKETING_PROMPT_PREFIX)
     
     def create_post(self, track: Dict[str, str]) -> Dict[str, str]:
         template_data = self._get_best_template(track['genre'])
         hashtags = self._get_hashtags(track['genre'])
         
-        if self.chain:
+        # Structured mode calls the LLM service directly; the chain can't validate and re-ask
+        if self.llm.is_available() and (self.structured or self._get_chain()):
             content = self._generate_with_llm(track, template_data, hashtags)
             if content:
-                return self._build_post_response(content, template_data)
+                return self._build_post_response(content, template_data, track['genre'])
         
         content = self._generate_from_template(track, template_data, hashtags)
-        return self._build_post_response(content, template_data)
+        return self._build_post_response(content, template_data, track['genre'])
     
     def _get_best_template(self, genre: str) -> Dict:
         results = self.kb.query_marketing_templates(genre)
@@ -73,7 +104,8 @@ Keep it casual, exciting, and authentic. Use emojis sparingly."""
             return {
                 "pattern": results['documents'][0][0],
                 "engagement": metadata.get('engagement', 0),
-                "best_time": metadata.get('best_time', '9am')
+                "best_time": metadata.get('best_time', '9am'),
+                "template_id": metadata.get('template_id')
             }
         
         templates = self.kb.get('marketing_templates', [])
@@ -92,6 +124,9 @@ Keep it casual, exciting, and authentic. Use emojis sparingly."""
         return " ".join(hashtags[:3])
     
     def _generate_with_llm(self, track: Dict, template_data: Dict, hashtags: str) -> Optional[str]:
+        if self.structured:
+            return self._generate_structured(track, template_data, hashtags)
+        
         try:
             content = self.chain.run(
                 track_title=track['title'],
@@ -105,6 +140,20 @@ Keep it casual, exciting, and authentic. Use emojis sparingly."""
             logger.error(f"LLM content generation failed: {e}")
             return None
     
+    def _generate_structured(self, track: Dict, template_data: Dict, hashtags: str) -> Optional[str]:
+        prompt = self.MARKETING_JSON_PROMPT_TEMPLATE.format(
+            track_title=track['title'],
+            genre=track['genre'].capitalize(),
+            mood=track['mood'],
+            best_template=template_data['pattern'],
+            hashtags=hashtags
+        )
+        post = self.llm.generate_json(
+            prompt, post_schema(), validate_post,
+            caller="MarketingAgent", prefix=self.MARKETING_JSON_PROMPT_PREFIX
+        )
+        return post['content'] if post else None
+    
     def _generate_from_template(self, track: Dict, template_data: Dict, hashtags: str) -> str:
         try:
             content = template_data['pattern'].format(
@@ -117,12 +166,20 @@ Keep it casual, exciting, and authentic. Use emojis sparingly."""
             logger.error(f"Template formatting failed: {e}")
             return f"Check out our new {track['genre']} track: {track['title']}! {hashtags}"
     
-    def _build_post_response(self, content: str, template_data: Dict) -> Dict[str, str]:
+    def record_engagement(self, post: Dict[str, Any], engagement: float):
+        # Feed a published post's engagement back into its template's ranking for the genre.
+        if not post.get('template_id'):
+            return
+        self.kb.record_template_engagement(post['template_id'], engagement, post.get('genre'))
+    
+    def _build_post_response(self, content: str, template_data: Dict, genre: Optional[str] = None) -> Dict[str, str]:
         return {
             "content": content,
             "platform": "twitter",
             "engagement_score": template_data['engagement'],
-            "scheduled_time": template_data['best_time']
+            "scheduled_time": template_data['best_time'],
+            "template_id": template_data.get('template_id'),
+            "genre": genre
         }
 
 
@@ -3,7 +3,7 @@
 import random
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 try:
     from langchain.prompts import PromptTemplate
@@ -11,7 +11,9 @@ except ImportError:
     PromptTemplate = None
 
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
 
@@ -20,7 +22,9 @@ try:
 except ImportError:
     from llm_service_simple import LLMService
 
-from config import GENRE_AVOIDANCE_WINDOW
+from async_llm_service import AsyncLLMService
+from config import GENRE_AVOIDANCE_WINDOW, LLM_STRUCTURED_OUTPUT
+from structured_output import extract_json, track_schema, track_validator
 
 logger = logging.getLogger(__name__)
 
@@ -28,12 +32,8 @@ logger = logging.getLogger(__name__)
 class MusicAgent:
     # Generates music tracks using LLM and contextual data.
     
-    MUSIC_PROMPT_TEMPLATE = """You are a creative music producer. Based on the following context, suggest a music track.
-
-Recent genres used (avoid these): {recent_genres}
-Time of day: {time_of_day}
-Available genres: {available_genres}
-Mood suggestions for this time: {mood_suggestions}
+    # Static instructions come first so Ollama can reuse their evaluated context across calls
+    MUSIC_PROMPT_PREFIX = """You are a creative music producer. Based on the context below, suggest a music track.
 
 Generate a creative track with:
 1. A genre (pick from available, avoid recent ones)
@@ -45,7 +45,28 @@ Genre: [genre]
 Mood: [mood]
 Title: [title]
 
-Keep it simple and creative."""
+Keep it simple and creative.
+
+"""
+    
+    MUSIC_CONTEXT = """Recent genres used (avoid these): {recent_genres}
+Time of day: {time_of_day}
+Available genres: {available_genres}
+Mood suggestions for this time: {mood_suggestions}"""
+    
+    MUSIC_PROMPT_TEMPLATE = MUSIC_PROMPT_PREFIX + MUSIC_CONTEXT
+    
+    # Structured mode: Ollama is constrained to a JSON schema and the reply is validated
+    MUSIC_JSON_PROMPT_PREFIX = """You are a creative music producer. Based on the context below, suggest a music track.
+
+Pick a genre from the available genres (avoid recent ones), a mood from the suggestions
+and a creative title (2-3 words).
+
+Respond with a JSON object with the keys "genre", "mood" and "title".
+
+"""
+    
+    MUSIC_JSON_PROMPT_TEMPLATE = MUSIC_JSON_PROMPT_PREFIX + MUSIC_CONTEXT
     
     TITLE_PREFIXES = {
         "uplifting": ["Rising", "Bright", "Soaring", "Elevate"],
@@ -58,21 +79,21 @@ Keep it simple and creative."""
     
     TITLE_SUFFIXES = ["Light", "Waves", "Vibes", "Dreams", "Flow", "Sound", "Echo", "Path"]
     
+    RESPONSE_FIELDS = {"genre", "mood", "title"}
+    
     def __init__(self, knowledge_base: KnowledgeBase, llm_service: LLMService):
         self.kb = knowledge_base
         self.llm = llm_service
-        self.chain = self._create_chain()
-    
-    def _create_chain(self):
-        if not self.llm.is_available():
-            logger.warning("LLM not available, using fallback generation")
-            return None
-        return True
+        self.structured = LLM_STRUCTURED_OUTPUT
+        self.prompt_prefix = self.MUSIC_JSON_PROMPT_PREFIX if self.structured else self.MUSIC_PROMPT_PREFIX
+        self.llm.register_prefix(self.prompt_prefix)
+        # Created on the first batch; fans LLM calls out on an event loop
+        self.async_llm = None
     
     def generate_track(self) -> Dict[str, str]:
         context = self._build_context()
         
-        if self.chain and self.llm.is_available():
+        if self.llm.is_available():
             track = self._generate_with_llm(context)
             if track:
                 self.kb.add_track(track)
@@ -82,6 +103,41 @@ Keep it simple and creative."""
         self.kb.add_track(track)
         return track
     
+    def generate_tracks(self, count: int) -> List[Dict[str, str]]:
+        # Several tracks from one context, with their LLM calls made concurrently
+        # (up to OLLAMA_MAX_CONCURRENCY) rather than one after another.
+        if count <= 1:
+            return [self.generate_track()]
+        
+        context = self._build_context()
+        prompts = [self._build_batch_prompt(context, i, count) for i in range(count)]
+        responses = [None] * count
+        if self.llm.is_available():
+            format = None
+            if self.structured:
+                schema = track_schema(context['available_genres'], context['suggested_moods'])
+                format = self.llm.client.json_format(schema)
+            if self.async_llm is None:
+                self.async_llm = AsyncLLMService(self.llm)
+            responses = self.async_llm.generate_batch(prompts, caller="MusicAgent", format=format,
+                                                      prefix=self.prompt_prefix)
+        
+        tracks = []
+        for prompt, response in zip(prompts, responses):
+            track = None
+            if response:
+                try:
+                    if self.structured:
+                        track = self._generate_structured(prompt, context, response)
+                    else:
+                        track = self._parse_llm_response(response, context)
+                except Exception as e:
+                    logger.error(f"LLM generation failed: {e}")
+            tracks.append(track or self._generate_fallback(context))
+        
+        self.kb.add_tracks(tracks)
+        return tracks
+    
     def _build_context(self) -> Dict:
         recent_genres = self.kb.get('recent_genres', [])
         all_genres = list(self.kb.get('genre_characteristics', {}).keys())
@@ -89,7 +145,9 @@ Keep it simple and creative."""
         
         hour = datetime.now().hour
         time_of_day = self._determine_time_of_day(hour)
-        suggested_moods = self.kb.get('mood_by_time', {}).get(time_of_day, ["happy"])
+        mood_by_time = self.kb.get('mood_by_time', {})
+        suggested_moods = mood_by_time.get(time_of_day, ["happy"])
+        all_moods = sorted({m for moods in mood_by_time.values() for m in moods} | set(suggested_moods))
         
         similar_tracks = self.kb.query_similar_tracks(f"{time_of_day} {', '.join(suggested_moods)}")
         
@@ -99,6 +157,7 @@ Keep it simple and creative."""
             "available_genres": available_genres if available_genres else all_genres,
             "time_of_day": time_of_day,
             "suggested_moods": suggested_moods,
+            "all_moods": all_moods,
             "similar_tracks_count": len(similar_tracks['documents'][0]) if similar_tracks['documents'] else 0
         }
     
@@ -110,16 +169,41 @@ Keep it simple and creative."""
         else:
             return "evening"
     
+    def stream_track(self) -> Iterator[Dict]:
+        # Yield {"token": ...} events while the LLM writes, then the final {"track": ...}.
+        context = self._build_context()
+        track = None
+        
+        if self.llm.is_available():
+            track = yield from self._stream_with_llm(context)
+        
+        if not track:
+            track = self._generate_fallback(context)
+        self.kb.add_track(track)
+        yield {"track": track}
+    
+    def _build_prompt(self, context: Dict) -> str:
+        template = self.MUSIC_JSON_PROMPT_TEMPLATE if self.structured else self.MUSIC_PROMPT_TEMPLATE
+        return template.format(
+            recent_genres=", ".join(context['recent_genres'][-3:]) if context['recent_genres'] else "none",
+            time_of_day=context['time_of_day'],
+            available_genres=", ".join(context['available_genres']),
+            mood_suggestions=", ".join(context['suggested_moods'])
+        )
+    
+    def _build_batch_prompt(self, context: Dict, slot: int, count: int) -> str:
+        # Distinct per slot, so batch prompts are neither coalesced nor served from one cache entry;
+        # the shared prefix still leads, so each is sent as the prefix's context plus the rest
+        return (self._build_prompt(context) +
+                f"\nThis is track {slot + 1} of {count} in today's release; make it differ from the others.")
+    
     def _generate_with_llm(self, context: Dict) -> Optional[Dict[str, str]]:
         try:
-            prompt = self.MUSIC_PROMPT_TEMPLATE.format(
-                recent_genres=", ".join(context['recent_genres'][-3:]) if context['recent_genres'] else "none",
-                time_of_day=context['time_of_day'],
-                available_genres=", ".join(context['available_genres']),
-                mood_suggestions=", ".join(context['suggested_moods'])
-            )
+            prompt = self._build_prompt(context)
+            if self.structured:
+                return self._generate_structured(prompt, context)
             
-            response = self.llm.generate(prompt)
+            response = self.llm.generate(prompt, caller="MusicAgent", prefix=self.prompt_prefix)
             if response:
                 return self._parse_llm_response(response, context)
             return None
@@ -127,25 +211,110 @@ Keep it simple and creative."""
             logger.error(f"LLM generation failed: {e}")
             return None
     
-    def _parse_llm_response(self, response: str, context: Dict) -> Dict[str, str]:
-        track = {
+    def _generate_structured(self, prompt: str, context: Dict,
+                             response: Optional[str] = None) -> Optional[Dict[str, str]]:
+        # Returns None when no valid track came back, so the caller uses the fallback
+        # instead of an "Untitled"/"pop" placeholder.
+        fields = self.llm.generate_json(
+            prompt,
+            track_schema(context['available_genres'], context['suggested_moods']),
+            track_validator(context['all_genres'], context['all_moods']),
+            caller="MusicAgent", prefix=self.prompt_prefix, response=response
+        )
+        if not fields:
+            return None
+        track = self._new_llm_track()
+        track.update(fields)
+        return track
+    
+    def _stream_with_llm(self, context: Dict) -> Iterator[Dict]:
+        if self.structured:
+            return (yield from self._stream_structured(context))
+        
+        # Parse Genre/Mood/Title line by line and stop the stream once all three are in.
+        track = self._new_llm_track()
+        parsed = set()
+        pending = ""
+        tokens = self.llm.stream(
+            self._build_prompt(context), caller="MusicAgent", prefix=self.prompt_prefix
+        )
+        
+        try:
+            for token in tokens:
+                yield {"token": token}
+                pending += token
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    self._parse_llm_response(line, context, track, parsed)
+                if parsed >= self.RESPONSE_FIELDS:
+                    logger.info("All track fields parsed, closing LLM stream early")
+                    break
+            else:
+                self._parse_llm_response(pending, context, track, parsed)
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {e}")
+            return None
+        finally:
+            tokens.close()
+        
+        return track if parsed else None
+    
+    def _stream_structured(self, context: Dict) -> Iterator[Dict]:
+        # Stream the JSON reply, closing once the object is complete, then validate it.
+        prompt = self._build_prompt(context)
+        tokens = self.llm.stream(
+            prompt, caller="MusicAgent", prefix=self.prompt_prefix,
+            schema=track_schema(context['available_genres'], context['suggested_moods'])
+        )
+        response = ""
+        
+        try:
+            for token in tokens:
+                yield {"token": token}
+                response += token
+                if token.rstrip().endswith('}') and extract_json(response) is not None:
+                    break
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {e}")
+            return None
+        finally:
+            tokens.close()
+        
+        if not response:
+            return None
+        return self._generate_structured(prompt, context, response)
+    
+    def _new_llm_track(self) -> Dict[str, str]:
+        return {
             "title": "Untitled",
             "genre": "pop",
             "mood": "happy",
             "timestamp": datetime.now().isoformat(),
             "generation_method": "llm"
         }
+    
+    def _parse_llm_response(self, response: str, context: Dict,
+                            track: Optional[Dict] = None, found: Optional[set] = None) -> Dict[str, str]:
+        # Passing track/found lets streamed fragments fill in the same track incrementally.
+        if track is None:
+            track = self._new_llm_track()
+        if found is None:
+            found = set()
         
         for line in response.strip().split('\n'):
+            line = line.strip()
             if line.startswith("Genre:"):
+                found.add("genre")
                 genre = line.split(":", 1)[1].strip().lower()
                 if genre in context['all_genres']:
                     track["genre"] = genre
             elif line.startswith("Mood:"):
+                found.add("mood")
                 track["mood"] = line.split(":", 1)[1].strip().lower()
             elif line.startswith("Title:"):
                 title = line.split(":", 1)[1].strip()
                 if title:
+                    found.add("title")
                     track["title"] = title
         
         return track
@@ -0,0 +1,207 @@
+# Approximate nearest-neighbour search for large track catalogs: an inverted-file
+# (IVF) index over k-means cells, with optional product quantization (PQ) so a
+# query scores compact codes and re-ranks only the best candidates exactly.
+
+import os
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import ANN_NLIST, ANN_NPROBE, ANN_PQ_M, ANN_RERANK
+
+logger = logging.getLogger(__name__)
+
+# Rows per block when assigning vectors to centroids, bounds the distance matrix size
+ASSIGN_BLOCK = 65536
+# Training sample per coarse centroid
+TRAIN_POINTS_PER_LIST = 32
+PQ_CENTROIDS = 256
+
+
+def _grow(array: np.ndarray, needed: int) -> np.ndarray:
+    # Reallocate with doubling capacity; memory-mapped arrays are copied into RAM here.
+    capacity = max(1, len(array))
+    if needed <= len(array):
+        return array
+    while capacity < needed:
+        capacity *= 2
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def save_array(path: str, array: np.ndarray):
+    # Written beside the target and renamed over it: the old file may still be memory-mapped.
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # Nearest centroid by L2 distance, in blocks.
+    norms = (centroids * centroids).sum(axis=1)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = vectors[start:start + ASSIGN_BLOCK].astype(np.float32)
+        labels[start:start + len(block)] = np.argmin(norms - 2 * block.dot(centroids.T), axis=1)
+    return labels
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Reseed empty cells from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty))]
+    return centroids
+
+
+class IVFIndex:
+    # Recall/latency knobs: nprobe (cells searched per query), pq_m (PQ sub-vectors,
+    # 0 = score candidates exactly) and rerank (PQ candidates re-scored exactly).
+
+    def __init__(self, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE, pq_m: int = ANN_PQ_M,
+                 rerank: int = ANN_RERANK, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank = rerank
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+
+        self.centroids = None
+        self.codebooks = None
+        self.trained_on = 0
+        self._lists = []
+        self._codes = np.empty((0, max(pq_m, 1)), dtype=np.uint8)
+        self._size = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray):
+        sample_size = min(len(vectors), self.nlist * TRAIN_POINTS_PER_LIST)
+        sample = vectors[np.sort(self.rng.choice(len(vectors), sample_size, replace=False))].astype(np.float32)
+        self.centroids = _kmeans(sample, self.nlist, self.iterations, self.rng)
+
+        dim = vectors.shape[1]
+        if self.pq_m and dim % self.pq_m:
+            logger.warning(f"ANN: {dim} dimensions don't split into {self.pq_m} PQ sub-vectors, using exact cell scan")
+            self.pq_m = 0
+        if self.pq_m:
+            sub = dim // self.pq_m
+            self.codebooks = np.stack([
+                _kmeans(sample[:, j * sub:(j + 1) * sub], PQ_CENTROIDS, self.iterations, self.rng)
+                for j in range(self.pq_m)
+            ])
+
+        self.trained_on = len(vectors)
+        self._lists = [[] for _ in range(len(self.centroids))]
+        self._codes = np.empty((0, max(self.pq_m, 1)), dtype=np.uint8)
+        self._size = 0
+
+    def add(self, first_row: int, vectors: np.ndarray):
+        # Rows are numbered contiguously from first_row, matching the caller's vector matrix.
+        rows = np.arange(first_row, first_row + len(vectors), dtype=np.int64)
+        labels = _assign(vectors, self.centroids)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        for cell in np.flatnonzero(np.diff(bounds)):
+            self._lists[cell].append(rows[order[bounds[cell]:bounds[cell + 1]]])
+
+        if self.pq_m:
+            self._codes = _grow(self._codes, first_row + len(vectors))
+            self._codes[first_row:first_row + len(vectors)] = self._encode(vectors)
+        self._size = max(self._size, first_row + len(vectors))
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub = vectors.shape[1] // self.pq_m
+        return np.stack([
+            _assign(vectors[:, j * sub:(j + 1) * sub], self.codebooks[j]) for j in range(self.pq_m)
+        ], axis=1).astype(np.uint8)
+
+    def _cell_rows(self, cell: int) -> np.ndarray:
+        chunks = self._lists[cell]
+        if len(chunks) > 1:
+            self._lists[cell] = chunks = [np.concatenate(chunks)]
+        return chunks[0] if chunks else np.empty(0, dtype=np.int64)
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns (rows, cosine scores) of the best k among the nprobe nearest cells.
+        probes = min(self.nprobe, len(self.centroids))
+        distances = (self.centroids * self.centroids).sum(axis=1) - 2 * self.centroids.dot(query)
+        cells = np.argpartition(distances, probes - 1)[:probes]
+        candidates = np.concatenate([self._cell_rows(c) for c in cells])
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+
+        if self.pq_m and len(candidates) > max(k, self.rerank):
+            sub = len(query) // self.pq_m
+            tables = np.einsum('jcd,jd->jc', self.codebooks, query.reshape(self.pq_m, sub))
+            approx = tables[np.arange(self.pq_m), self._codes[candidates]].sum(axis=1)
+            keep = max(k, self.rerank)
+            candidates = candidates[np.argpartition(-approx, keep - 1)[:keep]]
+
+        scores = matrix[candidates].astype(np.float32).dot(query)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def save(self, directory: str):
+        offsets = np.zeros(len(self._lists) + 1, dtype=np.int64)
+        rows = [self._cell_rows(c) for c in range(len(self._lists))]
+        offsets[1:] = np.cumsum([len(r) for r in rows])
+        save_array(os.path.join(directory, "ann_centroids.npy"), self.centroids)
+        save_array(os.path.join(directory, "ann_rows.npy"), np.concatenate(rows) if rows else np.empty(0, np.int64))
+        save_array(os.path.join(directory, "ann_offsets.npy"), offsets)
+        save_array(os.path.join(directory, "ann_codes.npy"), self._codes[:self._size] if self.pq_m else self._codes[:0])
+        save_array(os.path.join(directory, "ann_params.npy"), np.array(
+            [self.nlist, self.pq_m, self.trained_on, self._size], dtype=np.int64))
+        if self.pq_m:
+            save_array(os.path.join(directory, "ann_codebooks.npy"), self.codebooks)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, **knobs) -> Optional["IVFIndex"]:
+        # Structure comes from disk; query-time knobs (nprobe, rerank) from `knobs` or config.
+        if not os.path.exists(os.path.join(directory, "ann_params.npy")):
+            return None
+        mode = 'r' if mmap else None
+        nlist, pq_m, trained_on, size = np.load(os.path.join(directory, "ann_params.npy")).tolist()
+        index = cls(nlist=nlist, pq_m=pq_m, **knobs)
+        index.centroids = np.load(os.path.join(directory, "ann_centroids.npy"))
+        rows = np.load(os.path.join(directory, "ann_rows.npy"), mmap_mode=mode)
+        offsets = np.load(os.path.join(directory, "ann_offsets.npy"))
+        index._lists = [[rows[offsets[c]:offsets[c + 1]]] for c in range(len(index.centroids))]
+        index._codes = np.load(os.path.join(directory, "ann_codes.npy"), mmap_mode=mode)
+        if pq_m:
+            index.codebooks = np.load(os.path.join(directory, "ann_codebooks.npy"))
+        index.trained_on = trained_on
+        index._size = size
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [sum(len(chunk) for chunk in cell) for cell in self._lists]
+        return {
+            "trained": self.trained,
+            "trained_on": self.trained_on,
+            "nlist": len(self._lists),
+            "nprobe": self.nprobe,
+            "pq_m": self.pq_m,
+            "rerank": self.rerank,
+            "largest_list": max(sizes) if sizes else 0,
+            "code_bytes": int(self._codes[:self._size].nbytes) if self.pq_m else 0
+        }
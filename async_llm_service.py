@@ -0,0 +1,213 @@
+# Asyncio LLM service for fanning out many generations without a thread per call.
+# Wraps a sync LLMService and shares its model settings, response cache and stats.
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    logging.warning("aiohttp not available, async LLM calls will run in worker threads")
+
+try:
+    from llm_service import LLMService
+except ImportError:
+    from llm_service_simple import LLMService
+
+from config import OLLAMA_CONNECT_TIMEOUT, OLLAMA_MAX_CONCURRENCY, OLLAMA_TIMEOUT
+from llm_cache import ResponseCache
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLLMService:
+    # Async counterpart of LLMService with a semaphore capping concurrent Ollama requests.
+    # Every call runs on one event loop owned by the service, in its own thread, so the
+    # semaphore, HTTP session and coalescing are shared by all callers of the instance,
+    # whichever thread or loop they call from.
+
+    def __init__(self, llm_service: LLMService, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        self.llm = llm_service
+        self.client = llm_service.client
+        self.max_concurrency = max(1, max_concurrency)
+        self.inflight = AsyncSingleFlight()
+        self.active = 0
+        self.peak_active = 0
+
+        # Bound to the service loop, so created lazily on first use there
+        self._semaphore = None
+        self._session = None
+        self._loop = None
+        self._thread = None
+        self._loop_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def is_available(self) -> bool:
+        return self.llm.is_available()
+
+    async def agenerate(self, prompt: str, caller: Optional[str] = None,
+                        format: Any = None, prefix: Optional[str] = None) -> Optional[str]:
+        # Generate text without blocking the event loop. `format` and `prefix` are as for the
+        # sync client (a JSON schema from json_format(); a preamble sent as its cached context).
+        return await self._on_loop(self._agenerate(prompt, caller, format, prefix))
+
+    async def _agenerate(self, prompt: str, caller: Optional[str], format: Any,
+                         prefix: Optional[str] = None) -> Optional[str]:
+        if not self.is_available():
+            return None
+
+        key = ResponseCache.make_key(self.client.model, self.client.temperature, prompt, format)
+        cache = self.client.cache
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("Returning cached generation")
+                self.client.telemetry.record_cache_hit(caller)
+                return cached
+
+        if not self.client.breaker.allow():
+            logger.warning("Ollama circuit open, skipping generation")
+            return None
+
+        return await self.inflight.do(key, lambda: self._agenerate_uncached(key, prompt, caller, format, prefix))
+
+    async def agenerate_batch(self, prompts: List[str], caller: Optional[str] = None,
+                              format: Any = None, prefix: Optional[str] = None) -> List[Optional[str]]:
+        # Results come back in the same order as the prompts.
+        return await self._on_loop(self._agenerate_batch(prompts, caller, format, prefix))
+
+    async def _agenerate_batch(self, prompts: List[str], caller: Optional[str], format: Any,
+                               prefix: Optional[str]) -> List[Optional[str]]:
+        if prefix and self.is_available():
+            # Evaluate the shared prefix once, so every prompt is sent as its context plus the rest
+            await asyncio.get_running_loop().run_in_executor(None, self.client._prefix_context, prefix)
+        return list(await asyncio.gather(*(self._agenerate(p, caller, format, prefix) for p in prompts)))
+
+    def generate_batch(self, prompts: List[str], caller: Optional[str] = None,
+                       format: Any = None, prefix: Optional[str] = None) -> List[Optional[str]]:
+        # Sync entry point for callers outside an event loop (Flask routes, orchestrator).
+        batch = self._agenerate_batch(prompts, caller, format, prefix)
+        return asyncio.run_coroutine_threadsafe(batch, self._get_loop()).result()
+
+    async def _on_loop(self, coro):
+        # Await `coro` on the service loop; callers on another loop wait for it there.
+        loop = self._get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="async-llm", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def _agenerate_uncached(self, key: str, prompt: str, caller: Optional[str],
+                                  format: Any = None, prefix: Optional[str] = None) -> Optional[str]:
+        async with self._get_semaphore():
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                if AIOHTTP_AVAILABLE:
+                    return await self._post_generate(key, prompt, caller, format, prefix)
+
+                # Without aiohttp, hand the call to the sync client in a worker thread
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, self.client.generate_uncached, key, prompt, caller, prefix, format)
+            finally:
+                self.active -= 1
+
+    async def _post_generate(self, key: str, prompt: str, caller: Optional[str],
+                             format: Any = None, prefix: Optional[str] = None) -> Optional[str]:
+        # Routed through the same backend pool as sync calls; async calls are not hedged.
+        # The prefix context is normally cached already, but evaluating it blocks, so off the loop
+        loop = asyncio.get_running_loop()
+        prompt, context, tag = await loop.run_in_executor(None, self.client._split_prefix, prompt, prefix, caller)
+        backend = self.client.backends.pick()
+        if backend is None:
+            logger.error("No Ollama backend available")
+            self.client.breaker.record_failure()
+            return None
+
+        try:
+            logger.info(f"Generating with Ollama model {self.client.model} (async)...")
+            session = self._get_session()
+            with self.client.backends.track(backend):
+                async with session.post(
+                    f"{backend.url}/api/generate",
+                    json=self.client.build_payload(prompt, stream=False, context=context, format=format)
+                ) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+
+            result = data.get('response', '')
+            self.client.breaker.record_success()
+            self.client.telemetry.record(data, tag, backend.url)
+            if self.client.cache and result:
+                self.client.cache.put(key, result)
+            logger.info("Generation completed successfully")
+            return result
+        except Exception as e:
+            logger.error(f"Error generating text: {e}")
+            self.client.breaker.record_failure()
+            return None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(sock_connect=OLLAMA_CONNECT_TIMEOUT, sock_read=OLLAMA_TIMEOUT)
+            )
+        return self._session
+
+    async def aclose(self):
+        if self._loop is not None:
+            await self._on_loop(self._close_session())
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def close(self):
+        # Close the HTTP session and stop the service loop; a later call starts a new one.
+        with self._loop_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_session(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        self._semaphore = None
+        self.inflight = AsyncSingleFlight()
+
+    def get_stats(self) -> Dict:
+        return {
+            "cache": self.client.cache.stats() if self.client.cache else None,
+            "coalescing": self.inflight.stats(),
+            "breaker": self.client.breaker.stats(),
+            "concurrency": {
+                "limit": self.max_concurrency,
+                "active": self.active,
+                "peak_active": self.peak_active
+            }
+        }
@@ -0,0 +1,741 @@
+#!/usr/bin/env python3
+# Benchmarks for the agents and the web app.
+# Point OLLAMA_BASE_URL/OLLAMA_BACKENDS at fake_ollama.py for reproducible runs without a model:
+#
+#   python fake_ollama.py --port 11435 --latency lognormal:200:0.3 --seed 1 --quiet &
+#   OLLAMA_BASE_URL=http://localhost:11435 python benchmark.py agents -n 50 -c 4
+#   python benchmark.py web --url http://localhost:5000 -n 200 -c 8
+#   python benchmark.py recent --sizes 1000,10000,100000,1000000
+#   python benchmark.py startup
+#   python benchmark.py journal --sizes 1000,10000,100000
+#   python benchmark.py store --sizes 10000,100000,1000000
+#   python benchmark.py concurrency --readers 1,2,4,8 --writers 1 --seconds 3
+#   python benchmark.py templates --sizes 100,1000,10000,100000
+#   python benchmark.py tiers --tracks 200000 --hot-window 10000 --segment-size 5000
+#   python benchmark.py snapshot --sizes 1000,10000,100000
+#   python benchmark.py vector --sizes 1000,10000,100000 --dtype float32
+#   python benchmark.py ann --tracks 200000 --nprobe 1,4,16,64
+
+import os
+import sys
+import json
+import random
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import requests
+
+from config import MOOD_BY_TIME
+from track_index import track_document
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    # Latency summary in ms.
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2)
+
+    return {
+        "min": round(ordered[0] * 1000, 2),
+        "p50": at(50),
+        "p95": at(95),
+        "p99": at(99),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2)
+    }
+
+
+def run_load(task: Callable[[int], str], count: int, concurrency: int) -> Dict:
+    # Run task(i) `count` times on `concurrency` threads; task returns an outcome label.
+    latencies = []
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def timed(i: int):
+        started = time.perf_counter()
+        try:
+            outcome = task(i)
+        except Exception as e:
+            outcome = f"error: {type(e).__name__}"
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_sec": round(count / wall, 2) if wall else 0.0,
+        "latency_ms": percentiles(latencies),
+        "outcomes": dict(outcomes)
+    }
+
+
+def bench_agents(args) -> Dict:
+    # Track generation plus its marketing post, end to end through LLMService.
+    try:
+        from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+        if not CHROMADB_AVAILABLE:
+            raise ImportError("chromadb is not installed")
+    except ImportError:
+        from knowledge_simple import KnowledgeBase
+    try:
+        from llm_service import LLMService
+    except ImportError:
+        from llm_service_simple import LLMService
+    from agents.music_agent import MusicAgent
+    from agents.marketing_agent import MarketingAgent
+
+    kb = KnowledgeBase()
+    llm = LLMService()
+    if not llm.wait_for_health_check(timeout=10):
+        print("Ollama not reachable, agents will use their fallbacks", file=sys.stderr)
+
+    music = MusicAgent(kb, llm)
+    marketing = MarketingAgent(kb, llm)
+
+    def task(i: int) -> str:
+        track = music.generate_track()
+        if not args.no_marketing:
+            marketing.create_post(track)
+        return track.get('generation_method', 'unknown')
+
+    report = run_load(task, args.requests, args.concurrency)
+    report["llm"] = llm.get_stats()
+    report["generation"] = llm.get_metrics()["total"]
+    return report
+
+
+def bench_web(args) -> Dict:
+    # Load-test a running web_app.py over HTTP.
+    base = args.url.rstrip('/')
+    local = threading.local()
+
+    def task(i: int) -> str:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path = args.endpoints[i % len(args.endpoints)].split(' ', 1)
+        response = local.session.request(method, f"{base}{path}", timeout=args.timeout)
+        return f"{method} {path} {response.status_code}"
+
+    return run_load(task, args.requests, args.concurrency)
+
+
+def _fake_tracks(start: int, count: int) -> List[Dict]:
+    genres = ["pop", "electronic", "lofi", "jazz", "classical"]
+    moods = ["uplifting", "energetic", "happy", "focused", "calm", "relaxing"]
+    return [{
+        "title": f"Track {i}",
+        "genre": genres[i % len(genres)],
+        "mood": moods[i % len(moods)],
+        "timestamp": f"2026-01-01T00:00:00.{i:07d}",
+        "generation_method": "benchmark"
+    } for i in range(start, start + count)]
+
+
+def bench_recent(args) -> Dict:
+    # Recent-genre lookup: full collection scan (the old get('recent_genres')) vs the ring buffer.
+    import chromadb
+    from track_index import RecentTracksIndex
+
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection("benchmark_tracks", embedding_function=None)
+    batch = client.get_max_batch_size()
+    rng = random.Random(0)
+    results = []
+    stored = 0
+
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        while stored < size:
+            count = min(batch, size - stored)
+            tracks = _fake_tracks(stored, count)
+            collection.add(
+                ids=[f"track_{i}" for i in range(stored, stored + count)],
+                documents=[f"{t['genre']} music with {t['mood']} mood: {t['title']}" for t in tracks],
+                embeddings=[[rng.random() for _ in range(4)] for _ in tracks],
+                metadatas=tracks
+            )
+            stored += count
+
+        row = {"tracks": stored}
+        if stored <= args.max_scan:
+            started = time.perf_counter()
+            try:
+                for _ in range(args.scan_reps):
+                    scanned = [m['genre'] for m in collection.get()['metadatas'][-10:]]
+                row["full_scan_ms"] = round((time.perf_counter() - started) / args.scan_reps * 1000, 2)
+            except Exception as e:
+                # Large unfiltered get() calls can exceed the backing SQLite's variable limit
+                row["full_scan_error"] = str(e)
+
+        index = RecentTracksIndex()
+        started = time.perf_counter()
+        index.load_from_collection(collection)
+        row["index_rebuild_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        started = time.perf_counter()
+        for _ in range(args.lookups):
+            genres = index.recent_genres(10)
+        row["index_lookup_us"] = round((time.perf_counter() - started) / args.lookups * 1e6, 3)
+        if "full_scan_ms" in row:
+            row["same_result"] = genres == scanned
+
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+
+    return {"recent_genres": results}
+
+
+def bench_vector(args) -> Dict:
+    # NumPy fallback search latency vs index size (needs numpy).
+    from vector_index import HashingEmbedder, VectorIndex
+
+    embedder = HashingEmbedder()
+    index = VectorIndex(dtype=args.dtype)
+    queries = [f"{tod} {', '.join(moods)}" for tod, moods in MOOD_BY_TIME.items()]
+    query_vectors = embedder(queries)
+    results = []
+
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        stored = len(index)
+        while stored < size:
+            tracks = _fake_tracks(stored, min(10000, size - stored))
+            documents = [track_document(t) for t in tracks]
+            index.add([f"track_{stored + i}" for i in range(len(tracks))], embedder(documents), documents, tracks)
+            stored += len(tracks)
+
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            index.query(query_vectors[i % len(queries)], args.top_k)
+            latencies.append(time.perf_counter() - started)
+
+        row = {"tracks": stored, "query_ms": percentiles(latencies), "index": index.stats()}
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+
+    return {"vector_search": results}
+
+
+def bench_ann(args) -> Dict:
+    # Recall@k and latency of the IVF/PQ index against exact search, on clustered synthetic vectors.
+    import numpy as np
+    from ann_index import IVFIndex
+    from vector_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.clusters, args.tracks)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((args.tracks, args.dim)).astype(np.float32)
+    queries = centers[rng.integers(0, args.clusters, args.queries)] + \
+        0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    ann = IVFIndex(nlist=args.nlist, pq_m=args.pq_m, rerank=args.rerank)
+    index = VectorIndex(dim=args.dim, ann=ann, ann_min_vectors=args.tracks)
+    started = time.perf_counter()
+    index.add([str(i) for i in range(args.tracks)], vectors, [""] * args.tracks, [{}] * args.tracks)
+    report = {"tracks": args.tracks, "build_seconds": round(time.perf_counter() - started, 2), "index": index.stats()}
+
+    def run(exact: bool):
+        latencies, found = [], []
+        for q in queries:
+            started = time.perf_counter()
+            result = index.query(q, args.top_k, exact=exact)
+            latencies.append(time.perf_counter() - started)
+            found.append(set(result['ids'][0]))
+        return latencies, found
+
+    latencies, truth = run(exact=True)
+    report["exact"] = {"latency_ms": percentiles(latencies)}
+    report["ann"] = []
+    for nprobe in (int(n) for n in args.nprobe.split(',')):
+        ann.nprobe = nprobe
+        latencies, found = run(exact=False)
+        recall = sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+        row = {"nprobe": nprobe, "recall": round(recall, 4), "latency_ms": percentiles(latencies)}
+        print(json.dumps(row), file=sys.stderr)
+        report["ann"].append(row)
+    return report
+
+
+def bench_journal(args) -> Dict:
+    # knowledge_simple add_track cost with the journal on, vs catalog size; plus compaction and reload.
+    import shutil
+    import tempfile
+    from knowledge_simple import KnowledgeBase as SimpleKnowledgeBase
+
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        directory = tempfile.mkdtemp(prefix="journal_bench_")
+        try:
+            kb = SimpleKnowledgeBase(journal_dir=directory, segment_dir=None)
+            kb.journal.compact_after = 0
+            kb.vector_index = None
+            kb.add_tracks(_fake_tracks(0, size))
+            kb.journal.compact()
+
+            latencies = []
+            for track in _fake_tracks(size, args.writes):
+                started = time.perf_counter()
+                kb.add_track(track)
+                latencies.append(time.perf_counter() - started)
+            kb.close()
+
+            started = time.perf_counter()
+            reloaded = SimpleKnowledgeBase(journal_dir=directory, segment_dir=None)
+            load_seconds = time.perf_counter() - started
+            row = {
+                "catalog": size,
+                "add_track_ms": percentiles(latencies),
+                "compact_ms": round(kb.journal.last_compact_ms, 2),
+                "reload_ms": round(load_seconds * 1000, 2),
+                "journal_load_ms": round(reloaded.journal.load_ms, 2),
+                "reloaded_tracks": len(reloaded.get('recent_tracks')),
+                "fsyncs": kb.journal.fsyncs
+            }
+            reloaded.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+    return {"journal": results}
+
+
+def bench_store(args) -> Dict:
+    # knowledge_simple recent_tracks: list of dicts (as loaded from JSON) vs the columnar TrackStore.
+    import gc
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from track_store import TrackStore
+
+    def traced(build: Callable):
+        gc.collect()
+        tracemalloc.start()
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return value, size
+
+    def rate(scan: Callable, count: int) -> float:
+        started = time.perf_counter()
+        for _ in range(args.reps):
+            scan()
+        return round(count * args.reps / (time.perf_counter() - started))
+
+    results = []
+    base = datetime(2026, 1, 1)
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        tracks = _fake_tracks(0, size)
+        for i, track in enumerate(tracks):
+            track['timestamp'] = (base + timedelta(seconds=i, microseconds=i % 999983)).isoformat()
+        payload = json.dumps(tracks)
+        del tracks
+
+        dicts, dict_bytes = traced(lambda: json.loads(payload))
+        store, store_bytes = traced(lambda: TrackStore(dicts))
+        assert dict(store[-1]) == dicts[-1]
+
+        row = {
+            "tracks": size,
+            "bytes_per_track": {"dicts": round(dict_bytes / size, 1), "store": round(store_bytes / size, 1)},
+            "genre_count_per_s": {
+                "dicts": rate(lambda: sum(1 for t in dicts if t['genre'] == "pop"), size),
+                "store": rate(lambda: store.count('genre', "pop"), size)
+            },
+            "mood_scan_per_s": {
+                "dicts": rate(lambda: sum(1 for t in dicts if t['mood'] == "calm"), size),
+                "store_rows": rate(lambda: sum(1 for t in store if t['mood'] == "calm"), size),
+                "store_column": rate(lambda: sum(1 for m in store.column('mood') if m == "calm"), size)
+            }
+        }
+        del dicts, store
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+    return {"store": results}
+
+
+def bench_concurrency(args) -> Dict:
+    # knowledge_simple under concurrent readers (the /api/status and _build_context reads) and
+    # writers (add_track). Readers check each snapshot is internally consistent and never goes back.
+    from knowledge_simple import KnowledgeBase as SimpleKnowledgeBase
+
+    def run(readers: int, locked: bool) -> Dict:
+        kb = SimpleKnowledgeBase(journal_dir=None, segment_dir=None)
+        kb.vector_index = None
+        stop = threading.Event()
+        reads = [0] * readers
+        writes = [0] * args.writers
+        errors = []
+
+        def reader(slot: int):
+            last_version, count = -1, 0
+            while not stop.is_set():
+                if locked:
+                    with kb.state.lock:
+                        snapshot = kb.state.read()
+                else:
+                    snapshot = kb.state.read()
+                tracks = snapshot.data['recent_tracks']
+                genres = snapshot.data['recent_genres']
+                # Version 0 is the seed data, whose genres and tracks needn't line up
+                if snapshot.version < last_version or (snapshot.version and tracks[-1]['genre'] != genres[-1]):
+                    errors.append(f"inconsistent snapshot at version {snapshot.version}")
+                last_version = snapshot.version
+                count += 1
+            reads[slot] = count
+
+        def writer(slot: int):
+            i = slot
+            while not stop.is_set():
+                kb.add_tracks(_fake_tracks(i, 1))
+                i += args.writers
+                writes[slot] += 1
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {
+            "readers": readers,
+            "reads_per_s": round(sum(reads) / args.seconds),
+            "reads_per_s_per_reader": round(sum(reads) / args.seconds / readers),
+            "writes_per_s": round(sum(writes) / args.seconds),
+            "snapshot_version": kb.state.read().version,
+            "errors": len(errors)
+        }
+
+    results = []
+    for readers in sorted(int(n) for n in args.readers.split(',')):
+        row = {"snapshot": run(readers, False)}
+        if args.locked_baseline:
+            row["locked_reads"] = run(readers, True)
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+    return {"concurrency": results, "gil": getattr(sys, '_is_gil_enabled', lambda: True)()}
+
+
+def bench_templates(args) -> Dict:
+    # Best template for a genre: max() over every template (the old query) vs TemplateRanking,
+    # with engagement recorded between lookups.
+    from template_ranking import TemplateRanking
+
+    genres = ["pop", "electronic", "lofi", "jazz", "classical"]
+    rng = random.Random(args.seed)
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        templates = [{
+            "pattern": f"Template {i}: {{title}} #{{genre}}",
+            "engagement": rng.randint(0, 1000),
+            "best_time": "9am",
+            **({"genre": genres[i % len(genres)]} if i % 2 else {})
+        } for i in range(size)]
+        started = time.perf_counter()
+        ranking = TemplateRanking(templates)
+        build_seconds = time.perf_counter() - started
+        ids = [t['id'] for t in ranking.top_k(None, size)]
+
+        scan, ranked, record = [], [], []
+        for _ in range(args.lookups):
+            genre = rng.choice(genres)
+            started = time.perf_counter()
+            max((t for t in templates if t.get('genre') in (None, genre)), key=lambda t: t['engagement'])
+            scan.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            ranking.top_k(genre, args.top_k)
+            ranked.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            ranking.record(rng.choice(ids), rng.randint(0, 2000))
+            record.append(time.perf_counter() - started)
+
+        row = {
+            "templates": size,
+            "build_ms": round(build_seconds * 1000, 2),
+            "scan_max_ms": percentiles(scan),
+            "top_k_ms": percentiles(ranked),
+            "record_ms": percentiles(record)
+        }
+        print(json.dumps(row), file=sys.stderr)
+        results.append(row)
+    return {"templates": results}
+
+
+def bench_tiers(args) -> Dict:
+    # knowledge_simple memory while ingesting history, all-in-memory vs hot window + cold segments,
+    # and query latency for filters that hit the hot tier, old time ranges, and deep pages.
+    # The vector index stays on, as in production; with segments its matrix is a file-backed map,
+    # which tracemalloc doesn't count.
+    import gc
+    import shutil
+    import tempfile
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from knowledge_simple import KnowledgeBase as SimpleKnowledgeBase
+
+    base = datetime(2025, 1, 1)
+
+    def tracks(start: int, count: int) -> List[Dict]:
+        batch = _fake_tracks(start, count)
+        for i, track in enumerate(batch, start):
+            track['timestamp'] = (base + timedelta(minutes=i)).isoformat()
+        return batch
+
+    def day(n: int):
+        return base + timedelta(days=n), base + timedelta(days=n + 1)
+
+    report = {}
+    for mode in ("memory", "tiered"):
+        directory = tempfile.mkdtemp(prefix="tiers_bench_")
+        try:
+            gc.collect()
+            tracemalloc.start()
+            kb = SimpleKnowledgeBase(journal_dir=None,
+                                     segment_dir=directory if mode == "tiered" else None,
+                                     hot_window=args.hot_window, segment_size=args.segment_size)
+            memory = []
+            step = max(1, args.tracks // 5)
+            for start in range(0, args.tracks, args.batch):
+                kb.add_tracks(tracks(start, min(args.batch, args.tracks - start)))
+                if (start + args.batch) % step < args.batch:
+                    memory.append({"tracks": start + args.batch,
+                                   "mb": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1)})
+            tracemalloc.stop()
+
+            last_day = (args.tracks - 1) // (24 * 60)
+            queries = {
+                "genre_first_page": lambda: kb.query_tracks({"genre": "jazz"}, None, 50, 0),
+                "genre_oldest_day": lambda: kb.query_tracks({"genre": "jazz"}, day(0), 50, 0),
+                "genre_mood_mid_day": lambda: kb.query_tracks({"genre": "jazz", "mood": "calm"},
+                                                              day(last_day // 2), 50, 0),
+                "genre_deep_page": lambda: kb.query_tracks({"genre": "jazz"}, None, 50, args.tracks // 10),
+                "similar_oldest": lambda: kb.query_similar_tracks(track_document(tracks(0, 1)[0]), 5)
+            }
+            latencies = {}
+            for name, query in queries.items():
+                samples = []
+                for _ in range(args.queries):
+                    started = time.perf_counter()
+                    query()
+                    samples.append(time.perf_counter() - started)
+                latencies[name] = percentiles(samples)
+            report[mode] = {
+                "memory": memory,
+                "query_ms": latencies,
+                "cold": kb.segments.stats() if kb.segments is not None else None,
+                "vector_index": kb.vector_index.stats() if kb.vector_index is not None else None,
+                "segment_bytes": sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(json.dumps({mode: report[mode]["memory"]}), file=sys.stderr)
+    return {"tiers": report}
+
+
+def bench_snapshot(args) -> Dict:
+    # Restoring knowledge_simple: re-adding (and re-embedding) every track vs load_snapshot,
+    # with heap growth on load and query latency against the memory-mapped index.
+    import gc
+    import shutil
+    import tempfile
+    import tracemalloc
+    from knowledge_simple import KnowledgeBase as SimpleKnowledgeBase
+
+    report = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        directory = tempfile.mkdtemp(prefix="snapshot_bench_")
+        try:
+            def fresh() -> SimpleKnowledgeBase:
+                return SimpleKnowledgeBase(journal_dir=None, segment_dir=os.path.join(directory, "segments"),
+                                           hot_window=args.hot_window, segment_size=args.segment_size)
+
+            tracks = _fake_tracks(0, size)
+            source = fresh()
+            started = time.perf_counter()
+            for start in range(0, size, args.batch):
+                source.add_tracks(tracks[start:start + args.batch])
+            reembed_s = time.perf_counter() - started
+
+            path = os.path.join(directory, "kb.snap")
+            started = time.perf_counter()
+            source.export_snapshot(path)
+            export_s = time.perf_counter() - started
+            queries = [track_document(t) for t in random.Random(args.seed).sample(tracks, min(args.queries, size))]
+            expected = [source.query_similar_tracks(q, 5)['ids'] for q in queries]
+            del source, tracks
+            shutil.rmtree(os.path.join(directory, "segments"))
+
+            kb = fresh()
+            gc.collect()
+            tracemalloc.start()
+            started = time.perf_counter()
+            kb.load_snapshot(path)
+            load_s = time.perf_counter() - started
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            samples, matches = [], 0
+            for query, ids in zip(queries, expected):
+                started = time.perf_counter()
+                matches += kb.query_similar_tracks(query, 5)['ids'] == ids
+                samples.append(time.perf_counter() - started)
+            row = {
+                "tracks": size,
+                "reembed_s": round(reembed_s, 2),
+                "export_s": round(export_s, 2),
+                "load_s": round(load_s, 3),
+                "snapshot_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+                "load_heap_mb": round(heap / 2 ** 20, 1),
+                "memory_mapped": kb.vector_index.stats()["memory_mapped"],
+                "same_results": f"{matches}/{len(queries)}",
+                "query_ms": percentiles(samples)
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(json.dumps(row), file=sys.stderr)
+        report.append(row)
+    return {"snapshot": report}
+
+
+def bench_startup(args) -> Dict:
+    # Cold start of the knowledge base: construction vs first vector use, with the per-phase breakdown.
+    started = time.perf_counter()
+    try:
+        from knowledge import KnowledgeBase
+    except ImportError:
+        from knowledge_simple import KnowledgeBase
+    imported = time.perf_counter()
+    kb = KnowledgeBase()
+    constructed = time.perf_counter()
+    kb.get('recent_genres')
+    first_use = time.perf_counter()
+    report = {
+        "module": KnowledgeBase.__module__,
+        "import_ms": round((imported - started) * 1000, 2),
+        "construct_ms": round((constructed - imported) * 1000, 2),
+        "first_vector_use_ms": round((first_use - constructed) * 1000, 2),
+        "phases_ms": getattr(kb, 'startup_timings', {})
+    }
+    kb.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Music Generator Company benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    agents = sub.add_parser("agents", help="MusicAgent + MarketingAgent through LLMService")
+    agents.add_argument('-n', '--requests', type=int, default=20)
+    agents.add_argument('-c', '--concurrency', type=int, default=1)
+    agents.add_argument('--no-marketing', action='store_true')
+    agents.set_defaults(func=bench_agents)
+
+    web = sub.add_parser("web", help="HTTP load test against a running web_app.py")
+    web.add_argument('--url', default="http://localhost:5000")
+    web.add_argument('-n', '--requests', type=int, default=100)
+    web.add_argument('-c', '--concurrency', type=int, default=4)
+    web.add_argument('--timeout', type=float, default=120)
+    web.add_argument('--endpoint', dest='endpoints', action='append',
+                     help='"METHOD /path", may be repeated (default: POST /api/generate and GET /api/status)')
+    web.set_defaults(func=bench_web)
+
+    recent = sub.add_parser("recent", help="recent-genres lookup vs catalog size (needs chromadb)")
+    recent.add_argument('--sizes', default="1000,10000,100000,1000000")
+    recent.add_argument('--lookups', type=int, default=10000)
+    recent.add_argument('--scan-reps', type=int, default=3)
+    recent.add_argument('--max-scan', type=int, default=1000000,
+                        help="skip the full-scan baseline above this many tracks")
+    recent.set_defaults(func=bench_recent)
+
+    vector = sub.add_parser("vector", help="NumPy fallback similarity search vs index size (needs numpy)")
+    vector.add_argument('--sizes', default="1000,10000,100000")
+    vector.add_argument('--queries', type=int, default=200)
+    vector.add_argument('--top-k', type=int, default=5)
+    vector.add_argument('--dtype', default="float32", choices=["float32", "float16"])
+    vector.set_defaults(func=bench_vector)
+
+    ann = sub.add_parser("ann", help="IVF/PQ recall vs latency against exact search (needs numpy)")
+    ann.add_argument('--tracks', type=int, default=200000)
+    ann.add_argument('--dim', type=int, default=128)
+    ann.add_argument('--clusters', type=int, default=2000)
+    ann.add_argument('--queries', type=int, default=200)
+    ann.add_argument('--top-k', type=int, default=10)
+    ann.add_argument('--nlist', type=int, default=1024)
+    ann.add_argument('--pq-m', type=int, default=16)
+    ann.add_argument('--rerank', type=int, default=100)
+    ann.add_argument('--nprobe', default="1,4,16,64")
+    ann.set_defaults(func=bench_ann)
+
+    journal = sub.add_parser("journal", help="knowledge_simple journaled add_track cost vs catalog size")
+    journal.add_argument('--sizes', default="1000,10000,100000")
+    journal.add_argument('--writes', type=int, default=2000)
+    journal.set_defaults(func=bench_journal)
+
+    store = sub.add_parser("store", help="recent_tracks memory per track and scan rate: dicts vs TrackStore")
+    store.add_argument('--sizes', default="10000,100000,1000000")
+    store.add_argument('--reps', type=int, default=3)
+    store.set_defaults(func=bench_store)
+
+    concurrency = sub.add_parser("concurrency", help="knowledge_simple reads/writes from concurrent threads")
+    concurrency.add_argument('--readers', default="1,2,4,8")
+    concurrency.add_argument('--writers', type=int, default=1)
+    concurrency.add_argument('--seconds', type=float, default=3)
+    concurrency.add_argument('--locked-baseline', action='store_true',
+                             help="also run with readers taking the writer lock, for comparison")
+    concurrency.set_defaults(func=bench_concurrency)
+
+    templates = sub.add_parser("templates", help="per-genre best template: full scan vs TemplateRanking")
+    templates.add_argument('--sizes', default="100,1000,10000,100000")
+    templates.add_argument('--lookups', type=int, default=2000)
+    templates.add_argument('--top-k', type=int, default=5)
+    templates.add_argument('--seed', type=int, default=1)
+    templates.set_defaults(func=bench_templates)
+
+    tiers = sub.add_parser("tiers", help="knowledge_simple memory and queries with a hot window + cold segments")
+    tiers.add_argument('--tracks', type=int, default=200000)
+    tiers.add_argument('--hot-window', type=int, default=10000)
+    tiers.add_argument('--segment-size', type=int, default=5000)
+    tiers.add_argument('--batch', type=int, default=1000)
+    tiers.add_argument('--queries', type=int, default=20)
+    tiers.set_defaults(func=bench_tiers)
+
+    snapshot = sub.add_parser("snapshot", help="knowledge_simple restore: re-embedding vs a memory-mapped snapshot")
+    snapshot.add_argument('--sizes', default="1000,10000,100000")
+    snapshot.add_argument('--hot-window', type=int, default=10000)
+    snapshot.add_argument('--segment-size', type=int, default=5000)
+    snapshot.add_argument('--batch', type=int, default=1000)
+    snapshot.add_argument('--queries', type=int, default=50)
+    snapshot.add_argument('--seed', type=int, default=1)
+    snapshot.set_defaults(func=bench_snapshot)
+
+    startup = sub.add_parser("startup", help="knowledge base cold-start timing by init phase")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    if getattr(args, 'endpoints', None) is None and args.command == "web":
+        args.endpoints = ["POST /api/generate", "GET /api/status"]
+
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(args.func(args), indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
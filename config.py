@@ -12,6 +12,79 @@ CHROMA_DB_PATH = BASE_DIR / "chroma_db"
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.7"))
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "30"))
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Comma-separated list of Ollama hosts; defaults to OLLAMA_BASE_URL alone
+OLLAMA_BACKENDS = [u.strip() for u in os.getenv("OLLAMA_BACKENDS", OLLAMA_BASE_URL).split(",") if u.strip()]
+OLLAMA_HEDGE_PERCENTILE = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "95"))
+OLLAMA_HEDGE_MIN_SAMPLES = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "2"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "30"))
+OLLAMA_HEALTH_MAX_BACKOFF = float(os.getenv("OLLAMA_HEALTH_MAX_BACKOFF", "60"))
+OLLAMA_BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "3"))
+OLLAMA_BREAKER_RESET = float(os.getenv("OLLAMA_BREAKER_RESET", "30"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARM_UP = os.getenv("OLLAMA_WARM_UP", "true").lower() == "true"
+# Fraction of prefixed prompts sent as (cached prefix context + variable part); < 1.0 gives an A/B split
+OLLAMA_PREFIX_CONTEXT_RATIO = float(os.getenv("OLLAMA_PREFIX_CONTEXT_RATIO", "1.0"))
+
+# Structured output: ask Ollama for JSON and validate it; "json" format is for Ollama < 0.5
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+LLM_JSON_FORMAT = os.getenv("LLM_JSON_FORMAT", "schema")
+LLM_JSON_MAX_ATTEMPTS = int(os.getenv("LLM_JSON_MAX_ATTEMPTS", "2"))
+
+# LLM response cache (opt-in)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_VARIANTS = int(os.getenv("LLM_CACHE_VARIANTS", "3"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+# knowledge_simple track journal (empty disables persistence of added tracks)
+KNOWLEDGE_JOURNAL_DIR = os.getenv("KNOWLEDGE_JOURNAL_DIR", str(BASE_DIR / "knowledge_journal"))
+# Records per fsync, and seconds before a partial batch is fsynced anyway
+JOURNAL_FSYNC_BATCH = int(os.getenv("JOURNAL_FSYNC_BATCH", "32"))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1"))
+# Journal records after which the background thread compacts into a snapshot
+JOURNAL_COMPACT_AFTER = int(os.getenv("JOURNAL_COMPACT_AFTER", "10000"))
+# Older knowledge_simple tracks roll from memory into compressed segment files here (empty keeps all in memory)
+TRACK_SEGMENT_DIR = os.getenv("TRACK_SEGMENT_DIR", str(BASE_DIR / "track_segments"))
+# Tracks kept in memory; once TRACK_SEGMENT_SIZE more accumulate, the oldest are rolled into segments
+TRACK_HOT_WINDOW = int(os.getenv("TRACK_HOT_WINDOW", "10000"))
+TRACK_SEGMENT_SIZE = int(os.getenv("TRACK_SEGMENT_SIZE", "5000"))
+
+# Knowledge base indexes
+# Newest tracks kept in memory for recent-genre lookups
+RECENT_INDEX_SIZE = int(os.getenv("RECENT_INDEX_SIZE", "100"))
+# Write-behind track ingestion: records per vector-store write, and seconds between background flushes
+TRACK_WRITE_BATCH_SIZE = int(os.getenv("TRACK_WRITE_BATCH_SIZE", "64"))
+TRACK_WRITE_FLUSH_INTERVAL = float(os.getenv("TRACK_WRITE_FLUSH_INTERVAL", "2"))
+# A failed batch is retried after TRACK_WRITE_RETRY_DELAY seconds, doubling, until it has been tried this often
+TRACK_WRITE_MAX_ATTEMPTS = int(os.getenv("TRACK_WRITE_MAX_ATTEMPTS", "3"))
+TRACK_WRITE_RETRY_DELAY = float(os.getenv("TRACK_WRITE_RETRY_DELAY", "1"))
+# Query texts whose embeddings are kept for similarity search
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+# Similarity search without ChromaDB: "hashing" (local, no model) or "ollama" (OLLAMA_EMBED_MODEL)
+FALLBACK_EMBEDDER = os.getenv("FALLBACK_EMBEDDER", "hashing")
+# Hashing embedder width; query cost is linear in it, 128 keeps 100k-track searches in single-digit ms
+FALLBACK_EMBEDDING_DIM = int(os.getenv("FALLBACK_EMBEDDING_DIM", "128"))
+# float16 halves index memory but scores several times slower (no BLAS for half precision)
+FALLBACK_VECTOR_DTYPE = os.getenv("FALLBACK_VECTOR_DTYPE", "float32")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+# Directory the fallback vector index is saved to on close and memory-mapped from at startup
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "")
+
+# Approximate nearest-neighbour search (IVF + optional PQ) for the fallback vector index.
+# More probes or rerank candidates raise recall at the cost of latency.
+ANN_ENABLED = os.getenv("ANN_ENABLED", "false").lower() == "true"
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "50000"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "1024"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Sub-vectors per product-quantized code; 0 scores probed cells exactly. Must divide the dimension.
+ANN_PQ_M = int(os.getenv("ANN_PQ_M", "16"))
+ANN_RERANK = int(os.getenv("ANN_RERANK", "100"))
 
 # ChromaDB Collections
 TRACKS_COLLECTION = "tracks"
@@ -22,6 +95,22 @@ MAX_RECENT_GENRES = 5
 GENRE_AVOIDANCE_WINDOW = 3
 BILLING_SUCCESS_RATE = 0.95
 SUBSCRIPTION_PRICE = 1.0
+# Tracks generated per run_daily_operations; more than one fans the LLM calls out concurrently
+DAILY_TRACK_COUNT = int(os.getenv("DAILY_TRACK_COUNT", "1"))
+
+# Genre characteristics seeded into the ChromaDB context collection (knowledge.py)
+GENRE_CHARACTERISTICS = {
+    "pop": {"tempo": 120, "mood": "happy", "popularity": 0.9,
+            "description": "Catchy melodies and upbeat rhythms with broad appeal"},
+    "electronic": {"tempo": 140, "mood": "energetic", "popularity": 0.85,
+                   "description": "Synthesized sounds and driving beats"},
+    "lofi": {"tempo": 80, "mood": "calm", "popularity": 0.95,
+             "description": "Relaxed beats with warm, mellow textures for studying"},
+    "jazz": {"tempo": 110, "mood": "sophisticated", "popularity": 0.7,
+             "description": "Improvisation, swing and rich harmonies"},
+    "classical": {"tempo": 90, "mood": "elegant", "popularity": 0.6,
+                  "description": "Orchestral and instrumental compositions"}
+}
 
 # Time-based mood mapping
 MOOD_BY_TIME = {
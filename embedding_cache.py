@@ -0,0 +1,89 @@
+# LRU cache of query embeddings keyed by (embedding model, text), so repeated
+# similarity queries skip the embedding step and search with the stored vector.
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence
+
+from config import QUERY_EMBEDDING_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_model_id(embedding_function: Any) -> str:
+    # Identifies the model behind an embedding function, so vectors from different models never mix.
+    name = getattr(embedding_function, 'MODEL_NAME', None) or getattr(embedding_function, 'model_name', None)
+    kind = type(embedding_function).__name__
+    return f"{kind}:{name}" if name else kind
+
+
+def context_queries(mood_by_time: Dict[str, List[str]]) -> List[str]:
+    # The similar-track queries MusicAgent._build_context sends, one per time of day.
+    return [f"{time_of_day} {', '.join(moods)}" for time_of_day, moods in mood_by_time.items()]
+
+
+class QueryEmbeddingCache:
+
+    def __init__(self, embed: Callable[[List[str]], Sequence[Sequence[float]]], model_id: str,
+                 max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.embed = embed
+        self.model_id = model_id
+        self.max_entries = max(1, max_entries)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str) -> List[float]:
+        key = (self.model_id, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = self._to_list(self.embed([text])[0])
+        self._store(key, vector)
+        return vector
+
+    def warm(self, texts: List[str]) -> int:
+        # Embed any missing texts in one call; returns how many were added.
+        with self._lock:
+            missing = [t for t in dict.fromkeys(texts) if (self.model_id, t) not in self._entries]
+        if not missing:
+            return 0
+
+        for text, vector in zip(missing, self.embed(missing)):
+            self._store((self.model_id, text), self._to_list(vector))
+        return len(missing)
+
+    def _store(self, key, vector: List[float]):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _to_list(vector: Any) -> List[float]:
+        # Embedding functions may return NumPy arrays; the store accepts plain lists everywhere.
+        return vector.tolist() if hasattr(vector, 'tolist') else list(vector)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_id,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions
+            }
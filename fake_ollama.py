@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# Stand-in Ollama server for benchmarks and load tests without a model.
+#
+# Synthetic mode answers /api/tags, /api/generate (streamed or not) and /api/embeddings
+# with configurable latency, decode speed and injected failures. Record mode proxies a
+# real Ollama and appends every exchange to a JSONL cassette; replay mode serves it back.
+#
+#   python fake_ollama.py --port 11435 --latency lognormal:300:0.4 --tokens-per-sec 25
+#   python fake_ollama.py --record cassette.jsonl --upstream http://localhost:11434
+#   python fake_ollama.py --replay cassette.jsonl --miss synthetic
+#   OLLAMA_BASE_URL=http://localhost:11435 python web_app.py
+
+import re
+import json
+import time
+import zlib
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+from flask import Flask, Response, jsonify, request
+
+from config import OLLAMA_MODEL
+
+logger = logging.getLogger(__name__)
+
+WORDS = [
+    "midnight", "echo", "velvet", "neon", "drift", "golden", "pulse", "horizon", "static",
+    "bloom", "signal", "ember", "ocean", "glass", "river", "satellite", "hollow", "summer"
+]
+
+# Ollama unloads an idle model after 5 minutes unless the request says otherwise
+DEFAULT_KEEP_ALIVE = 300.0
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    # "constant:MS", "uniform:LOW:HIGH", "normal:MEAN:STD", "lognormal:MEDIAN:SIGMA"
+    # or "exponential:MEAN"; returns a sampler in seconds.
+    kind, *raw = spec.split(':')
+    args = [float(a) for a in raw]
+    samplers = {
+        "constant": lambda: args[0],
+        "uniform": lambda: rng.uniform(args[0], args[1]),
+        "normal": lambda: rng.gauss(args[0], args[1]),
+        "lognormal": lambda: args[0] * rng.lognormvariate(0, args[1]),
+        "exponential": lambda: rng.expovariate(1 / args[0]) if args[0] else 0.0
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler()) / 1000
+
+
+def parse_keep_alive(value: Any) -> float:
+    # Seconds the model stays loaded; accepts Ollama's "30m"/"1h"/"-1" forms.
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float('inf') if value < 0 else float(value)
+    match = re.fullmatch(r'(-?\d+(?:\.\d+)?)([smh]?)', str(value).strip())
+    if not match:
+        return DEFAULT_KEEP_ALIVE
+    amount = float(match.group(1))
+    if amount < 0:
+        return float('inf')
+    return amount * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def tokenize(text: str) -> List[str]:
+    # Word-sized tokens that concatenate back to the original text.
+    return re.findall(r'\s*\S+', text) or ([text] if text else [])
+
+
+def cassette_key(path: str, body: Dict[str, Any]) -> str:
+    text = body.get('prompt', body.get('input', ''))
+    raw = json.dumps([path, body.get('model'), text, body.get('format')], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    # JSONL file of recorded exchanges; repeated keys are replayed round-robin.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry['key'], []).append(entry)
+                    count += 1
+        return count
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[index % len(entries)]
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.entries.setdefault(entry['key'], []).append(entry)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class FakeOllama:
+    # Synthesizes, records or replays Ollama responses.
+
+    def __init__(self, models: List[str], latency: str = "constant:50", tokens_per_sec: float = 30.0,
+                 prompt_tokens_per_sec: float = 500.0, load_ms: float = 1500.0,
+                 response_tokens: int = 40, embedding_dim: int = 384,
+                 error_rate: float = 0.0, hang_rate: float = 0.0, hang_seconds: float = 30.0,
+                 drop_rate: float = 0.0, seed: Optional[int] = None,
+                 record: Optional[str] = None, replay: Optional[str] = None,
+                 upstream: Optional[str] = None, miss: str = "synthetic",
+                 replay_timing: str = "recorded"):
+        self.models = models
+        self.rng = random.Random(seed)
+        self.latency = parse_latency(latency, self.rng)
+        self.tokens_per_sec = tokens_per_sec
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.load_seconds = load_ms / 1000
+        self.response_tokens = response_tokens
+        self.embedding_dim = embedding_dim
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.drop_rate = drop_rate
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.miss = miss
+        self.replay_timing = replay_timing
+
+        self.recorder = Cassette(record) if record else None
+        self.player = Cassette(replay) if replay else None
+        if self.player:
+            logger.info(f"Loaded {self.player.load()} recorded exchanges from {replay}")
+        if self.recorder and not self.upstream:
+            raise ValueError("Record mode needs --upstream")
+
+        self.session = requests.Session()
+        # model -> time it gets unloaded
+        self._loaded_until = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0, "errors_injected": 0, "hangs_injected": 0, "drops_injected": 0,
+            "cold_loads": 0, "recorded": 0, "replayed": 0, "replay_misses": 0
+        }
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def roll(self) -> float:
+        with self._lock:
+            return self.rng.random()
+
+    def inject_failure(self) -> Optional[Response]:
+        # Injected HTTP 500s and hangs apply to every endpoint except /api/tags.
+        if self.hang_rate and self.roll() < self.hang_rate:
+            self.count("hangs_injected")
+            time.sleep(self.hang_seconds)
+        if self.error_rate and self.roll() < self.error_rate:
+            self.count("errors_injected")
+            return jsonify({"error": "injected failure"}), 500
+        return None
+
+    def model_load(self, model: str, keep_alive: Any) -> float:
+        # Seconds spent loading `model`, or 0 if it is still resident.
+        now = time.time()
+        with self._lock:
+            cold = self._loaded_until.get(model, 0) < now
+            self._loaded_until[model] = now + parse_keep_alive(keep_alive)
+            if cold:
+                self.counters["cold_loads"] += 1
+        return self.load_seconds if cold else 0.0
+
+    def tags(self) -> Dict[str, Any]:
+        return {"models": [
+            {"name": m if ':' in m else f"{m}:latest", "model": m, "size": 3825819519}
+            for m in self.models
+        ]}
+
+    # Synthetic responses
+
+    def synthesize(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = body.get('prompt', '')
+        num_predict = body.get('options', {}).get('num_predict')
+        if num_predict == 0 or not prompt:
+            text = ""
+        elif isinstance(body.get('format'), dict):
+            text = json.dumps(self._from_schema(body['format'], prompt))
+        elif body.get('format') == "json":
+            keys = re.findall(r'"(\w+)"', prompt.split("JSON", 1)[-1]) or ["response"]
+            text = json.dumps({k: self._value_for(k, prompt) for k in keys})
+        elif "Genre:" in prompt and "Title:" in prompt:
+            text = "Genre: {}\nMood: {}\nTitle: {}".format(
+                self._value_for("genre", prompt), self._value_for("mood", prompt),
+                self._value_for("title", prompt)
+            )
+        else:
+            text = self._sentence(num_predict or self.response_tokens)
+
+        prompt_tokens = len(tokenize(prompt))
+        context = body.get('context') or []
+        return {
+            "response": text,
+            "tokens": tokenize(text),
+            "prompt_eval_count": prompt_tokens,
+            "context": context + [zlib.crc32(t.encode('utf-8')) % 32000 for t in tokenize(prompt + text)]
+        }
+
+    def _from_schema(self, schema: Dict[str, Any], prompt: str, key: str = "") -> Any:
+        if 'enum' in schema:
+            return self.rng.choice(schema['enum'])
+        kind = schema.get('type')
+        if kind == 'object':
+            return {k: self._from_schema(s, prompt, k) for k, s in schema.get('properties', {}).items()}
+        if kind == 'array':
+            return [self._from_schema(schema.get('items', {}), prompt, key) for _ in range(self.rng.randint(2, 3))]
+        if kind in ('integer', 'number'):
+            return self.rng.randint(0, 100)
+        if kind == 'boolean':
+            return self.rng.random() < 0.5
+        return self._value_for(key, prompt)
+
+    def _value_for(self, key: str, prompt: str) -> str:
+        # Pick from a "<...key...>: a, b, c" line of the prompt, preferring the available/suggested ones.
+        options = []
+        separator = None if key.startswith("hash") else ','
+        for line in prompt.splitlines():
+            label, _, values = line.partition(':')
+            if not key or key[:4].lower() not in label.lower() or 'avoid' in label.lower():
+                continue
+            # Skip format placeholders like "Title: [title]"
+            options = [v.strip() for v in values.split(separator) if v.strip() and not v.strip().startswith('[')]
+            if options:
+                break
+        if options:
+            return self.rng.choice(options)
+        if key == "title":
+            return " ".join(w.capitalize() for w in self.rng.sample(WORDS, 2))
+        if key in ("hashtags", "tags"):
+            return "#" + self.rng.choice(WORDS).capitalize()
+        return self._sentence(8)
+
+    def _sentence(self, count: int) -> str:
+        words = [self.rng.choice(WORDS) for _ in range(max(1, count))]
+        return " ".join(words).capitalize() + "."
+
+    def timings(self, result: Dict[str, Any], overhead: float, load: float) -> Dict[str, int]:
+        prompt_eval = result['prompt_eval_count'] / self.prompt_tokens_per_sec
+        eval_count = len(result['tokens'])
+        eval_time = eval_count / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        return {
+            "total_duration": int((overhead + load + prompt_eval + eval_time) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": result['prompt_eval_count'],
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_time * 1e9)
+        }
+
+    # Endpoints
+
+    def generate(self, body: Dict[str, Any]):
+        failure = self.inject_failure()
+        if failure:
+            return failure
+
+        if self.recorder:
+            return self._record_generate(body)
+
+        entry = self.player.get(cassette_key("/api/generate", body)) if self.player else None
+        if self.player:
+            self.count("replayed" if entry else "replay_misses")
+            if entry is None and self.miss == "error":
+                return jsonify({"error": "no recorded response for this request"}), 404
+
+        load = self.model_load(body.get('model', ''), body.get('keep_alive'))
+        if entry:
+            result = {
+                "response": entry['response'],
+                "tokens": entry.get('tokens') or tokenize(entry['response']),
+                "prompt_eval_count": entry['data'].get('prompt_eval_count', 0),
+                "context": entry['data'].get('context', [])
+            }
+        else:
+            result = self.synthesize(body)
+
+        overhead = self.latency()
+        timings = self.timings(result, overhead, load)
+        if entry and self.replay_timing == "recorded":
+            timings = {k: entry['data'].get(k, v) for k, v in timings.items()}
+            # Recorded runs already include their model load
+            load = timings['load_duration'] / 1e9
+            overhead = (timings['total_duration'] - timings['eval_duration']) / 1e9 - load
+
+        before_first_token = overhead + load
+        if not entry or self.replay_timing != "recorded":
+            before_first_token += timings['prompt_eval_duration'] / 1e9
+        per_token = timings['eval_duration'] / 1e9 / max(1, len(result['tokens']))
+
+        final = {
+            "model": body.get('model'),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "done": True,
+            "done_reason": "stop",
+            "context": result['context'],
+            **timings
+        }
+
+        if body.get('stream', True):
+            return Response(self._stream(result['tokens'], final, before_first_token, per_token),
+                            mimetype='application/x-ndjson')
+
+        time.sleep(before_first_token + per_token * len(result['tokens']))
+        return jsonify({**final, "response": result['response']})
+
+    def _stream(self, tokens: List[str], final: Dict[str, Any],
+                before_first_token: float, per_token: float) -> Iterator[str]:
+        time.sleep(before_first_token)
+        drop_at = None
+        if self.drop_rate and tokens and self.roll() < self.drop_rate:
+            drop_at = self.rng.randrange(len(tokens))
+
+        for i, token in enumerate(tokens):
+            if i == drop_at:
+                self.count("drops_injected")
+                # Raising mid-body makes the server abort the chunked response
+                raise ConnectionAbortedError("injected stream drop")
+            time.sleep(per_token)
+            yield json.dumps({"model": final['model'], "created_at": final['created_at'],
+                              "response": token, "done": False}) + "\n"
+        yield json.dumps({**final, "response": ""}) + "\n"
+
+    def _record_generate(self, body: Dict[str, Any]):
+        key = cassette_key("/api/generate", body)
+        stream = body.get('stream', True)
+        upstream = self.session.post(f"{self.upstream}/api/generate", json=body, stream=stream, timeout=600)
+        if upstream.status_code != 200:
+            return Response(upstream.content, status=upstream.status_code, mimetype='application/json')
+
+        if not stream:
+            data = upstream.json()
+            self._save(key, body, data.get('response', ''), None, data)
+            return jsonify(data)
+
+        def relay():
+            tokens = []
+            try:
+                for line in upstream.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        tokens.append(chunk['response'])
+                    if chunk.get('done'):
+                        self._save(key, body, "".join(tokens), tokens, chunk)
+                    yield line.decode('utf-8') + "\n"
+            finally:
+                upstream.close()
+
+        return Response(relay(), mimetype='application/x-ndjson')
+
+    def _save(self, key: str, body: Dict[str, Any], text: str,
+              tokens: Optional[List[str]], data: Dict[str, Any]):
+        self.recorder.append({
+            "key": key,
+            "path": "/api/generate",
+            "model": body.get('model'),
+            "prompt": body.get('prompt', ''),
+            "format": body.get('format'),
+            "response": text,
+            "tokens": tokens,
+            "data": {k: v for k, v in data.items() if k != 'response'},
+            "recorded_at": time.time()
+        })
+        self.count("recorded")
+
+    def embeddings(self, path: str, body: Dict[str, Any]):
+        failure = self.inject_failure()
+        if failure:
+            return failure
+
+        if self.recorder:
+            response = self.session.post(f"{self.upstream}{path}", json=body, timeout=600)
+            if response.status_code == 200:
+                self.recorder.append({"key": cassette_key(path, body), "path": path,
+                                      "model": body.get('model'), "data": response.json(),
+                                      "recorded_at": time.time()})
+                self.count("recorded")
+            return Response(response.content, status=response.status_code, mimetype='application/json')
+
+        entry = self.player.get(cassette_key(path, body)) if self.player else None
+        if self.player:
+            self.count("replayed" if entry else "replay_misses")
+        time.sleep(self.latency() / 10)
+        if entry:
+            return jsonify(entry['data'])
+        if self.player and self.miss == "error":
+            return jsonify({"error": "no recorded response for this request"}), 404
+
+        if path == "/api/embed":
+            inputs = body.get('input', '')
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            return jsonify({"model": body.get('model'), "embeddings": [self.embed(t) for t in inputs]})
+        return jsonify({"embedding": self.embed(body.get('prompt', ''))})
+
+    def embed(self, text: str) -> List[float]:
+        # Deterministic unit vector from hashed word features, so similar texts land close together.
+        vector = [0.0] * self.embedding_dim
+        for word in re.findall(r'\w+', text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.embedding_dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
+
+
+def create_app(fake: FakeOllama) -> Flask:
+    app = Flask(__name__)
+
+    @app.before_request
+    def count_request():
+        fake.count("requests")
+
+    @app.route('/')
+    def root():
+        return "Ollama is running"
+
+    @app.route('/api/tags')
+    def tags():
+        return jsonify(fake.tags())
+
+    @app.route('/api/generate', methods=['POST'])
+    def generate():
+        return fake.generate(request.get_json(force=True) or {})
+
+    @app.route('/api/embeddings', methods=['POST'])
+    @app.route('/api/embed', methods=['POST'])
+    def embeddings():
+        return fake.embeddings(request.path, request.get_json(force=True) or {})
+
+    @app.route('/_fake/stats')
+    def stats():
+        return jsonify(fake.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks and load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--models', default=OLLAMA_MODEL, help="comma-separated model names")
+    parser.add_argument('--latency', default="constant:50",
+                        help="per-request overhead in ms: constant:MS, uniform:LO:HI, normal:MEAN:STD, "
+                             "lognormal:MEDIAN:SIGMA or exponential:MEAN")
+    parser.add_argument('--tokens-per-sec', type=float, default=30.0)
+    parser.add_argument('--prompt-tokens-per-sec', type=float, default=500.0)
+    parser.add_argument('--load-ms', type=float, default=1500.0, help="cold model load time")
+    parser.add_argument('--response-tokens', type=int, default=40)
+    parser.add_argument('--embedding-dim', type=int, default=384)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="share of requests stalled for --hang-seconds")
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="share of streams cut mid-response")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--record', metavar='CASSETTE', help="proxy --upstream and append exchanges here")
+    parser.add_argument('--upstream', help="real Ollama URL for record mode")
+    parser.add_argument('--replay', metavar='CASSETTE', help="serve recorded exchanges")
+    parser.add_argument('--miss', choices=["synthetic", "error"], default="synthetic",
+                        help="what replay does for unrecorded requests")
+    parser.add_argument('--replay-timing', choices=["recorded", "synthetic"], default="recorded")
+    parser.add_argument('--quiet', action='store_true', help="don't log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.quiet:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    fake = FakeOllama(
+        models=[m.strip() for m in args.models.split(',') if m.strip()],
+        latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec, load_ms=args.load_ms,
+        response_tokens=args.response_tokens, embedding_dim=args.embedding_dim,
+        error_rate=args.error_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+        drop_rate=args.drop_rate, seed=args.seed, record=args.record, replay=args.replay,
+        upstream=args.upstream, miss=args.miss, replay_timing=args.replay_timing
+    )
+    mode = "recording" if args.record else "replaying" if args.replay else "synthetic"
+    logger.info(f"Fake Ollama ({mode}) on http://{args.host}:{args.port}")
+    create_app(fake).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
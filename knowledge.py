@@ -2,54 +2,155 @@
 
 import os
 import json
+import time
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import threading
+import importlib.util
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
-try:
-    import chromadb
-    from chromadb.config import Settings
-    CHROMADB_AVAILABLE = True
-except ImportError:
-    CHROMADB_AVAILABLE = False
+# chromadb (and its embedding model) is imported on first vector use, not at import time
+CHROMADB_AVAILABLE = importlib.util.find_spec("chromadb") is not None
+if not CHROMADB_AVAILABLE:
     logging.warning("ChromaDB not available, falling back to simple storage")
 
-from config import CHROMA_DB_PATH, GENRE_CHARACTERISTICS, MOOD_BY_TIME
+from config import CHROMA_DB_PATH, GENRE_CHARACTERISTICS, MOOD_BY_TIME, VECTOR_INDEX_PATH
+from track_index import LOAD_PAGE_SIZE, RecentTracksIndex, TrackMetadataIndex, collection_pages, track_document
+from track_dedup import ContentHashIndex, TrackIdGenerator, content_hash
+from track_writer import TrackWriteBuffer
+from track_store import TrackStore
+from knowledge_state import SnapshotState
+from template_ranking import TemplateRanking
+from knowledge_snapshot import (BLOCK_ROWS, SnapshotFile, check_embedder, snapshot_tracks, snapshot_vector_index,
+                                vector_index_sections, write_knowledge_snapshot)
+from embedding_cache import QueryEmbeddingCache, context_queries, embedding_model_id
+from vector_index import NUMPY_AVAILABLE, VectorIndex, create_embedder, empty_result
 
 logger = logging.getLogger(__name__)
 
+# Bump to force a re-seed of the context collection when the seed layout changes
+SEED_VERSION = 1
+
+
+def seed_fingerprint() -> str:
+    payload = json.dumps([SEED_VERSION, GENRE_CHARACTERISTICS, MOOD_BY_TIME], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
 
 class KnowledgeBase:
     # Manages music knowledge using ChromaDB for semantic search and retrieval.
     
     def __init__(self, persist_directory: str = CHROMA_DB_PATH):
         self.persist_directory = persist_directory
+        # Newest tracks, so recent lookups don't scan the whole collection
+        self.recent = RecentTracksIndex()
+        # Genre/mood/generation_method and timestamp indexes for query_tracks
+        self.track_meta = TrackMetadataIndex()
+        # Tracks are written to ChromaDB in batches, behind the caller
+        self.writer = TrackWriteBuffer(self._write_tracks, on_drop=self._release_tracks)
+        self.track_ids = TrackIdGenerator()
+        # Normalized (title, genre, mood) -> stored id; repeats skip embedding
+        self.content_hashes = ContentHashIndex()
+        # Per-phase init times in ms, filled in when the store is opened
+        self.startup_timings = {}
+        # Marketing templates aren't stored in ChromaDB; engagement rankings are in-memory
+        self.templates = TemplateRanking()
+        # Fallback data as copy-on-write snapshots: get() never locks, add_tracks writes
+        self.fallback_tracks = TrackStore()
+        self.state = SnapshotState({
+            'tracks': self.fallback_tracks.prefix(),
+            'genre_characteristics': GENRE_CHARACTERISTICS,
+            'mood_by_time': MOOD_BY_TIME,
+            'recent_genres': []
+        })
         
-        if CHROMADB_AVAILABLE:
-            self._init_chromadb()
-        else:
+        self.client = None
+        self.embedder = None
+        self.query_embeddings = None
+        # NumPy similarity search used when ChromaDB is unavailable
+        self.vector_index = None
+        self.tracks_collection = None
+        self.context_collection = None
+        self._store_ready = False
+        self._store_lock = threading.Lock()
+        # Snapshot file the fallback vector index is mapped from, if any
+        self.snapshot = None
+        
+        if not CHROMADB_AVAILABLE:
             self._init_fallback()
     
+    def _ensure_store(self) -> bool:
+        # Open ChromaDB on first vector use; returns False when running on fallback storage.
+        if not self._store_ready:
+            with self._store_lock:
+                if not self._store_ready:
+                    if CHROMADB_AVAILABLE:
+                        self._init_chromadb()
+                    self._store_ready = True
+        return self.client is not None
+    
     def _init_chromadb(self):
-        # Initialize ChromaDB client and collections.
+        # Initialize ChromaDB client and collections, timing each phase.
+        timings = self.startup_timings
+        
+        def phase(name: str, started: float) -> float:
+            now = time.perf_counter()
+            timings[name] = round((now - started) * 1000, 2)
+            return now
+        
         try:
+            started = time.perf_counter()
+            import chromadb
+            from chromadb.config import Settings
+            from chromadb.utils import embedding_functions
+            mark = phase("import", started)
+            
             self.client = chromadb.Client(Settings(
                 persist_directory=self.persist_directory,
                 anonymized_telemetry=False
             ))
+            mark = phase("client", mark)
+            
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            self.embedder = embedding_function
+            self.query_embeddings = QueryEmbeddingCache(embedding_function, embedding_model_id(embedding_function))
+            mark = phase("embedding_function", mark)
             
             self.tracks_collection = self.client.get_or_create_collection(
                 name="music_tracks",
-                metadata={"description": "Generated music tracks"}
+                metadata={"description": "Generated music tracks"},
+                embedding_function=embedding_function
             )
             
             self.context_collection = self.client.get_or_create_collection(
                 name="music_context",
-                metadata={"description": "Music generation context and rules"}
+                metadata={"description": "Music generation context and rules"},
+                embedding_function=embedding_function
             )
+            mark = phase("collections", mark)
             
             self._seed_initial_knowledge()
-            logger.info("ChromaDB initialized successfully")
+            mark = phase("seed", mark)
+            
+            for ids, metadatas in collection_pages(self.tracks_collection):
+                self.track_meta.add_many(metadatas)
+                self.content_hashes.add_many(ids, metadatas)
+                for track_id in ids:
+                    self.track_ids.observe(track_id)
+            mark = phase("track_indexes", mark)
+            
+            # Newest tracks by timestamp, from the index just built
+            loaded = self.recent.load_from_index(self.track_meta)
+            mark = phase("recent_index", mark)
+            
+            self._warm_query_embeddings()
+            mark = phase("query_embeddings", mark)
+            
+            self.writer.start()
+            timings["total"] = round((mark - started) * 1000, 2)
+            logger.info(f"ChromaDB initialized successfully ({loaded} recent tracks indexed, "
+                        f"startup ms: {timings})")
             
         except Exception as e:
             logger.error(f"Failed to initialize ChromaDB: {e}")
@@ -60,102 +161,374 @@ class KnowledgeBase:
         self.client = None
         self.tracks_collection = None
         self.context_collection = None
-        self.fallback_data = {
-            'tracks': [],
-            'genre_characteristics': GENRE_CHARACTERISTICS,
-            'mood_by_time': MOOD_BY_TIME,
-            'recent_genres': []
-        }
-        logger.info("Using fallback JSON storage")
+        if NUMPY_AVAILABLE:
+            self.embedder = create_embedder()
+            self.query_embeddings = QueryEmbeddingCache(self.embedder, embedding_model_id(self.embedder))
+            loaded = None
+            if VECTOR_INDEX_PATH:
+                try:
+                    loaded = VectorIndex.load(VECTOR_INDEX_PATH)
+                except Exception as e:
+                    logger.error(f"Failed to load vector index from {VECTOR_INDEX_PATH}, starting empty: {e}")
+            self.vector_index = loaded if loaded is not None else VectorIndex()
+            self._warm_query_embeddings()
+        self._store_ready = True
+        logger.info(f"Using fallback JSON storage (vector search: {'numpy' if self.vector_index is not None else 'off'})")
+    
+    def _warm_query_embeddings(self):
+        # Precompute the per-time-of-day queries MusicAgent._build_context sends.
+        try:
+            self.query_embeddings.warm(context_queries(MOOD_BY_TIME))
+        except Exception as e:
+            logger.error(f"Failed to warm query embeddings: {e}")
     
     def _seed_initial_knowledge(self):
-        # Seed ChromaDB with initial music knowledge.
+        # Seed ChromaDB with initial music knowledge as one upsert, skipped when the
+        # fingerprint stored on the collection matches the current seed data.
         if not self.context_collection:
             return
         
         try:
-            count = self.context_collection.count()
-            if count > 0:
+            fingerprint = seed_fingerprint()
+            metadata = dict(self.context_collection.metadata or {})
+            if metadata.get("seed_fingerprint") == fingerprint:
                 return
             
-            # Add genre characteristics
+            ids, documents, metadatas = [], [], []
+            
+            # Genre characteristics
             for genre, chars in GENRE_CHARACTERISTICS.items():
-                text = f"Genre {genre}: {chars['description']}"
-                self.context_collection.add(
-                    documents=[text],
-                    metadatas=[{"type": "genre", "genre": genre, **chars}],
-                    ids=[f"genre_{genre}"]
-                )
+                ids.append(f"genre_{genre}")
+                documents.append(f"Genre {genre}: {chars['description']}")
+                metadatas.append({"type": "genre", "genre": genre, **chars})
             
-            # Add mood mappings
+            # Mood mappings
             for time_period, moods in MOOD_BY_TIME.items():
-                text = f"Time period {time_period} suggests moods: {', '.join(moods)}"
-                self.context_collection.add(
-                    documents=[text],
-                    metadatas=[{"type": "mood_mapping", "time": time_period, "moods": json.dumps(moods)}],
-                    ids=[f"mood_{time_period}"]
-                )
+                ids.append(f"mood_{time_period}")
+                documents.append(f"Time period {time_period} suggests moods: {', '.join(moods)}")
+                metadatas.append({"type": "mood_mapping", "time": time_period, "moods": json.dumps(moods)})
             
-            logger.info("Initial knowledge seeded to ChromaDB")
+            self.context_collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+            metadata["seed_fingerprint"] = fingerprint
+            self.context_collection.modify(metadata=metadata)
+            
+            logger.info(f"Initial knowledge seeded to ChromaDB ({len(ids)} entries, seed {fingerprint})")
             
         except Exception as e:
             logger.error(f"Failed to seed knowledge: {e}")
     
     def add_track(self, track: Dict[str, str]):
         # Add a generated track to the knowledge base.
+        self.add_tracks([track])
+    
+    def add_tracks(self, tracks: Iterable[Dict[str, str]]):
+        # Add tracks in bulk; with ChromaDB they are queued and embedded/written in batches.
+        # A track whose (title, genre, mood) is already stored only refreshes that entry's metadata.
         try:
-            if self.tracks_collection:
-                text = f"{track['genre']} music with {track['mood']} mood: {track['title']}"
-                self.tracks_collection.add(
-                    documents=[text],
-                    metadatas=[track],
-                    ids=[f"track_{datetime.now().timestamp()}"]
-                )
-                logger.info(f"Track added to ChromaDB: {track['title']}")
-            else:
-                self.fallback_data['tracks'].append(track)
-                if track['genre'] not in self.fallback_data['recent_genres']:
-                    self.fallback_data['recent_genres'].append(track['genre'])
-                logger.info(f"Track added to fallback: {track['title']}")
-                
+            if not self._ensure_store():
+                self._add_fallback_tracks(list(tracks))
+                return
+            with self.state.lock:
+                records = []
+                duplicates = 0
+                for track in tracks:
+                    digest = content_hash(track)
+                    track_id = self.track_ids.next_id()
+                    existing = self.content_hashes.claim(digest, track_id)
+                    metadata = {**track, 'content_hash': digest}
+                    if existing is None:
+                        # The row lets a write that is given up on be unindexed again
+                        records.append((track_id, track_document(track), metadata, self.track_meta.add(track)))
+                    else:
+                        # No document, so nothing is re-embedded
+                        records.append((existing, None, metadata, None))
+                        duplicates += 1
+                    self.recent.add(track)
+                self.writer.add(records)
+                logger.info(f"{len(records)} track(s) queued for ChromaDB, {duplicates} duplicate(s) "
+                            f"({len(self.writer)} pending)")
         except Exception as e:
             logger.error(f"Failed to add track: {e}")
     
+    def _add_fallback_tracks(self, tracks: List[Dict[str, str]]):
+        new_tracks = []
+        with self.state.lock:
+            genres = list(self.state.get('recent_genres'))
+            for track in tracks:
+                self.fallback_tracks.append(track)
+                if track['genre'] not in genres:
+                    genres.append(track['genre'])
+                track_id = self.track_ids.next_id()
+                if self.content_hashes.claim(content_hash(track), track_id) is None:
+                    new_tracks.append((track_id, track))
+                    self.track_meta.add(track)
+                logger.info(f"Track added to fallback: {track['title']}")
+            self.state.publish(tracks=self.fallback_tracks.prefix(), recent_genres=genres)
+        self._index_fallback_tracks(new_tracks)
+    
+    def _index_fallback_tracks(self, tracks: List[Tuple[str, Dict[str, str]]]):
+        if self.vector_index is None or not tracks:
+            return
+        try:
+            ids = [track_id for track_id, _ in tracks]
+            metadatas = [track for _, track in tracks]
+            documents = [track_document(t) for t in metadatas]
+            self.vector_index.add(ids, self.embedder(documents), documents, metadatas)
+        except Exception as e:
+            logger.error(f"Failed to index {len(tracks)} track(s) for fallback search: {e}")
+    
+    def _write_tracks(self, records: List[tuple]):
+        # New tracks are added (and embedded); duplicates, queued with no document, are
+        # metadata-only updates. Adds go first so an update never precedes its add.
+        new = [r for r in records if r[1] is not None]
+        # Chroma rejects repeated ids in one call; the latest metadata wins
+        repeats = list({r[0]: r for r in records if r[1] is None}.values())
+        if new:
+            self.tracks_collection.add(
+                ids=[r[0] for r in new],
+                documents=[r[1] for r in new],
+                metadatas=[r[2] for r in new]
+            )
+        if repeats:
+            self.tracks_collection.update(
+                ids=[r[0] for r in repeats],
+                metadatas=[r[2] for r in repeats]
+            )
+        logger.info(f"{len(new)} track(s) written to ChromaDB, {len(repeats)} updated")
+    
+    def _release_tracks(self, records: List[tuple]):
+        # A batch the writer gave up on: its new tracks were never stored, so they no longer
+        # claim their content hash (a later copy is added, not treated as a duplicate) and
+        # leave the metadata index. Both lock for themselves: this runs inside writer.flush(),
+        # which some callers reach holding self.state.lock.
+        for track_id, document, metadata, row in records:
+            if document is None:
+                continue
+            self.content_hashes.release(metadata['content_hash'], track_id)
+            self.track_meta.discard(row)
+        logger.warning(f"Released {sum(r[1] is not None for r in records)} unwritten track(s)")
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        # Write tracks, templates and stored embeddings in knowledge_snapshot's format, so a
+        # restore (into ChromaDB or the fallback index) never re-embeds.
+        if not self._ensure_store():
+            return self._export_fallback_snapshot(path)
+        
+        # Holding the lock keeps add_tracks from queueing writes, so every pass sees the same rows
+        with self.state.lock:
+            self.writer.flush()
+            total = self.tracks_collection.count()
+            
+            def pages(include: List[str]) -> Iterable[Dict[str, Any]]:
+                for offset in range(0, total, LOAD_PAGE_SIZE):
+                    yield self.tracks_collection.get(offset=offset, limit=LOAD_PAGE_SIZE, include=include)
+            
+            def tracks():
+                for page in pages(["metadatas"]):
+                    for metadata in page['metadatas']:
+                        yield {k: v for k, v in metadata.items() if k != 'content_hash'}
+            
+            def records():
+                for page in pages(["documents", "metadatas"]):
+                    yield from ([*row] for row in zip(page['ids'], page['documents'], page['metadatas']))
+            
+            def blocks():
+                # Normalised like VectorIndex rows, so the fallback index can map them directly
+                import numpy as np
+                for page in pages(["embeddings"]):
+                    embeddings = np.asarray(page['embeddings'], dtype=np.float32)
+                    for start in range(0, len(embeddings), BLOCK_ROWS):
+                        yield VectorIndex._normalise(embeddings[start:start + BLOCK_ROWS])
+            
+            vectors = None
+            if total:
+                dim = len(self.tracks_collection.get(limit=1, include=["embeddings"])['embeddings'][0])
+                vectors = (records(), blocks(), dim, "float32", None)
+            meta = write_knowledge_snapshot(path, {
+                "backend": "chromadb",
+                "created": datetime.now().isoformat(),
+                "embedder": embedding_model_id(self.embedder)
+            }, {
+                "recent_genres": self.recent.recent_genres(10),
+                "marketing_templates": self.templates.templates(),
+                "template_engagement": self.templates.export(),
+                "last_track_id": self.track_ids.last_id()
+            }, tracks(), self.content_hashes.export(), vectors)
+        logger.info(f"Exported knowledge base snapshot to {path}: {meta['tracks']} track(s), "
+                    f"{meta['vectors']} vector(s)")
+        return meta
+    
+    def _export_fallback_snapshot(self, path: str) -> Dict[str, Any]:
+        with self.state.lock:
+            snapshot = self.state.read()
+            vectors = vector_index_sections(self.vector_index) if self.vector_index is not None else None
+            state = {
+                "recent_genres": list(snapshot.data['recent_genres']),
+                "marketing_templates": self.templates.templates(),
+                "template_engagement": self.templates.export(),
+                "last_track_id": self.track_ids.last_id()
+            }
+            dedup = self.content_hashes.export()
+        return write_knowledge_snapshot(path, {
+            "backend": "fallback",
+            "created": datetime.now().isoformat(),
+            "embedder": embedding_model_id(self.embedder) if vectors is not None else None
+        }, state, snapshot.data['tracks'], dedup, vectors)
+    
+    def load_snapshot(self, path: str) -> Dict[str, Any]:
+        # Replace the stored tracks and templates with a snapshot's. ChromaDB gets the stored
+        # embeddings as-is; the fallback index maps them straight from the file.
+        snapshot = SnapshotFile(path)
+        state = snapshot.json("state")
+        templates = TemplateRanking(state['marketing_templates'])
+        templates.load(state['template_engagement'])
+        
+        if not self._ensure_store():
+            self._load_fallback_snapshot(snapshot, state, templates)
+        else:
+            if "vectors.matrix" in snapshot:
+                check_embedder(snapshot, embedding_model_id(self.embedder))
+            with self.state.lock:
+                self.writer.flush()
+                # A batch still failing belongs to the collection being replaced
+                if self.writer.discard():
+                    logger.warning("Discarded unwritten tracks queued before the snapshot load")
+                self.client.delete_collection("music_tracks")
+                self.tracks_collection = self.client.get_or_create_collection(
+                    name="music_tracks",
+                    metadata={"description": "Generated music tracks"},
+                    embedding_function=self.embedder
+                )
+                self.track_meta = TrackMetadataIndex()
+                self.content_hashes = ContentHashIndex()
+                self.track_ids = TrackIdGenerator()
+                if state.get('last_track_id'):
+                    self.track_ids.observe(state['last_track_id'])
+                
+                if "vectors.matrix" in snapshot:
+                    records, matrix = snapshot.records("vectors"), snapshot.matrix("vectors.matrix")
+                    for start in range(0, len(records), LOAD_PAGE_SIZE):
+                        page = records[start:start + LOAD_PAGE_SIZE]
+                        ids = [r[0] for r in page]
+                        metadatas = [{**r[2], 'content_hash': r[2].get('content_hash') or content_hash(r[2])}
+                                     for r in page]
+                        self.tracks_collection.add(
+                            ids=ids,
+                            embeddings=matrix[start:start + len(page)].tolist(),
+                            documents=[r[1] for r in page],
+                            metadatas=metadatas
+                        )
+                        self.track_meta.add_many(metadatas)
+                        self.content_hashes.add_many(ids, metadatas)
+                        for track_id in ids:
+                            self.track_ids.observe(track_id)
+                self.recent.load_from_index(self.track_meta)
+                self.templates = templates
+            if "vectors.matrix" not in snapshot:
+                # No embeddings to reuse: these are embedded like any added track
+                logger.warning(f"Snapshot {path} has no embeddings, its tracks will be re-embedded")
+                self.add_tracks(snapshot_tracks(snapshot))
+        
+        logger.info(f"Loaded knowledge base snapshot {path}: {snapshot.meta.get('tracks')} track(s), "
+                    f"{snapshot.meta.get('vectors')} vector(s)")
+        return snapshot.meta
+    
+    def _load_fallback_snapshot(self, snapshot: SnapshotFile, state: Dict[str, Any], templates: TemplateRanking):
+        vector_index = None
+        if self.vector_index is not None:
+            vector_index = snapshot_vector_index(snapshot, embedding_model_id(self.embedder))
+        with self.state.lock:
+            self.fallback_tracks = TrackStore()
+            self.fallback_tracks.extend(snapshot_tracks(snapshot))
+            self.track_meta = TrackMetadataIndex()
+            self.track_meta.add_many(self.fallback_tracks)
+            self.track_ids = TrackIdGenerator()
+            if state.get('last_track_id'):
+                self.track_ids.observe(state['last_track_id'])
+            self.content_hashes = ContentHashIndex()
+            self.content_hashes.load(snapshot.json("dedup"))
+            if vector_index is not None:
+                self.vector_index = vector_index
+            self.templates = templates
+            self.snapshot = snapshot
+            self.state.publish(tracks=self.fallback_tracks.prefix(), recent_genres=state['recent_genres'])
+    
+    def flush(self) -> int:
+        # Write all queued tracks now; returns how many were written.
+        return self.writer.flush()
+    
+    def close(self):
+        self.writer.close()
+        if self.vector_index is not None and VECTOR_INDEX_PATH:
+            self.vector_index.save(VECTOR_INDEX_PATH)
+    
+    def get_stats(self) -> Dict:
+        if not self._store_ready:
+            backend = "pending"
+        else:
+            backend = "chromadb" if self.client else "fallback"
+        return {
+            "backend": backend,
+            "startup_ms": self.startup_timings,
+            "query_embeddings": self.query_embeddings.stats() if self.query_embeddings else None,
+            "vector_index": self.vector_index.stats() if self.vector_index is not None else None,
+            "recent_index": len(self.recent),
+            "snapshots": self.state.stats(),
+            "track_indexes": self.track_meta.stats(),
+            "dedup": self.content_hashes.stats(),
+            "templates": self.templates.stats(),
+            "track_writes": self.writer.stats(),
+            "snapshot": self.snapshot.stats() if self.snapshot is not None else None
+        }
+    
     def query_similar_tracks(self, query: str, n_results: int = 5) -> Dict:
         # Query for similar tracks using semantic search.
         try:
-            if self.tracks_collection:
+            if self._ensure_store():
+                # Read-your-writes: queued tracks must be searchable
+                if len(self.writer):
+                    self.writer.flush()
                 results = self.tracks_collection.query(
-                    query_texts=[query],
+                    query_embeddings=[self.query_embeddings.get(query)],
                     n_results=n_results
                 )
                 return results
+            elif self.vector_index is not None:
+                return self.vector_index.query(self.query_embeddings.get(query), n_results)
             else:
-                # Simple fallback search
-                return {
-                    'documents': [[]],
-                    'metadatas': [[]],
-                    'distances': [[]]
-                }
+                return empty_result()
                 
         except Exception as e:
             logger.error(f"Query failed: {e}")
-            return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+            return empty_result()
+    
+    def query_tracks(self, filters: Optional[Dict[str, Any]] = None, time_range: Optional[Tuple[Any, Any]] = None,
+                     limit: int = 50, offset: int = 0) -> Dict:
+        # Filter stored tracks by genre/mood/generation_method and timestamp range, newest first.
+        self._ensure_store()
+        return self.track_meta.query(filters, time_range, limit, offset)
+    
+    def query_marketing_templates(self, genre: str, n_results: int = 1) -> Dict:
+        return self.templates.query(genre, n_results)
+    
+    def top_marketing_templates(self, genre: Optional[str] = None, k: int = 5) -> List[Dict[str, Any]]:
+        return self.templates.top_k(genre, k)
+    
+    def record_template_engagement(self, template_id: str, engagement: float, genre: Optional[str] = None):
+        self.templates.record(template_id, engagement, genre)
     
     def get(self, key: str, default=None):
-        # Get data from knowledge base.
-        if self.client:
+        # Get data from knowledge base; static keys never open the vector store.
+        if key == 'genre_characteristics':
+            return GENRE_CHARACTERISTICS
+        elif key == 'mood_by_time':
+            return MOOD_BY_TIME
+        
+        if self._ensure_store():
             try:
                 if key == 'recent_genres':
-                    results = self.tracks_collection.get()
-                    if results and results['metadatas']:
-                        return [m['genre'] for m in results['metadatas'][-10:]]
-                    return []
-                elif key == 'genre_characteristics':
-                    return GENRE_CHARACTERISTICS
-                elif key == 'mood_by_time':
-                    return MOOD_BY_TIME
+                    return self.recent.recent_genres(10)
             except Exception as e:
                 logger.error(f"Failed to get {key}: {e}")
         
-        return self.fallback_data.get(key, default)
+        return self.state.get(key, default)
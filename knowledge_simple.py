@@ -3,19 +3,108 @@
 
 import json
 import logging
-from typing import Dict, List, Any
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
-from config import KNOWLEDGE_BASE_PATH, MAX_RECENT_GENRES
+from config import (KNOWLEDGE_BASE_PATH, KNOWLEDGE_JOURNAL_DIR, MAX_RECENT_GENRES, TRACK_HOT_WINDOW,
+                    TRACK_SEGMENT_DIR, TRACK_SEGMENT_SIZE, VECTOR_INDEX_PATH)
+from track_index import TrackMetadataIndex, track_document
+from track_dedup import ContentHashIndex, TrackIdColumn, TrackIdGenerator, content_hash
+from track_journal import TrackJournal
+from knowledge_state import SnapshotState
+from template_ranking import TemplateRanking
+from track_store import TrackStore
+from track_segments import TrackSegmentStore
+from knowledge_snapshot import (SnapshotFile, snapshot_segments, snapshot_vector_index, vector_index_sections,
+                                write_knowledge_snapshot)
+from embedding_cache import QueryEmbeddingCache, context_queries, embedding_model_id
+from vector_index import NUMPY_AVAILABLE, VectorIndex, create_embedder, empty_result
 
 logger = logging.getLogger(__name__)
 
+# Journal records with this "kind" are template engagements; everything else is a track
+ENGAGEMENT_RECORD = "template_engagement"
+
 
 class KnowledgeBase:
     # Manages application knowledge base with JSON storage.
     
-    def __init__(self, filepath: str = str(KNOWLEDGE_BASE_PATH)):
+    def __init__(self, filepath: str = str(KNOWLEDGE_BASE_PATH), journal_dir: str = KNOWLEDGE_JOURNAL_DIR,
+                 segment_dir: str = TRACK_SEGMENT_DIR, hot_window: int = TRACK_HOT_WINDOW,
+                 segment_size: int = TRACK_SEGMENT_SIZE):
         self.filepath = filepath
-        self.data = self._load_data()
+        data = self._load_data()
+        data.setdefault('recent_tracks', [])
+        data.setdefault('recent_genres', [])
+        
+        # Added tracks survive restarts through an append-only journal
+        self.journal = None
+        state, replay = self._open_journal(journal_dir) if journal_dir else (None, [])
+        if state is not None:
+            data['recent_tracks'] = state['recent_tracks']
+            data['recent_genres'] = state['recent_genres']
+        
+        # Per-genre template rankings, updated as post engagement is recorded
+        self.templates = TemplateRanking(data.get('marketing_templates', []))
+        if state is not None:
+            self.templates.load(state.get('template_engagement', []))
+        engagements = [r for r in replay if r.get('kind') == ENGAGEMENT_RECORD]
+        replay = [r for r in replay if r.get('kind') != ENGAGEMENT_RECORD]
+        for record in engagements:
+            self._apply_engagement(record)
+        
+        # Tracks older than the hot window are rolled into compressed segment files
+        self.hot_window = max(0, hot_window)
+        self.segment_size = max(1, segment_size)
+        self.segments = self._open_segments(segment_dir) if segment_dir else None
+        if self.segments is not None:
+            # Tracks rolled after the journal snapshot was taken are still in it (or in the replay)
+            skip = max(0, self.segments.archived - (state.get('archived_tracks', 0) if state is not None else 0))
+            seed = list(data['recent_tracks'])
+            data['recent_tracks'] = seed[skip:]
+            replay = replay[max(0, skip - len(seed)):]
+            data['archived_tracks'] = self.segments.archived
+        
+        # recent_tracks is held column-wise; the metadata index reads rows from the same store
+        self.tracks = TrackStore()
+        self.track_meta = TrackMetadataIndex(self.tracks)
+        self.track_meta.add_many(data['recent_tracks'])
+        data['recent_tracks'] = self.tracks.prefix()
+        # (hot store, its index, cold segment summaries), swapped together so queries see each track once
+        self._tiers = (self.tracks, self.track_meta, self.segments.segments if self.segments is not None else [])
+        
+        # Readers get immutable snapshots; add_tracks is the only writer
+        self.state = SnapshotState(data)
+        with self.state.lock:
+            self._apply_tracks(replay)
+            self._roll_cold()
+        if self.journal:
+            self.journal.start()
+        
+        self.track_ids = TrackIdGenerator()
+        self.content_hashes = ContentHashIndex()
+        self.snapshot = None
+        
+        # Similarity search over recent_tracks, when NumPy is installed
+        self.vector_index = None
+        if NUMPY_AVAILABLE:
+            self.embedder = create_embedder()
+            self.query_embeddings = QueryEmbeddingCache(self.embedder, embedding_model_id(self.embedder))
+            self.vector_index = self._keep_off_heap(self._load_vector_index())
+            if self.vector_index is None:
+                self.vector_index = self._keep_off_heap(self._new_vector_index())
+                self._index_history()
+            else:
+                _, _, ids, _, metadatas = self.vector_index.export()
+                self.content_hashes.add_many(ids, metadatas)
+                for track_id in ids:
+                    self.track_ids.observe(track_id)
+            # The first similar-track query of each time of day is then a cache hit
+            try:
+                self.query_embeddings.warm(context_queries(self.get('mood_by_time', {})))
+            except Exception as e:
+                logger.error(f"Failed to warm query embeddings: {e}")
     
     def _load_data(self) -> Dict:
         try:
@@ -25,31 +114,312 @@ class KnowledgeBase:
             logger.error(f"Failed to load knowledge base: {e}")
             return {}
     
+    @property
+    def data(self) -> Mapping[str, Any]:
+        # Read-only view of the current snapshot.
+        return self.state.read().data
+    
+    def _open_journal(self, directory: str) -> Tuple[Optional[Dict], List[Dict[str, str]]]:
+        # Returns (journal snapshot state or None, records to replay after it).
+        try:
+            journal = TrackJournal(directory, self._snapshot_state)
+            state, records = journal.load()
+        except Exception as e:
+            logger.error(f"Failed to open track journal at {directory}: {e}")
+            return None, []
+        self.journal = journal
+        return state, records
+    
+    def _load_vector_index(self) -> Optional[VectorIndex]:
+        # A missing or unreadable saved index is rebuilt from the tracks instead.
+        if not VECTOR_INDEX_PATH:
+            return None
+        try:
+            index = VectorIndex.load(VECTOR_INDEX_PATH, ids=TrackIdColumn(), resolve=self._resolve_track)
+            if index is not None and max(index.refs, default=-1) >= self._history_length():
+                raise ValueError("it refers to tracks this knowledge base no longer has")
+            return index
+        except Exception as e:
+            logger.error(f"Failed to load vector index from {VECTOR_INDEX_PATH}, rebuilding it: {e}")
+            return None
+    
+    def _new_vector_index(self) -> VectorIndex:
+        # Rows refer to tracks by position rather than holding a copy of each one
+        return VectorIndex.from_refs(None, TrackIdColumn(), array('q'), self._resolve_track)
+    
+    def _keep_off_heap(self, index: Optional[VectorIndex]) -> Optional[VectorIndex]:
+        # With cold segments on disk, embeddings are paged to a scratch file beside them rather than
+        # held on the heap, so memory doesn't grow with history (rows are still scanned per query).
+        if index is not None and self.segments is not None:
+            index.use_storage(self.segments.directory)
+        return index
+    
+    def _history_length(self) -> int:
+        # Tracks are numbered in arrival order: cold segments oldest first, then the hot store.
+        tracks, _, segments = self._tiers
+        return sum(summary['count'] for summary in segments) + len(tracks)
+    
+    def _track_at(self, position: int) -> Mapping[str, Any]:
+        tracks, _, segments = self._tiers
+        for summary in segments:
+            if position < summary['count']:
+                return self.segments.track(summary, position)
+            position -= summary['count']
+        return tracks[position]
+    
+    def _resolve_track(self, position: int) -> Tuple[str, Mapping[str, Any]]:
+        track = self._track_at(position)
+        return track_document(track), track
+    
+    def _open_segments(self, directory: str) -> Optional[TrackSegmentStore]:
+        try:
+            return TrackSegmentStore(directory).load()
+        except Exception as e:
+            logger.error(f"Failed to open track segments at {directory}: {e}")
+            return None
+    
+    def _snapshot_state(self) -> Dict:
+        # Called under the journal lock, which _apply_tracks also runs under, so the
+        # published snapshot matches the journal position exactly.
+        snapshot = self.state.read()
+        return {
+            "recent_tracks": snapshot.data['recent_tracks'],
+            "recent_genres": snapshot.data['recent_genres'],
+            "archived_tracks": snapshot.data.get('archived_tracks', 0),
+            "template_engagement": self.templates.export()
+        }
+    
+    def _apply_tracks(self, tracks: List[Dict[str, str]]):
+        # Caller holds self.state.lock.
+        if not tracks:
+            return
+        self.track_meta.add_many(tracks)
+        genres = self.state.get('recent_genres') + tuple(track['genre'] for track in tracks)
+        # The store is append-only, so a prefix view stands in for a copy of every row
+        self.state.publish(recent_tracks=self.tracks.prefix(), recent_genres=genres[-MAX_RECENT_GENRES:])
+    
+    def _roll_cold(self):
+        # Caller holds self.state.lock. Once segment_size tracks sit past the hot window,
+        # the oldest are written to segments and the hot tier is rebuilt from the rest.
+        if self.segments is None:
+            return
+        excess = len(self.tracks) - self.hot_window
+        if excess < self.segment_size:
+            return
+        
+        rolled = 0
+        for start in range(0, excess, self.segment_size):
+            chunk = self.tracks[start:min(excess, start + self.segment_size)]
+            try:
+                self.segments.write([dict(row) for row in chunk])
+            except OSError as e:
+                logger.error(f"Failed to roll {len(chunk)} track(s) into a segment: {e}")
+                break
+            rolled += len(chunk)
+        if not rolled:
+            return
+        
+        hot = TrackStore()
+        track_meta = TrackMetadataIndex(hot)
+        track_meta.add_many(self.tracks[rolled:])
+        self.tracks, self.track_meta = hot, track_meta
+        self._tiers = (hot, track_meta, self.segments.segments)
+        self.state.publish(recent_tracks=hot.prefix(), archived_tracks=self.segments.archived)
+    
     def get(self, key: str, default=None) -> Any:
-        return self.data.get(key, default if default is not None else [])
+        return self.state.get(key, default if default is not None else [])
     
     def add_track(self, track: Dict[str, str]):
-        self.data['recent_tracks'].append(track)
-        self.data['recent_genres'].append(track['genre'])
-        self.data['recent_genres'] = self.data['recent_genres'][-MAX_RECENT_GENRES:]
+        self.add_tracks([track])
     
-    def query_similar_tracks(self, query: str, n_results: int = 3) -> Dict:
-        tracks = self.data.get('recent_tracks', [])[-n_results:]
-        return {"documents": [[]], "metadatas": [[]], "count": len(tracks)}
-    
-    def query_marketing_templates(self, genre: str) -> Dict:
-        templates = self.data.get('marketing_templates', [])
-        best = max(templates, key=lambda t: t['engagement']) if templates else None
-        
-        if best:
-            return {
-                "documents": [[best['pattern']]],
-                "metadatas": [[{
-                    "engagement": best['engagement'],
-                    "best_time": best['best_time']
-                }]]
+    def add_tracks(self, tracks: Iterable[Dict[str, str]]):
+        tracks = list(tracks)
+        with self.state.lock:
+            first = self._history_length()
+            self._journaled(tracks, lambda: self._apply_tracks(tracks))
+            self._roll_cold()
+        self._index_tracks(tracks, first)
+    
+    def _journaled(self, records: List[Dict[str, Any]], apply: Callable[[], None]):
+        # Caller holds self.state.lock. Without a usable journal the change is still applied.
+        if self.journal:
+            try:
+                self.journal.append(records, apply=apply)
+                return
+            except OSError as e:
+                logger.error(f"Failed to journal {len(records)} record(s): {e}")
+        apply()
+    
+    def record_template_engagement(self, template_id: str, engagement: float, genre: Optional[str] = None):
+        # Fold a post's engagement into its template's ranking; raises ValueError for unknown templates.
+        self.templates.validate(template_id, genre)
+        record = {"kind": ENGAGEMENT_RECORD, "template_id": template_id,
+                  "genre": genre, "engagement": float(engagement)}
+        with self.state.lock:
+            self._journaled([record], lambda: self._apply_engagement(record))
+    
+    def _apply_engagement(self, record: Dict[str, Any]):
+        try:
+            self.templates.record(record['template_id'], record['engagement'], record.get('genre'))
+        except ValueError as e:
+            # A replayed record for a template since removed from knowledge_base.json
+            logger.warning(f"Skipping engagement record: {e}")
+    
+    def top_marketing_templates(self, genre: Optional[str] = None, k: int = 5) -> List[Dict[str, Any]]:
+        return self.templates.top_k(genre, k)
+    
+    def _index_tracks(self, tracks: List[Dict[str, str]], first: int):
+        # `first` is the position of tracks[0] (see _history_length). Repeats of an already
+        # indexed (title, genre, mood) are not embedded again.
+        if self.vector_index is None or not tracks:
+            return
+        try:
+            ids, new_tracks, positions = [], [], []
+            for position, track in enumerate(tracks, first):
+                track_id = self.track_ids.next_id()
+                if self.content_hashes.claim(content_hash(track), track_id) is None:
+                    ids.append(track_id)
+                    new_tracks.append(track)
+                    positions.append(position)
+            if not new_tracks:
+                return
+            documents = [track_document(t) for t in new_tracks]
+            self.vector_index.add(ids, self.embedder(documents), documents, new_tracks, positions)
+        except Exception as e:
+            logger.error(f"Failed to index {len(tracks)} track(s) for similarity search: {e}")
+    
+    def _index_history(self):
+        # Index every stored track, cold segments first (decoded one at a time), then the hot tier.
+        tracks, _, segments = self._tiers
+        first = 0
+        for summary in segments:
+            self._index_tracks(self.segments.read(summary), first)
+            first += summary['count']
+        self._index_tracks(tracks, first)
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        # Write every track (cold segment files as they are, then the hot tier), the templates
+        # with their engagement and the vector index, embeddings included, to one binary snapshot.
+        with self.state.lock:
+            # Writers are paused only while the views are pinned, not while they are written
+            snapshot = self.state.read()
+            segments = self._tiers[2]
+            state = {
+                "recent_genres": list(snapshot.data['recent_genres']),
+                "marketing_templates": self.templates.templates(),
+                "template_engagement": self.templates.export(),
+                "last_track_id": self.track_ids.last_id()
             }
-        return {"documents": [[]], "metadatas": [[]]}
-
-
-
+            dedup = self.content_hashes.export()
+            vectors = vector_index_sections(self.vector_index) if self.vector_index is not None else None
+        
+        meta = write_knowledge_snapshot(path, {
+            "backend": "json",
+            "created": datetime.now().isoformat(),
+            "embedder": embedding_model_id(self.embedder) if vectors is not None else None
+        }, state, snapshot.data['recent_tracks'], dedup, vectors,
+            ((summary, self.segments.raw(summary)) for summary in segments))
+        logger.info(f"Exported knowledge base snapshot to {path}: {meta['tracks']} track(s), "
+                    f"{meta['vectors']} vector(s)")
+        return meta
+    
+    def load_snapshot(self, path: str) -> Dict[str, Any]:
+        # Replace tracks, templates and the vector index with a snapshot's. Embeddings and
+        # vector records stay memory-mapped and are read on demand; nothing is re-embedded.
+        snapshot = SnapshotFile(path)
+        state = snapshot.json("state")
+        vector_index = None
+        if self.vector_index is not None:
+            vector_index = self._keep_off_heap(
+                snapshot_vector_index(snapshot, embedding_model_id(self.embedder), self._resolve_track))
+        templates = TemplateRanking(state['marketing_templates'])
+        templates.load(state['template_engagement'])
+        
+        with self.state.lock:
+            # Cold segment files are copied over as they are; without a segment store they are decoded
+            hot = TrackStore()
+            track_meta = TrackMetadataIndex(hot)
+            if self.segments is not None:
+                self.segments.clear()
+            for summary, data in snapshot_segments(snapshot):
+                if self.segments is not None:
+                    self.segments.write_raw(summary, data)
+                else:
+                    track_meta.add_many(TrackSegmentStore.decode(data))
+            track_meta.add_many(snapshot.records("tracks"))
+            self.tracks, self.track_meta = hot, track_meta
+            self._tiers = (hot, track_meta, self.segments.segments if self.segments is not None else [])
+            self.templates = templates
+            
+            self.track_ids = TrackIdGenerator()
+            if state.get('last_track_id'):
+                self.track_ids.observe(state['last_track_id'])
+            self.content_hashes = ContentHashIndex()
+            if vector_index is not None:
+                self.content_hashes.load(snapshot.json("dedup"))
+                self.vector_index = vector_index
+            elif self.vector_index is not None:
+                self.vector_index = self._keep_off_heap(self._new_vector_index())
+                self._index_history()
+            self.snapshot = snapshot
+            self.state.publish(recent_tracks=hot.prefix(), recent_genres=tuple(state['recent_genres']),
+                               marketing_templates=tuple(state['marketing_templates']),
+                               archived_tracks=self.segments.archived if self.segments is not None else 0)
+            self._roll_cold()
+            # The journal restarts from the loaded state
+            if self.journal:
+                self.journal.compact()
+        logger.info(f"Loaded knowledge base snapshot {path}: {snapshot.meta['tracks']} track(s), "
+                    f"{len(vector_index) if vector_index is not None else 0} memory-mapped vector(s)")
+        return snapshot.meta
+    
+    def flush(self) -> int:
+        # Writes are immediate here; kept for parity with the ChromaDB knowledge base.
+        return 0
+    
+    def close(self):
+        if self.journal:
+            self.journal.close()
+        if self.vector_index is not None and VECTOR_INDEX_PATH:
+            # Without a journal the tracks are gone on restart, so positions would point at nothing
+            self.vector_index.save(VECTOR_INDEX_PATH, resolved=self.journal is None)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "json",
+            "recent_tracks": len(self.tracks),
+            "track_store": self.tracks.stats(),
+            "cold_tracks": self.segments.stats() if self.segments is not None else None,
+            "snapshots": self.state.stats(),
+            "track_indexes": self.track_meta.stats(),
+            "journal": self.journal.stats() if self.journal else None,
+            "dedup": self.content_hashes.stats(),
+            "templates": self.templates.stats(),
+            "vector_index": self.vector_index.stats() if self.vector_index is not None else None,
+            "snapshot": self.snapshot.stats() if self.snapshot is not None else None
+        }
+    
+    def query_similar_tracks(self, query: str, n_results: int = 3) -> Dict:
+        results = empty_result()
+        if self.vector_index is not None:
+            try:
+                results = self.vector_index.query(self.query_embeddings.get(query), n_results)
+            except Exception as e:
+                logger.error(f"Query failed: {e}")
+        results["count"] = len(results['documents'][0])
+        return results
+    
+    def query_tracks(self, filters: Optional[Dict[str, Any]] = None, time_range: Optional[Tuple[Any, Any]] = None,
+                     limit: int = 50, offset: int = 0) -> Dict:
+        # Hot tracks first, then segments newest first; paging runs across both tiers.
+        _, track_meta, segments = self._tiers
+        hot = track_meta.query(filters, time_range, limit, offset)
+        if not segments:
+            return hot
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        cold = self.segments.query(filters, time_range, max(0, limit - len(hot['tracks'])),
+                                   max(0, offset - hot['total']), segments)
+        return {"tracks": hot['tracks'] + cold['tracks'], "total": hot['total'] + cold['total']}
+    
+    def query_marketing_templates(self, genre: str, n_results: int = 1) -> Dict:
+        return self.templates.query(genre, n_results)
@@ -0,0 +1,284 @@
+# Binary knowledge base snapshots. One file: a fixed header, then 64-byte-aligned
+# sections, then a JSON table of contents. Embeddings are a raw row-major matrix
+# that np.memmap maps in place; tracks and vector records are UTF-8 JSON blobs
+# behind a uint64 offset table, decoded one record at a time on access. Nothing
+# is read into memory until it is used.
+#
+# Header: magic (8 bytes), format version (u32), reserved (u32), TOC offset (u64), TOC length (u64).
+# TOC: {"meta": {...}, "sections": {name: {"offset", "length", "kind", ...}}}.
+#
+# Knowledge base sections: "state" (recent genres, templates, engagement, last track id),
+# "segment.<i>" (cold track segment files, verbatim) with their summaries in "segments",
+# "tracks" (the remaining tracks, oldest first), "dedup" (content hash -> id), and
+# "vectors" ([id, document, metadata] per row) with "vectors.matrix" (unit-normalised
+# embeddings) and, from an index that refers to tracks by position, "vectors.refs"
+# (int64 position per row in the order tracks are stored here).
+
+import os
+import json
+import mmap
+import struct
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"MGKBSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+ALIGN = 64
+# Embedding rows converted and written per block on export
+BLOCK_ROWS = 4096
+
+
+def _json_default(value: Any) -> Any:
+    # Track rows from TrackStore are mappings, not dicts.
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+
+class SnapshotWriter:
+    # Sections are streamed to a temp file in one pass; close() writes the TOC and header
+    # and moves the file into place atomically.
+
+    def __init__(self, path: str, meta: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.sections = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._temp_path = path + ".tmp"
+        self._file = open(self._temp_path, 'wb')
+        self._file.write(b'\0' * HEADER.size)
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._temp_path)
+
+    def _begin(self) -> int:
+        padding = -self._file.tell() % ALIGN
+        self._file.write(b'\0' * padding)
+        return self._file.tell()
+
+    def _end(self, name: str, start: int, **info: Any):
+        if name in self.sections:
+            raise ValueError(f"Duplicate snapshot section: {name}")
+        self.sections[name] = {"offset": start, "length": self._file.tell() - start, **info}
+
+    def add_bytes(self, name: str, data: bytes):
+        start = self._begin()
+        self._file.write(data)
+        self._end(name, start, kind="bytes")
+
+    def add_json(self, name: str, value: Any):
+        start = self._begin()
+        self._file.write(_encode(value))
+        self._end(name, start, kind="json")
+
+    def add_records(self, name: str, records: Iterable[Any]) -> int:
+        # Each record is its own JSON blob; "<name>.offsets" holds count + 1 uint64 boundaries.
+        start = self._begin()
+        offsets = [0]
+        for record in records:
+            self._file.write(_encode(record))
+            offsets.append(self._file.tell() - start)
+        self._end(name, start, kind="records", count=len(offsets) - 1)
+
+        offsets_start = self._begin()
+        self._file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        self._end(name + ".offsets", offsets_start, kind="offsets")
+        return len(offsets) - 1
+
+    def add_matrix(self, name: str, blocks: Iterable[Any], dim: int, dtype: str):
+        # Row blocks (NumPy arrays) are written as one C-order matrix of `dtype`.
+        import numpy as np
+        start = self._begin()
+        rows = 0
+        for block in blocks:
+            block = np.ascontiguousarray(block, dtype=np.dtype(dtype).newbyteorder('<'))
+            if block.ndim != 2 or block.shape[1] != dim:
+                raise ValueError(f"Matrix block of shape {block.shape} does not match dim {dim}")
+            self._file.write(block.tobytes())
+            rows += len(block)
+        self._end(name, start, kind="matrix", dtype=np.dtype(dtype).name, shape=[rows, dim])
+
+    def close(self):
+        toc = _encode({"meta": self.meta, "sections": self.sections})
+        toc_offset = self._begin()
+        self._file.write(toc)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, toc_offset, len(toc)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+
+class SnapshotRecords(Sequence):
+    # Read-only records decoded on access; appends (e.g. tracks added after loading)
+    # go to an in-memory tail, so the sequence can back VectorIndex's lists.
+
+    def __init__(self, data: memoryview, offsets: memoryview, field: Optional[int] = None):
+        self._data = data
+        self._offsets = offsets
+        self._count = len(offsets) - 1
+        # Records stored as arrays can be viewed one column at a time
+        self._field = field
+        self._tail = []
+
+    def __len__(self) -> int:
+        return self._count + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("snapshot record index out of range")
+        if index >= self._count:
+            return self._tail[index - self._count]
+        record = json.loads(bytes(self._data[self._offsets[index]:self._offsets[index + 1]]))
+        return record if self._field is None else record[self._field]
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def column(self, field: int) -> "SnapshotRecords":
+        return SnapshotRecords(self._data, self._offsets, field)
+
+    def append(self, value: Any):
+        self._tail.append(value)
+
+    def extend(self, values: Iterable[Any]):
+        self._tail.extend(values)
+
+
+class SnapshotFile:
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, toc_offset, toc_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge base snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {version} (expected {FORMAT_VERSION})")
+        toc = json.loads(self._mmap[toc_offset:toc_offset + toc_length])
+        self.meta = toc['meta']
+        self.sections = toc['sections']
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def blob(self, name: str) -> memoryview:
+        section = self.sections[name]
+        return memoryview(self._mmap)[section['offset']:section['offset'] + section['length']]
+
+    def json(self, name: str) -> Any:
+        return json.loads(bytes(self.blob(name)))
+
+    def records(self, name: str) -> SnapshotRecords:
+        # Offsets are little-endian; cast() reads them in native order, which matches on every supported host
+        return SnapshotRecords(self.blob(name), self.blob(name + ".offsets").cast('Q'))
+
+    def matrix(self, name: str):
+        import numpy as np
+        section = self.sections[name]
+        rows, dim = section['shape']
+        if not rows:
+            return np.empty((0, dim), dtype=section['dtype'])
+        return np.memmap(self.path, dtype=np.dtype(section['dtype']).newbyteorder('<'), mode='r',
+                         offset=section['offset'], shape=(rows, dim))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "bytes": len(self._mmap),
+            "sections": {name: section['length'] for name, section in self.sections.items()},
+            "meta": self.meta
+        }
+
+
+def write_knowledge_snapshot(path: str, meta: Dict[str, Any], state: Dict[str, Any], tracks: Iterable[Any],
+                             dedup: Dict[str, str], vectors: Optional[Tuple] = None,
+                             segments: Iterable[Tuple[Dict[str, Any], bytes]] = ()) -> Dict[str, Any]:
+    # `vectors` is (records, row blocks, dim, dtype, refs or None), as from vector_index_sections(); `segments`
+    # is (summary, file contents) per cold segment, oldest first. Returns the TOC meta.
+    with SnapshotWriter(path, meta) as writer:
+        writer.add_json("state", state)
+        summaries = []
+        for summary, data in segments:
+            writer.add_bytes(f"segment.{len(summaries)}", data)
+            summaries.append(summary)
+        writer.add_json("segments", summaries)
+        writer.meta["cold_tracks"] = sum(summary['count'] for summary in summaries)
+        writer.meta["tracks"] = writer.meta["cold_tracks"] + writer.add_records("tracks", tracks)
+        writer.add_json("dedup", dedup)
+        writer.meta["vectors"] = 0
+        if vectors is not None:
+            records, blocks, dim, dtype, refs = vectors
+            writer.meta["vectors"] = writer.add_records("vectors", records)
+            writer.add_matrix("vectors.matrix", blocks, dim, dtype)
+            if refs is not None:
+                writer.add_bytes("vectors.refs", array('q', refs).tobytes())
+    return writer.meta
+
+
+def snapshot_segments(snapshot: SnapshotFile) -> List[Tuple[Dict[str, Any], memoryview]]:
+    return [(summary, snapshot.blob(f"segment.{i}")) for i, summary in enumerate(snapshot.json("segments"))]
+
+
+def snapshot_tracks(snapshot: SnapshotFile) -> Iterator[Dict[str, Any]]:
+    # Every track, oldest first, decoding cold segments one at a time.
+    from track_segments import TrackSegmentStore
+    for _, data in snapshot_segments(snapshot):
+        yield from TrackSegmentStore.decode(data)
+    yield from snapshot.records("tracks")
+
+
+def vector_index_sections(vector_index) -> Optional[Tuple]:
+    size, matrix, ids, documents, metadatas = vector_index.export()
+    if not size:
+        return None
+    records = ([ids[i], documents[i], metadatas[i]] for i in range(size))
+    blocks = (matrix[start:min(size, start + BLOCK_ROWS)] for start in range(0, size, BLOCK_ROWS))
+    refs = vector_index.refs[:size] if vector_index.resolve is not None else None
+    return records, blocks, matrix.shape[1], matrix.dtype.name, refs
+
+
+def check_embedder(snapshot: SnapshotFile, model_id: str):
+    # Stored embeddings are only usable with the model that produced them.
+    if snapshot.meta.get('embedder') != model_id:
+        raise ValueError(f"Snapshot embeddings come from {snapshot.meta.get('embedder')}, "
+                         f"this knowledge base embeds with {model_id}")
+
+
+def snapshot_vector_index(snapshot: SnapshotFile, model_id: str, resolve: Optional[Callable] = None):
+    # VectorIndex over the snapshot's embeddings, mapped in place; None when it has none.
+    # With `resolve` and stored refs, rows refer to the snapshot's tracks by position.
+    if "vectors.matrix" not in snapshot:
+        return None
+    check_embedder(snapshot, model_id)
+    from vector_index import VectorIndex
+    records = snapshot.records("vectors")
+    if resolve is not None and "vectors.refs" in snapshot:
+        from track_dedup import TrackIdColumn
+        refs = array('q')
+        refs.frombytes(snapshot.blob("vectors.refs"))
+        return VectorIndex.from_refs(snapshot.matrix("vectors.matrix"), TrackIdColumn(base=records.column(0)),
+                                     refs, resolve)
+    return VectorIndex.from_arrays(snapshot.matrix("vectors.matrix"), records.column(0),
+                                   records.column(1), records.column(2))
@@ -0,0 +1,63 @@
+# Copy-on-write knowledge base state. Readers take the current snapshot with one
+# attribute read and never lock; writers serialize on a single lock, build the next
+# snapshot and publish it by swapping that reference.
+
+import time
+import logging
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value: Any) -> Any:
+    # Top-level lists become tuples so a published snapshot can't be mutated in place.
+    return tuple(value) if isinstance(value, list) else value
+
+
+class KnowledgeSnapshot:
+
+    __slots__ = ("version", "data")
+
+    def __init__(self, version: int, data: Mapping[str, Any]):
+        self.version = version
+        self.data = data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+
+class SnapshotState:
+
+    def __init__(self, data: Dict[str, Any]):
+        # Held by writers for the whole read-modify-publish; readers never take it
+        self.lock = threading.Lock()
+        self._snapshot = KnowledgeSnapshot(0, MappingProxyType({k: _freeze(v) for k, v in data.items()}))
+        self.publishes = 0
+        self.total_publish_ms = 0.0
+
+    def read(self) -> KnowledgeSnapshot:
+        return self._snapshot
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._snapshot.data.get(key, default)
+
+    def publish(self, **changes: Any) -> KnowledgeSnapshot:
+        # Caller holds self.lock. Unchanged values are shared with the previous snapshot.
+        started = time.perf_counter()
+        current = self._snapshot
+        data = dict(current.data)
+        data.update((k, _freeze(v)) for k, v in changes.items())
+        snapshot = KnowledgeSnapshot(current.version + 1, MappingProxyType(data))
+        self._snapshot = snapshot
+        self.publishes += 1
+        self.total_publish_ms += (time.perf_counter() - started) * 1000
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._snapshot.version,
+            "publishes": self.publishes,
+            "avg_publish_ms": round(self.total_publish_ms / self.publishes, 4) if self.publishes else 0.0
+        }
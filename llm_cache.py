@@ -0,0 +1,184 @@
+# Content-addressed cache for LLM responses.
+# In-memory LRU with TTL, plus an optional SQLite tier that survives restarts.
+
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import (
+    LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL,
+    LLM_CACHE_VARIANTS, LLM_CACHE_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    # Stores up to `variants` responses per key and samples among them once full,
+    # so repeated prompts still get varied output.
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: int = LLM_CACHE_TTL,
+                 variants: int = LLM_CACHE_VARIANTS, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants = max(1, variants)
+        self.path = path
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open_db(path) if path else None
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str, format: Any = None) -> str:
+        parts = [model, temperature, prompt]
+        if format is not None:
+            parts.append(format)
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, created_at REAL, variants TEXT)"
+            )
+            db.commit()
+            logger.info(f"LLM cache disk tier at {path}")
+            return db
+        except Exception as e:
+            logger.error(f"Failed to open LLM cache at {path}: {e}")
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        # Return a cached response, or None if the key is missing, expired or still filling variants.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load_from_disk(key)
+
+            if entry is not None and self._expired(entry):
+                self._drop(key)
+                entry = None
+
+            if entry is None or len(entry['variants']) < self.variants:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry['variants'])
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                entry = {'created_at': time.time(), 'variants': []}
+                self._entries[key] = entry
+
+            if len(entry['variants']) < self.variants:
+                entry['variants'].append(response)
+
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save_to_disk(key, entry)
+
+    def discard(self, key: str):
+        # Forget a response the caller rejected so it isn't served again.
+        with self._lock:
+            self._drop(key)
+
+    def _evict(self):
+        # Disk entries outlive memory eviction; they are reloaded on the next lookup.
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry['created_at'] > self.ttl_seconds
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        if not self._db:
+            return
+
+        try:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to drop LLM cache entry: {e}")
+
+    def _load_from_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self._db:
+            return None
+
+        try:
+            row = self._db.execute(
+                "SELECT created_at, variants FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f"Failed to read LLM cache entry: {e}")
+            return None
+        if row is None:
+            return None
+
+        entry = {'created_at': row[0], 'variants': json.loads(row[1])}
+        self._entries[key] = entry
+        self._evict()
+        self.disk_hits += 1
+        return entry
+
+    def _save_to_disk(self, key: str, entry: Dict[str, Any]):
+        if not self._db:
+            return
+
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, variants) VALUES (?, ?, ?)",
+                (key, entry['created_at'], json.dumps(entry['variants']))
+            )
+            self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to persist LLM cache entry: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "variants_per_key": self.variants,
+                "persistent": self._db is not None
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    # Return the process-wide response cache, or None when caching is disabled.
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(path=LLM_CACHE_PATH or None)
+                logger.info("LLM response cache enabled")
+    return _cache
@@ -1,11 +1,10 @@
 # LLM service abstraction using LangChain and Ollama.
 
 import logging
-import requests
-from typing import Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 try:
-    from langchain.llms import Ollama
+    from langchain.llms.base import LLM
     from langchain.prompts import PromptTemplate
     from langchain.chains import LLMChain
     LANGCHAIN_AVAILABLE = True
@@ -13,41 +12,55 @@ except ImportError:
     LANGCHAIN_AVAILABLE = False
     logging.warning("LangChain not available, using simple LLM service")
 
-from config import OLLAMA_MODEL, OLLAMA_TEMPERATURE
+from config import OLLAMA_MODEL, OLLAMA_TEMPERATURE, OLLAMA_WARM_UP
+from ollama_client import OllamaClient
+from ollama_health import HealthProber
 
 logger = logging.getLogger(__name__)
 
 
+if LANGCHAIN_AVAILABLE:
+    class PooledOllama(LLM):
+        # LangChain LLM that sends prompts through LLMService's pooled transport.
+        service: Any
+        caller: Optional[str] = None
+        prefix: Optional[str] = None
+
+        @property
+        def _llm_type(self) -> str:
+            return "ollama-pooled"
+
+        def _call(self, prompt: str, stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> str:
+            response = self.service.generate(prompt, self.caller, self.prefix)
+            if response is None:
+                raise RuntimeError("Ollama generation failed")
+            return response
+
+
 class LLMService:
     # Handles LLM operations using LangChain and Ollama.
     
     def __init__(self, model: str = OLLAMA_MODEL, temperature: float = OLLAMA_TEMPERATURE):
         self.model = model
         self.temperature = temperature
-        self.base_url = "http://localhost:11434"
+        self.client = OllamaClient(model, temperature)
+        self.available = False
         
         if LANGCHAIN_AVAILABLE:
             self._init_langchain()
         else:
             self._init_simple()
+        
+        # Availability is tracked in the background so startup never waits on Ollama
+        self.prober = HealthProber(self._test_connection, on_change=self._on_health_change)
+        self.prober.start()
     
     def _init_langchain(self):
         # Initialize LangChain with Ollama.
         try:
-            self.llm = Ollama(
-                model=self.model,
-                temperature=self.temperature,
-                base_url=self.base_url
-            )
-            
-            # Test connection
-            if self._test_connection():
-                self.available = True
-                logger.info(f"LangChain + Ollama initialized with model {self.model}")
-            else:
-                logger.warning("Ollama not responding, falling back to simple mode")
-                self._init_simple()
-                
+            self.llm = PooledOllama(service=self)
+            self.mode = "langchain"
         except Exception as e:
             logger.error(f"Failed to initialize LangChain: {e}")
             self._init_simple()
@@ -55,25 +68,30 @@ class LLMService:
     def _init_simple(self):
         # Initialize simple direct API mode.
         self.llm = None
-        if self._test_connection():
-            self.available = True
-            logger.info(f"Simple Ollama API mode with model {self.model}")
+        self.mode = "simple"
+    
+    def _on_health_change(self, healthy: bool):
+        self.available = healthy
+        if healthy:
+            self.client.breaker.reset()
+            if OLLAMA_WARM_UP:
+                self.client.warm_up()
+            logger.info(f"Ollama available with model {self.model} ({self.mode} mode)")
         else:
-            self.available = False
+            self.client.reset_prefixes()
             logger.warning("Ollama not available")
     
+    def wait_for_health_check(self, timeout: float = 2.0) -> bool:
+        # Block until the first probe has finished; for CLI callers that need an answer up front.
+        self.prober.wait_for_first_probe(timeout)
+        return self.is_available()
+    
     def _test_connection(self) -> bool:
         # Test if Ollama is responding.
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                return any(self.model in m.get('name', '') for m in models)
-            return False
-        except Exception:
-            return False
+        return self.client.has_model()
     
-    def create_chain(self, prompt_template):
+    def create_chain(self, prompt_template, caller: Optional[str] = None,
+                     prefix: Optional[str] = None):
         # Create a LangChain chain with the given prompt template.
         if not self.available or not LANGCHAIN_AVAILABLE:
             return None
@@ -87,50 +105,52 @@ class LLMService:
             else:
                 prompt = prompt_template
             
-            chain = LLMChain(llm=self.llm, prompt=prompt)
+            chain = LLMChain(
+                llm=PooledOllama(service=self, caller=caller, prefix=prefix),
+                prompt=prompt
+            )
             return chain
             
         except Exception as e:
             logger.error(f"Failed to create chain: {e}")
             return None
     
-    def generate(self, prompt: str) -> Optional[str]:
+    def register_prefix(self, prefix: str):
+        # Static prompt preamble whose evaluated context is reused across calls.
+        self.client.register_prefix(prefix)
+    
+    def generate(self, prompt: str, caller: Optional[str] = None,
+                 prefix: Optional[str] = None) -> Optional[str]:
         # Generate text using Ollama API directly.
+        # LangChain chains route back here through PooledOllama, so every
+        # call shares the same cache, coalescing and pooled transport.
         if not self.available:
             return None
-        
-        try:
-            logger.info(f"Generating with Ollama model {self.model}...")
-            
-            if LANGCHAIN_AVAILABLE and self.llm:
-                # Use LangChain
-                response = self.llm(prompt)
-                logger.info("Generation completed successfully")
-                return response
-            else:
-                # Use direct API
-                response = requests.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": self.temperature
-                        }
-                    },
-                    timeout=60
-                )
-                
-                if response.status_code == 200:
-                    result = response.json().get('response', '')
-                    logger.info("Generation completed successfully")
-                    return result
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error generating text: {e}")
+        return self.client.generate(prompt, caller, prefix)
+    
+    def generate_json(self, prompt: str, schema: Dict, validate: Callable,
+                      caller: Optional[str] = None, prefix: Optional[str] = None,
+                      response: Optional[str] = None) -> Optional[Dict]:
+        # Generate and validate a JSON object, re-asking with the errors if it is rejected.
+        if response is None and not self.available:
             return None
+        return self.client.generate_json(prompt, schema, validate, caller, prefix, response)
+    
+    def stream(self, prompt: str, caller: Optional[str] = None,
+               prefix: Optional[str] = None, schema: Optional[Dict] = None) -> Iterator[str]:
+        # Yield response tokens as Ollama generates them; `schema` constrains them to JSON.
+        if not self.available:
+            return
+        format = self.client.json_format(schema) if schema else None
+        yield from self.client.stream(prompt, caller, prefix, format)
+    
+    def get_stats(self) -> Dict:
+        return {**self.client.stats(), "health": self.prober.stats()}
+    
+    def get_metrics(self) -> Dict:
+        # Per-caller generation telemetry from Ollama's timing fields.
+        return self.client.telemetry.summary()
     
     def is_available(self) -> bool:
-        return self.available
+        # False while the circuit is open so callers go straight to their fallbacks
+        return self.available and not self.client.breaker.is_open()
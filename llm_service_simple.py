@@ -1,8 +1,11 @@
 # LLM service abstraction - simple version without LangChain.
 
 import logging
-import requests
-from typing import Optional
+from typing import Callable, Dict, Iterator, Optional
+
+from config import OLLAMA_MODEL, OLLAMA_TEMPERATURE, OLLAMA_WARM_UP
+from ollama_client import OllamaClient
+from ollama_health import HealthProber
 
 logger = logging.getLogger(__name__)
 
@@ -10,63 +13,73 @@ logger = logging.getLogger(__name__)
 class LLMService:
     # Handles LLM operations with Ollama API.
     
-    def __init__(self, model: str = "llama2", temperature: float = 0.7):
+    def __init__(self, model: str = OLLAMA_MODEL, temperature: float = OLLAMA_TEMPERATURE):
         self.model = model
         self.temperature = temperature
-        self.base_url = "http://localhost:11434/api"
-        self._check_availability()
+        self.client = OllamaClient(model, temperature)
+        self.available = False
+        self.prober = HealthProber(self._check_availability, on_change=self._on_health_change)
+        self.prober.start()
+    
+    def _check_availability(self) -> bool:
+        # Backends that are down or missing the model are ejected and logged by the pool
+        return self.client.has_model()
+    
+    def _on_health_change(self, healthy: bool):
+        self.available = healthy
+        if healthy:
+            self.client.breaker.reset()
+            if OLLAMA_WARM_UP:
+                self.client.warm_up()
+            logger.info(f"Ollama is available with model {self.model}")
+        else:
+            self.client.reset_prefixes()
+            logger.warning(f"Ollama or model {self.model} not available")
     
-    def _check_availability(self):
-        try:
-            response = requests.get(f"{self.base_url}/tags", timeout=2)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                if any(self.model in m.get('name', '') for m in models):
-                    logger.info(f"Ollama is available with model {self.model}")
-                    self.available = True
-                else:
-                    logger.warning(f"Model {self.model} not found in Ollama")
-                    self.available = False
-            else:
-                self.available = False
-        except Exception as e:
-            logger.warning(f"Ollama not available: {e}")
-            self.available = False
+    def wait_for_health_check(self, timeout: float = 2.0) -> bool:
+        self.prober.wait_for_first_probe(timeout)
+        return self.is_available()
     
-    def generate(self, prompt: str) -> Optional[str]:
+    def register_prefix(self, prefix: str):
+        # Static prompt preamble whose evaluated context is reused across calls.
+        self.client.register_prefix(prefix)
+    
+    def generate(self, prompt: str, caller: Optional[str] = None,
+                 prefix: Optional[str] = None) -> Optional[str]:
         # Generate text using Ollama API.
         if not self.available:
             return None
-        
-        try:
-            logger.info(f"Generating with Ollama model {self.model}...")
-            response = requests.post(
-                f"{self.base_url}/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": self.temperature
-                    }
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json().get('response', '')
-                logger.info("Generation completed successfully")
-                return result
-            return None
-        except Exception as e:
-            logger.error(f"Error generating text: {e}")
-            return None
+        return self.client.generate(prompt, caller, prefix)
     
-    def create_chain(self, prompt_template):
+    def create_chain(self, prompt_template, caller: Optional[str] = None,
+                     prefix: Optional[str] = None):
         return None
     
+    def generate_json(self, prompt: str, schema: Dict, validate: Callable,
+                      caller: Optional[str] = None, prefix: Optional[str] = None,
+                      response: Optional[str] = None) -> Optional[Dict]:
+        # Generate and validate a JSON object, re-asking with the errors if it is rejected.
+        if response is None and not self.available:
+            return None
+        return self.client.generate_json(prompt, schema, validate, caller, prefix, response)
+    
+    def stream(self, prompt: str, caller: Optional[str] = None,
+               prefix: Optional[str] = None, schema: Optional[Dict] = None) -> Iterator[str]:
+        # Yield response tokens as Ollama generates them; `schema` constrains them to JSON.
+        if not self.available:
+            return
+        format = self.client.json_format(schema) if schema else None
+        yield from self.client.stream(prompt, caller, prefix, format)
+    
+    def get_stats(self) -> Dict:
+        return {**self.client.stats(), "health": self.prober.stats()}
+    
+    def get_metrics(self) -> Dict:
+        # Per-caller generation telemetry from Ollama's timing fields.
+        return self.client.telemetry.summary()
+    
     def is_available(self) -> bool:
-        return self.available
+        return self.available and not self.client.breaker.is_open()
 
 
 
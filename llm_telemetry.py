@@ -0,0 +1,115 @@
+# Per-call generation telemetry from Ollama's timing fields.
+# Aggregated per caller so we can tell cold model loads, long prompts and slow decoding apart.
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ollama reports these on non-streamed responses and on the final streamed chunk (durations in ns)
+TIMING_FIELDS = [
+    "total_duration", "load_duration", "prompt_eval_count",
+    "prompt_eval_duration", "eval_count", "eval_duration"
+]
+
+# A warm model still reports a few ms of load_duration; anything above this was a real load
+COLD_LOAD_THRESHOLD_NS = 500_000_000
+
+DEFAULT_CALLER = "direct"
+
+
+def _avg_ms(total_ns: int, calls: int) -> float:
+    return round(total_ns / calls / 1e6, 1) if calls else 0.0
+
+
+def _per_second(count: int, total_ns: int) -> float:
+    return round(count / (total_ns / 1e9), 2) if total_ns else 0.0
+
+
+def _share(part_ns: int, total_ns: int) -> float:
+    return round(part_ns / total_ns, 3) if total_ns else 0.0
+
+
+def _new_totals() -> Dict[str, int]:
+    totals = {field: 0 for field in TIMING_FIELDS}
+    totals.update({"calls": 0, "cache_hits": 0, "model_loads": 0})
+    return totals
+
+
+class GenerationTelemetry:
+    # Thread-safe aggregation of Ollama timing fields, tagged by caller.
+
+    def __init__(self, recent_size: int = 100):
+        self._callers = {}
+        self._recent = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+
+    def record(self, data: Dict[str, Any], caller: Optional[str] = None, backend: Optional[str] = None):
+        caller = caller or DEFAULT_CALLER
+        sample = {field: int(data.get(field) or 0) for field in TIMING_FIELDS}
+        cold_load = sample["load_duration"] >= COLD_LOAD_THRESHOLD_NS
+
+        with self._lock:
+            totals = self._callers.setdefault(caller, _new_totals())
+            totals["calls"] += 1
+            totals["model_loads"] += int(cold_load)
+            for field in TIMING_FIELDS:
+                totals[field] += sample[field]
+
+            self._recent.append({
+                "caller": caller,
+                "backend": backend,
+                "at": time.time(),
+                "cold_load": cold_load,
+                **sample
+            })
+
+        if cold_load:
+            logger.info(f"Model load took {sample['load_duration'] / 1e6:.0f}ms for {caller}")
+
+    def record_cache_hit(self, caller: Optional[str] = None):
+        with self._lock:
+            self._callers.setdefault(caller or DEFAULT_CALLER, _new_totals())["cache_hits"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            callers = {name: dict(totals) for name, totals in self._callers.items()}
+            recent = list(self._recent)
+
+        overall = _new_totals()
+        for totals in callers.values():
+            for key in overall:
+                overall[key] += totals[key]
+
+        return {
+            "callers": {name: self._summarize(totals) for name, totals in callers.items()},
+            "total": self._summarize(overall),
+            "recent": recent
+        }
+
+    def _summarize(self, totals: Dict[str, int]) -> Dict[str, Any]:
+        calls = totals["calls"]
+        # Share of total time per phase; the remainder is request setup and scheduling overhead
+        spent = totals["total_duration"]
+
+        return {
+            "calls": calls,
+            "cache_hits": totals["cache_hits"],
+            "model_loads": totals["model_loads"],
+            "prompt_tokens": totals["prompt_eval_count"],
+            "generated_tokens": totals["eval_count"],
+            "tokens_per_sec": _per_second(totals["eval_count"], totals["eval_duration"]),
+            "prompt_tokens_per_sec": _per_second(totals["prompt_eval_count"], totals["prompt_eval_duration"]),
+            "avg_total_ms": _avg_ms(totals["total_duration"], calls),
+            "avg_load_ms": _avg_ms(totals["load_duration"], calls),
+            "avg_prompt_eval_ms": _avg_ms(totals["prompt_eval_duration"], calls),
+            "avg_eval_ms": _avg_ms(totals["eval_duration"], calls),
+            "time_share": {
+                "load": _share(totals["load_duration"], spent),
+                "prompt_eval": _share(totals["prompt_eval_duration"], spent),
+                "eval": _share(totals["eval_duration"], spent)
+            }
+        }
@@ -6,8 +6,11 @@ from pathlib import Path
 
 from config import LOG_LEVEL, LOG_FORMAT
 
+# Without ChromaDB the JSON knowledge base (journal, segments, templates) is the real store
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
     logging.warning("ChromaDB not available, using simple knowledge base")
@@ -32,7 +35,7 @@ def setup_logging():
 
 
 def check_ollama_availability(llm_service: LLMService) -> bool:
-    if not llm_service.is_available():
+    if not llm_service.wait_for_health_check():
         logging.warning("=" * 60)
         logging.warning("Ollama LLM not available")
         logging.warning("Running with fallback generation mode")
@@ -59,6 +62,8 @@ def print_results(results: dict):
         print(f"   Genre: {track['genre']}")
         print(f"   Mood: {track['mood']}")
         print(f"   Method: {track.get('generation_method', 'unknown')}")
+        for other in results.get('tracks', [])[1:]:
+            print(f"   Also: {other['title']} ({other['genre']}, {other['mood']})")
     
     if 'billing' in results:
         billing = results['billing']
@@ -83,6 +88,7 @@ def print_results(results: dict):
 def main():
     setup_logging()
     logger = logging.getLogger(__name__)
+    kb = None
     
     try:
         logger.info("Initializing Music Generator Company")
@@ -94,7 +100,6 @@ def main():
         
         company = MusicCompany(kb, llm_service)
         results = company.run_daily_operations()
-        
         print_results(results)
         
     except KeyboardInterrupt:
@@ -103,6 +108,10 @@ def main():
     except Exception as e:
         logger.error(f"Application error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        # Flushes queued track writes and the journal, also when operations fail or are interrupted
+        if kb is not None:
+            kb.close()
 
 
 if __name__ == "__main__":
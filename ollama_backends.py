@@ -0,0 +1,202 @@
+# Load-balanced pool of Ollama backends.
+# Routes each call to the backend with the fewest outstanding requests and hedges
+# slow calls to a second backend once they pass a latency percentile.
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import (
+    OLLAMA_BACKENDS, OLLAMA_HEDGE_PERCENTILE, OLLAMA_HEDGE_MIN_SAMPLES,
+    OLLAMA_EJECT_AFTER_FAILURES, OLLAMA_POOL_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Backend:
+    # Routing state for one Ollama host.
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected = False
+        self.eject_reason = None
+        self.latencies = deque(maxlen=200)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "ejected": self.ejected,
+            "eject_reason": self.eject_reason,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class BackendPool:
+    # Least-outstanding-requests routing with ejection and hedged retries.
+
+    def __init__(self, transport, model: str, urls: Optional[List[str]] = None,
+                 hedge_percentile: float = OLLAMA_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = OLLAMA_HEDGE_MIN_SAMPLES,
+                 eject_after_failures: int = OLLAMA_EJECT_AFTER_FAILURES):
+        self.transport = transport
+        self.model = model
+        self.backends = [Backend(url) for url in (urls or OLLAMA_BACKENDS)]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.eject_after_failures = eject_after_failures
+
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def refresh(self) -> bool:
+        # Eject backends that are unreachable or don't serve the model; re-admit the rest.
+        for backend in self.backends:
+            reason = None
+            try:
+                response = self.transport.get(f"{backend.url}/api/tags", timeout=(2, 2))
+                response.raise_for_status()
+                names = [m.get('name', '') for m in response.json().get('models', [])]
+                if not any(self.model in name for name in names):
+                    reason = f"model {self.model} not found"
+            except Exception as e:
+                reason = f"unreachable: {e}"
+
+            with self._lock:
+                if reason and not backend.ejected:
+                    logger.warning(f"Ejecting Ollama backend {backend.url}: {reason}")
+                elif not reason and backend.ejected:
+                    logger.info(f"Re-admitting Ollama backend {backend.url}")
+                backend.ejected = reason is not None
+                backend.eject_reason = reason
+                if not reason:
+                    backend.consecutive_failures = 0
+
+        return any(not b.ejected for b in self.backends)
+
+    def live(self) -> List[Backend]:
+        with self._lock:
+            return [b for b in self.backends if not b.ejected]
+
+    def pick(self, exclude: Optional[List[Backend]] = None) -> Optional[Backend]:
+        with self._lock:
+            candidates = [b for b in self.backends if not b.ejected and b not in (exclude or [])]
+            if not candidates:
+                return None
+            return min(candidates, key=lambda b: (b.outstanding, b.requests))
+
+    @contextmanager
+    def track(self, backend: Backend) -> Iterator[Backend]:
+        # Count the call as outstanding on `backend` and record its latency and outcome.
+        with self._lock:
+            backend.outstanding += 1
+            backend.requests += 1
+        started = time.time()
+        try:
+            yield backend
+        except Exception:
+            with self._lock:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.eject_after_failures and not backend.ejected:
+                    backend.ejected = True
+                    backend.eject_reason = f"{backend.consecutive_failures} consecutive failures"
+                    logger.warning(f"Ejecting Ollama backend {backend.url}: {backend.eject_reason}")
+            raise
+        else:
+            with self._lock:
+                backend.consecutive_failures = 0
+                backend.latencies.append(time.time() - started)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def call(self, func: Callable[[Backend], Any]) -> Any:
+        # Run func against the least-loaded backend, hedging to a second one if it runs slow.
+        primary = self.pick()
+        if primary is None:
+            raise NoBackendAvailable("No Ollama backend available")
+
+        delay = self.hedge_delay()
+        if delay is None or self.pick(exclude=[primary]) is None:
+            return self._run(primary, func)
+
+        first = self._get_executor().submit(self._run, primary, func)
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+
+        secondary = self.pick(exclude=[primary])
+        if secondary is None:
+            return first.result()
+
+        with self._lock:
+            self.hedged += 1
+        logger.info(f"Hedging slow Ollama call ({delay:.2f}s) to {secondary.url}")
+        hedge = self._get_executor().submit(self._run, secondary, func)
+        return self._first_success(first, hedge)
+
+    def _run(self, backend: Backend, func: Callable[[Backend], Any]) -> Any:
+        with self.track(backend):
+            return func(backend)
+
+    def _first_success(self, first, hedge) -> Any:
+        pending = {first, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def hedge_delay(self) -> Optional[float]:
+        # Latency percentile across the pool, or None until enough samples exist.
+        if not self.hedge_percentile or len(self.backends) < 2:
+            return None
+        with self._lock:
+            samples = sorted(l for b in self.backends for l in b.latencies)
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=OLLAMA_POOL_SIZE * 2,
+                    thread_name_prefix="ollama-hedge"
+                )
+            return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "backends": [b.stats() for b in self.backends],
+                "hedge_after": round(delay, 3) if delay is not None else None,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins
+            }
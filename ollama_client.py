@@ -0,0 +1,346 @@
+# Shared Ollama client used by both LLMService variants.
+# One pooled keep-alive session is reused by every LLMService instance.
+
+import json
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    LLM_JSON_FORMAT, LLM_JSON_MAX_ATTEMPTS, OLLAMA_BACKENDS, OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_POOL_SIZE, OLLAMA_PREFIX_CONTEXT_RATIO,
+    OLLAMA_TEMPERATURE, OLLAMA_TIMEOUT
+)
+from llm_cache import ResponseCache, get_response_cache
+from ollama_health import CircuitBreaker
+from ollama_backends import Backend, BackendPool, NoBackendAvailable
+from singleflight import SingleFlight
+from llm_telemetry import DEFAULT_CALLER, GenerationTelemetry
+from structured_output import REPAIR_PROMPT, ParseStats, Validator, extract_json
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaTransport:
+    # Thread-safe connection pool for talking to one or more Ollama hosts.
+
+    def __init__(self, pool_size: int = OLLAMA_POOL_SIZE,
+                 connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout: float = OLLAMA_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        # urllib3 pools are thread-safe; pool_block keeps us under pool_size sockets per host
+        adapter = HTTPAdapter(
+            pool_connections=max(4, len(OLLAMA_BACKENDS)),
+            pool_maxsize=self.pool_size,
+            pool_block=True,
+            max_retries=0
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def get(self, url: str, timeout: Optional[Tuple[float, float]] = None) -> requests.Response:
+        return self.session.get(url, timeout=timeout or self.timeout)
+
+    def post(self, url: str, payload: Dict, stream: bool = False,
+             timeout: Optional[Tuple[float, float]] = None) -> requests.Response:
+        return self.session.post(url, json=payload, stream=stream, timeout=timeout or self.timeout)
+
+    def stream(self, url: str, payload: Dict) -> Iterator[Dict]:
+        # Yield the NDJSON chunks of a streamed Ollama response.
+        # Closing the generator early drops the connection, which stops generation upstream.
+        response = self.post(url, payload, stream=True)
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> OllamaTransport:
+    # Return the process-wide transport, creating it on first use.
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = OllamaTransport()
+                logger.info(f"Ollama transport ready (pool size {_transport.pool_size})")
+    return _transport
+
+
+class OllamaClient:
+    # Generation pipeline: response cache, circuit breaker, in-flight coalescing,
+    # then the backend pool over the pooled transport.
+
+    def __init__(self, model: str = OLLAMA_MODEL, temperature: float = OLLAMA_TEMPERATURE,
+                 backends: Optional[List[str]] = None):
+        self.model = model
+        self.temperature = temperature
+        self.transport = get_transport()
+        self.backends = BackendPool(self.transport, model, backends)
+        self.cache = get_response_cache()
+        self.inflight = SingleFlight()
+        self.breaker = CircuitBreaker()
+        self.telemetry = GenerationTelemetry()
+        self.parse_stats = ParseStats()
+
+        # Fixed prompt prefix -> Ollama `context` tokens from evaluating it once
+        self._prefix_contexts = {}
+        self._prefix_lock = threading.Lock()
+
+    def has_model(self) -> bool:
+        # True if at least one backend serves the model; the others are ejected.
+        return self.backends.refresh()
+
+    def register_prefix(self, prefix: str):
+        # Known template preambles are evaluated during warm_up() instead of on the first call.
+        with self._prefix_lock:
+            self._prefix_contexts.setdefault(prefix, None)
+
+    def reset_prefixes(self):
+        with self._prefix_lock:
+            for prefix in self._prefix_contexts:
+                self._prefix_contexts[prefix] = None
+
+    def warm_up(self):
+        # Load the model on every live backend, pinned by keep_alive, then prime prefix contexts.
+        for backend in self.backends.live():
+            try:
+                logger.info(f"Warming up model {self.model} on {backend.url}...")
+                data = self._post_generate(backend, {"model": self.model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False})
+                self.telemetry.record(data, "warm_up", backend.url)
+            except Exception as e:
+                logger.warning(f"Warm-up failed on {backend.url}: {e}")
+
+        with self._prefix_lock:
+            prefixes = list(self._prefix_contexts)
+        for prefix in prefixes:
+            self._prefix_context(prefix)
+
+    def _prefix_context(self, prefix: str) -> Optional[List[int]]:
+        with self._prefix_lock:
+            context = self._prefix_contexts.get(prefix)
+        if context:
+            return context
+
+        try:
+            # num_predict 0: evaluate the prefix only, generate nothing
+            payload = self.build_payload(prefix, stream=False)
+            payload["options"]["num_predict"] = 0
+            data = self.backends.call(lambda backend: self._post_generate(backend, payload))
+            self.telemetry.record(data, "prefix_eval")
+            context = data.get('context') or None
+        except Exception as e:
+            logger.warning(f"Failed to evaluate prompt prefix: {e}")
+            return None
+
+        with self._prefix_lock:
+            self._prefix_contexts[prefix] = context
+        return context
+
+    def _split_prefix(self, prompt: str, prefix: Optional[str], caller: Optional[str]):
+        # Returns (prompt to send, context, telemetry tag); the tag separates the A/B arms.
+        caller = caller or DEFAULT_CALLER
+        if not prefix or not prompt.startswith(prefix) or random.random() >= OLLAMA_PREFIX_CONTEXT_RATIO:
+            return prompt, None, caller
+
+        context = self._prefix_context(prefix)
+        if not context:
+            return prompt, None, caller
+        return prompt[len(prefix):], context, f"{caller}+prefix"
+
+    def generate(self, prompt: str, caller: Optional[str] = None,
+                 prefix: Optional[str] = None, format: Any = None) -> Optional[str]:
+        # Identical prompts already in flight share the first caller's result.
+        # `caller` tags the call's telemetry (e.g. "MusicAgent"); when the prompt starts
+        # with `prefix`, only the rest is sent, along with the prefix's cached context.
+        key = ResponseCache.make_key(self.model, self.temperature, prompt, format)
+
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info("Returning cached generation")
+                self.telemetry.record_cache_hit(caller)
+                return cached
+
+        if not self.breaker.allow():
+            logger.warning("Ollama circuit open, skipping generation")
+            return None
+
+        return self.inflight.do(key, lambda: self.generate_uncached(key, prompt, caller, prefix, format))
+
+    def generate_uncached(self, key: str, prompt: str, caller: Optional[str] = None,
+                          prefix: Optional[str] = None, format: Any = None) -> Optional[str]:
+        try:
+            logger.info(f"Generating with Ollama model {self.model}...")
+            prompt, context, tag = self._split_prefix(prompt, prefix, caller)
+            payload = self.build_payload(prompt, stream=False, context=context, format=format)
+            backend_url, data = self.backends.call(
+                lambda backend: (backend.url, self._post_generate(backend, payload))
+            )
+
+            result = data.get('response', '')
+            self.breaker.record_success()
+            self.telemetry.record(data, tag, backend_url)
+            if self.cache and result:
+                self.cache.put(key, result)
+            logger.info("Generation completed successfully")
+            return result
+        except Exception as e:
+            logger.error(f"Error generating text: {e}")
+            self.breaker.record_failure()
+            return None
+
+    def json_format(self, schema: Dict[str, Any]) -> Any:
+        # Ollama >= 0.5 constrains decoding to a JSON schema; older versions only know "json".
+        return schema if LLM_JSON_FORMAT == "schema" else "json"
+
+    def generate_json(self, prompt: str, schema: Dict[str, Any], validate: Validator,
+                      caller: Optional[str] = None, prefix: Optional[str] = None,
+                      response: Optional[str] = None,
+                      max_attempts: int = LLM_JSON_MAX_ATTEMPTS) -> Optional[Dict[str, Any]]:
+        # Generate a JSON object and validate it. A rejected reply is fed back once per
+        # remaining attempt with the validation errors; None means every attempt failed.
+        # Pass `response` to validate text that was already generated (e.g. streamed).
+        format = self.json_format(schema)
+        generations = 0
+        invalid_json = invalid_fields = 0
+        request = prompt
+
+        for attempt in range(max(1, max_attempts)):
+            if response is None:
+                response = self.generate(request, caller, prefix if attempt == 0 else None, format)
+                if response is None:
+                    # Ollama failed outright; nothing to repair
+                    break
+            generations += 1
+
+            data = extract_json(response)
+            if data is None:
+                invalid_json += 1
+                errors = ["reply was not a JSON object"]
+            else:
+                value, errors, repaired = validate(data)
+                if value is not None:
+                    if attempt:
+                        outcome = "retried"
+                    else:
+                        outcome = "repaired" if repaired else "first_try"
+                    self.parse_stats.record(caller, outcome, generations, invalid_json, invalid_fields)
+                    return value
+                invalid_fields += 1
+
+            logger.warning(f"Rejected LLM output ({'; '.join(errors)}), attempt {attempt + 1}/{max_attempts}")
+            if self.cache:
+                self.cache.discard(ResponseCache.make_key(self.model, self.temperature, request, format))
+            request = REPAIR_PROMPT.format(prompt=prompt, errors="; ".join(errors), response=response.strip())
+            response = None
+
+        self.parse_stats.record(caller, "failed", generations, invalid_json, invalid_fields)
+        return None
+
+    def _post_generate(self, backend: Backend, payload: Dict) -> Dict:
+        response = self.transport.post(f"{backend.url}/api/generate", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, prompt: str, caller: Optional[str] = None,
+               prefix: Optional[str] = None, format: Any = None) -> Iterator[str]:
+        # Yield response tokens as Ollama generates them. Streams are not hedged.
+        if not self.breaker.allow():
+            raise RuntimeError("Ollama circuit open")
+
+        # allow() may have made this call the half-open trial, so every way out settles it
+        settled = False
+
+        def settle(success: bool):
+            nonlocal settled
+            if not settled:
+                settled = True
+                if success:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+
+        try:
+            backend = self.backends.pick()
+            if backend is None:
+                raise NoBackendAvailable("No Ollama backend available")
+
+            logger.info(f"Streaming from Ollama model {self.model} on {backend.url}...")
+            prompt, context, tag = self._split_prefix(prompt, prefix, caller)
+            payload = self.build_payload(prompt, stream=True, context=context, format=format)
+            with self.backends.track(backend):
+                yield from self._stream_from(backend, payload, tag, settle)
+        except Exception:
+            settle(False)
+            raise
+        finally:
+            if not settled:
+                # Stopped before Ollama answered (closed or interrupted): the trial proved nothing
+                self.breaker.release()
+
+    def _stream_from(self, backend: Backend, payload: Dict, caller: str,
+                     settle: Callable[[bool], None]) -> Iterator[str]:
+        chunks = self.transport.stream(f"{backend.url}/api/generate", payload)
+        try:
+            for chunk in chunks:
+                # The first chunk shows Ollama is answering
+                settle(True)
+                token = chunk.get('response', '')
+                if token:
+                    yield token
+                if chunk.get('done'):
+                    # The final chunk carries the timing fields
+                    self.telemetry.record(chunk, caller, backend.url)
+                    logger.info("Stream completed successfully")
+                    break
+        except Exception as e:
+            logger.error(f"Error streaming text: {e}")
+            raise
+        finally:
+            chunks.close()
+
+    def build_payload(self, prompt: str, stream: bool, context: Optional[List[int]] = None,
+                      format: Any = None) -> Dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                "temperature": self.temperature
+            }
+        }
+        if context:
+            payload["context"] = context
+        if format is not None:
+            payload["format"] = format
+        return payload
+
+    def stats(self) -> Dict:
+        return {
+            "cache": self.cache.stats() if self.cache else None,
+            "coalescing": self.inflight.stats(),
+            "breaker": self.breaker.stats(),
+            "backends": self.backends.stats(),
+            "structured_output": self.parse_stats.summary()
+        }
@@ -0,0 +1,184 @@
+# Ollama health tracking: a background prober with exponential backoff
+# and a circuit breaker that lets generate() fail fast while Ollama is down.
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from config import (
+    OLLAMA_HEALTH_INTERVAL, OLLAMA_HEALTH_MAX_BACKOFF,
+    OLLAMA_BREAKER_THRESHOLD, OLLAMA_BREAKER_RESET
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    # Runs a health check in a daemon thread; backs off exponentially while it fails.
+
+    def __init__(self, check: Callable[[], bool], on_change: Optional[Callable[[bool], None]] = None,
+                 interval: float = OLLAMA_HEALTH_INTERVAL, max_backoff: float = OLLAMA_HEALTH_MAX_BACKOFF,
+                 initial_backoff: float = 1.0, name: str = "ollama-health"):
+        self.check = check
+        self.on_change = on_change
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.initial_backoff = initial_backoff
+        self.name = name
+
+        self.healthy = None
+        self.consecutive_failures = 0
+        self.last_probe = None
+        self.next_delay = 0.0
+
+        self._probed = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def probe_now(self):
+        # Skip the current backoff delay and probe on the next loop iteration.
+        self._wake.set()
+
+    def wait_for_first_probe(self, timeout: float) -> bool:
+        return self._probed.wait(timeout)
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while not self._stopped.is_set():
+            healthy = self._probe()
+
+            if healthy:
+                self.consecutive_failures = 0
+                backoff = self.initial_backoff
+                self.next_delay = self.interval
+            else:
+                self.consecutive_failures += 1
+                self.next_delay = backoff
+                backoff = min(backoff * 2, self.max_backoff)
+
+            self._wake.wait(self.next_delay)
+            self._wake.clear()
+
+    def _probe(self) -> bool:
+        try:
+            healthy = bool(self.check())
+        except Exception as e:
+            logger.debug(f"Health check failed: {e}")
+            healthy = False
+
+        self.last_probe = time.time()
+        changed = healthy != self.healthy
+        self.healthy = healthy
+        self._probed.set()
+
+        if changed and self.on_change:
+            try:
+                self.on_change(healthy)
+            except Exception as e:
+                logger.error(f"Health change handler failed: {e}")
+        return healthy
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "last_probe": self.last_probe,
+            "next_probe_in": self.next_delay
+        }
+
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive failures; after `reset_timeout`
+    # one trial call is let through (half-open) and its outcome closes or reopens the circuit.
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = OLLAMA_BREAKER_THRESHOLD,
+                 reset_timeout: float = OLLAMA_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logger.info("Circuit half-open, allowing a trial Ollama call")
+                return True
+
+            self.rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        # Non-mutating check used for availability reporting.
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.time() - self.opened_at < self.reset_timeout
+            return self.state == self.HALF_OPEN
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit closed, Ollama calls resumed")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"Circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def release(self):
+        # Hand back a half-open trial that ended without an outcome; the next allow() starts another.
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.time() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in": round(retry_in, 1)
+            }
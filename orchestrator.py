@@ -1,10 +1,12 @@
 # Company orchestrator - coordinates all agents and operations.
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
 
@@ -14,6 +16,7 @@ except ImportError:
     from llm_service_simple import LLMService
 
 from agents import MusicAgent, BillingAgent, MarketingAgent
+from config import DAILY_TRACK_COUNT
 
 logger = logging.getLogger(__name__)
 
@@ -37,8 +40,11 @@ class MusicCompany:
         results = {}
         
         try:
-            track = self._run_music_generation()
+            tracks = self._run_music_generation()
+            track = tracks[0]
             results['track'] = track
+            if len(tracks) > 1:
+                results['tracks'] = tracks
             
             billing = self._run_billing()
             results['billing'] = billing
@@ -53,11 +59,12 @@ class MusicCompany:
             logger.error(f"Daily operations failed: {e}")
             raise
     
-    def _run_music_generation(self) -> Dict[str, str]:
-        logger.info("Generating music track")
-        track = self.music_agent.generate_track()
-        logger.info(f"Generated track: {track['title']} ({track['genre']})")
-        return track
+    def _run_music_generation(self) -> List[Dict[str, str]]:
+        logger.info(f"Generating {DAILY_TRACK_COUNT} music track(s)")
+        tracks = self.music_agent.generate_tracks(DAILY_TRACK_COUNT)
+        for track in tracks:
+            logger.info(f"Generated track: {track['title']} ({track['genre']})")
+        return tracks
     
     def _run_billing(self) -> Dict[str, Any]:
         logger.info("Processing monthly billing")
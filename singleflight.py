@@ -0,0 +1,105 @@
+# Single-flight call coalescing.
+# Concurrent callers with the same key share one execution of the underlying call.
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Tracks in-flight calls by key and attaches later callers to the first one.
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.followers += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            logger.debug("Attaching to in-flight call")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.leaders,
+                "coalesced": self.followers,
+                "coalescing_ratio": round(self.followers / total, 3) if total else 0.0
+            }
+
+
+class AsyncSingleFlight:
+    # asyncio counterpart of SingleFlight; callers must share one event loop.
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        # The call runs as its own task and every caller, the first included, awaits it
+        # through a shield: cancelling one caller leaves the call running for the rest.
+        task = self._calls.get(key)
+        if task is not None:
+            self.followers += 1
+            logger.debug("Attaching to in-flight call")
+        else:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self.leaders += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Future"):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark retrieved so an error nobody is left to await doesn't warn at GC
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.leaders,
+            "coalesced": self.followers,
+            "coalescing_ratio": round(self.followers / total, 3) if total else 0.0
+        }
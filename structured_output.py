@@ -0,0 +1,182 @@
+# Structured (JSON) LLM output: schemas, validation and parse-failure accounting.
+# Validators normalize near-misses locally so only genuinely broken replies cost another generation.
+
+import re
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llm_telemetry import DEFAULT_CALLER
+
+logger = logging.getLogger(__name__)
+
+# A validator returns (cleaned value or None, what was wrong, whether it had to normalize anything)
+Validator = Callable[[Dict[str, Any]], Tuple[Optional[Dict[str, Any]], List[str], bool]]
+
+MAX_TITLE_WORDS = 6
+MAX_POST_LENGTH = 280
+
+REPAIR_PROMPT = """{prompt}
+
+Your previous reply was rejected: {errors}
+Previous reply: {response}
+
+Reply again with only a JSON object that matches the required format."""
+
+
+def _normalize(value: Any) -> str:
+    return re.sub(r'[^a-z0-9]', '', str(value).lower())
+
+
+def _match(value: Any, allowed: List[str]) -> Optional[str]:
+    # Exact match first, then ignoring case, spaces and punctuation ("Lo-Fi" -> "lofi").
+    if value in allowed:
+        return value
+    wanted = _normalize(value)
+    for option in allowed:
+        if _normalize(option) == wanted:
+            return option
+    return None
+
+
+def extract_json(response: str) -> Optional[Dict[str, Any]]:
+    # Parse a JSON object, tolerating code fences and chatter around it.
+    text = response.strip()
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, dict) else None
+    except ValueError:
+        pass
+
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+        return data if isinstance(data, dict) else None
+    except ValueError:
+        return None
+
+
+def track_schema(genres: List[str], moods: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "genre": {"type": "string", "enum": list(genres)},
+            "mood": {"type": "string", "enum": list(moods)},
+            "title": {"type": "string"}
+        },
+        "required": ["genre", "mood", "title"]
+    }
+
+
+def track_validator(genres: List[str], moods: List[str]) -> Validator:
+    # Genres must come from genre_characteristics and moods from the mood_by_time lists.
+    def validate(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str], bool]:
+        errors = []
+        genre = _match(data.get('genre'), genres)
+        if genre is None:
+            errors.append(f"genre must be one of {', '.join(genres)}")
+
+        mood = _match(data.get('mood'), moods)
+        if mood is None:
+            errors.append(f"mood must be one of {', '.join(moods)}")
+
+        title = str(data.get('title') or '').strip().strip('"\'')
+        if not title:
+            errors.append("title is missing")
+        elif len(title.split()) > MAX_TITLE_WORDS:
+            errors.append(f"title must be at most {MAX_TITLE_WORDS} words")
+
+        if errors:
+            return None, errors, False
+        track = {"genre": genre, "mood": mood, "title": title}
+        return track, [], any(data.get(k) != v for k, v in track.items())
+
+    return validate
+
+
+def post_schema() -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "post": {"type": "string"},
+            "hashtags": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["post", "hashtags"]
+    }
+
+
+def validate_post(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str], bool]:
+    errors = []
+    post = str(data.get('post') or '').strip()
+    if not post:
+        errors.append("post is missing")
+
+    raw = data.get('hashtags') or []
+    if not isinstance(raw, list):
+        raw = str(raw).split()
+    hashtags = ['#' + str(tag).strip().lstrip('#') for tag in raw if str(tag).strip('# ')]
+    # Tags the model already wrote into the post aren't appended twice
+    hashtags = [tag for tag in hashtags if tag.lower() not in post.lower()]
+
+    content = " ".join([post] + hashtags)
+    if len(content) > MAX_POST_LENGTH:
+        errors.append(f"post with hashtags must be at most {MAX_POST_LENGTH} characters")
+
+    if errors:
+        return None, errors, False
+    return {"post": post, "hashtags": hashtags, "content": content}, [], hashtags != raw
+
+
+def _new_totals() -> Dict[str, int]:
+    return {
+        "requests": 0, "first_try": 0, "repaired": 0, "retried": 0, "failed": 0,
+        "generations": 0, "invalid_json": 0, "invalid_fields": 0
+    }
+
+
+class ParseStats:
+    # Per-caller outcome counts for structured generations.
+
+    def __init__(self):
+        self._callers = {}
+        self._lock = threading.Lock()
+
+    def record(self, caller: Optional[str], outcome: str, generations: int,
+               invalid_json: int = 0, invalid_fields: int = 0):
+        # outcome: first_try (valid as returned), repaired (valid after local normalization),
+        # retried (valid after a repair generation) or failed.
+        with self._lock:
+            totals = self._callers.setdefault(caller or DEFAULT_CALLER, _new_totals())
+            totals["requests"] += 1
+            totals[outcome] += 1
+            totals["generations"] += generations
+            totals["invalid_json"] += invalid_json
+            totals["invalid_fields"] += invalid_fields
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            callers = {name: dict(totals) for name, totals in self._callers.items()}
+
+        overall = _new_totals()
+        for totals in callers.values():
+            for key in overall:
+                overall[key] += totals[key]
+
+        return {
+            "callers": {name: self._summarize(totals) for name, totals in callers.items()},
+            "total": self._summarize(overall)
+        }
+
+    def _summarize(self, totals: Dict[str, int]) -> Dict[str, Any]:
+        requests = totals["requests"]
+        succeeded = requests - totals["failed"]
+        return {
+            **totals,
+            "failure_rate": round(totals["failed"] / requests, 3) if requests else 0.0,
+            "first_try_rate": round(totals["first_try"] / requests, 3) if requests else 0.0,
+            # Generations that did not end up as a used result
+            "wasted_generations": totals["generations"] - succeeded
+        }
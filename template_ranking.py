@@ -0,0 +1,173 @@
+# Engagement-ranked marketing templates, per genre. Each ranking is a list kept
+# sorted by (-engagement, template_id) with bisect, so recording a post's engagement
+# is two binary searches (plus a list memmove) and top-k is a slice.
+#
+# A template applies to the genres in its "genres" (or "genre") field, or to every
+# genre when it has neither. Its score starts at its "engagement" and becomes the
+# running mean of that seed and the engagements recorded for it. Records without a
+# genre update the genre-independent score, which each genre uses until engagement
+# is recorded for that genre specifically.
+
+import bisect
+import hashlib
+import logging
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ranking key for records without a genre, and for genres with no ranking of their own yet
+ANY_GENRE = "*"
+
+
+def template_id(template: Dict[str, Any]) -> str:
+    return template.get('id') or hashlib.sha1(template['pattern'].encode('utf-8')).hexdigest()[:12]
+
+
+def _template_genres(template: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    genres = template.get('genres') or ([template['genre']] if template.get('genre') else None)
+    return tuple(genres) if genres else None
+
+
+class TemplateRanking:
+
+    def __init__(self, templates: Iterable[Dict[str, Any]] = ()):
+        self._templates = {}
+        self._genres = {}
+        # (genre, template_id) -> [engagement, recorded posts]; absent means the seed score
+        self._scores = {}
+        self._rankings = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        # Bulk load: one sort per ranking instead of an insort per template
+        for template in templates:
+            tid = template_id(template)
+            self._templates[tid] = template
+            self._genres[tid] = _template_genres(template)
+        for genre in {ANY_GENRE}.union(*(g for g in self._genres.values() if g)):
+            self._ranking(genre)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def _score(self, genre: str, tid: str) -> float:
+        score = self._scores.get((genre, tid)) or self._scores.get((ANY_GENRE, tid))
+        return score[0] if score else float(self._templates[tid].get('engagement', 0))
+
+    def _applies(self, tid: str, genre: str) -> bool:
+        genres = self._genres[tid]
+        return genres is None or genre in genres
+
+    def _ranking(self, genre: str) -> list:
+        # A genre's ranking is built on first use from every template that applies to it.
+        ranking = self._rankings.get(genre)
+        if ranking is None:
+            ranking = sorted((-self._score(genre, tid), tid) for tid in self._templates if self._applies(tid, genre))
+            self._rankings[genre] = ranking
+        return ranking
+
+    def add(self, template: Dict[str, Any]) -> str:
+        # Add (or replace) a template; returns its id.
+        tid = template_id(template)
+        with self._lock:
+            if tid in self._templates:
+                for genre, ranking in self._rankings.items():
+                    if self._applies(tid, genre):
+                        ranking.remove((-self._score(genre, tid), tid))
+            self._templates[tid] = template
+            self._genres[tid] = _template_genres(template)
+            for genre, ranking in self._rankings.items():
+                if self._applies(tid, genre):
+                    bisect.insort(ranking, (-self._score(genre, tid), tid))
+            # Rankings built here already include the template
+            for genre in self._genres[tid] or ():
+                self._ranking(genre)
+        return tid
+
+    def validate(self, tid: str, genre: Optional[str] = None):
+        if tid not in self._templates:
+            raise ValueError(f"Unknown marketing template: {tid}")
+        if genre and not self._applies(tid, genre):
+            raise ValueError(f"Template {tid} does not apply to genre {genre}")
+
+    def record(self, tid: str, engagement: float, genre: Optional[str] = None):
+        # Fold one post's engagement into the template's score for `genre`.
+        engagement = float(engagement)
+        if not math.isfinite(engagement):
+            # A nan would compare false with everything and break the bisect order
+            raise ValueError(f"Engagement must be a finite number, got {engagement}")
+        with self._lock:
+            self.validate(tid, genre)
+            genre = genre or ANY_GENRE
+            score = self._scores.get((genre, tid)) or [self._score(genre, tid), 0]
+            posts = score[1] + 1
+            self._set_score(genre, tid, score[0] + (engagement - score[0]) / (posts + 1), posts)
+            self.recorded += 1
+
+    def _set_score(self, genre: str, tid: str, engagement: float, posts: int):
+        self._ranking(genre)
+        if genre == ANY_GENRE:
+            # Also moves the template in genres still inheriting the genre-independent score
+            affected = [g for g in self._rankings
+                        if g == ANY_GENRE or ((g, tid) not in self._scores and self._applies(tid, g))]
+        else:
+            affected = [genre]
+        old = {g: self._score(g, tid) for g in affected}
+        self._scores[(genre, tid)] = [engagement, posts]
+        for g in affected:
+            ranking = self._rankings[g]
+            at = bisect.bisect_left(ranking, (-old[g], tid))
+            if at < len(ranking) and ranking[at] == (-old[g], tid):
+                del ranking[at]
+            bisect.insort(ranking, (-engagement, tid))
+
+    def top_k(self, genre: Optional[str] = None, k: int = 5) -> List[Dict[str, Any]]:
+        # Highest-scoring templates for `genre`, best first, with their current engagement.
+        with self._lock:
+            genre = genre or ANY_GENRE
+            # Without genre-specific templates or records, a genre ranks exactly like ANY_GENRE
+            ranking = self._rankings.get(genre) or self._rankings[ANY_GENRE]
+            top = ranking[:max(0, k)]
+            return [{**self._templates[tid], "id": tid, "engagement": -neg,
+                     "posts": (self._scores.get((genre, tid)) or self._scores.get((ANY_GENRE, tid)) or [0, 0])[1]}
+                    for neg, tid in top]
+
+    def query(self, genre: Optional[str] = None, n_results: int = 1) -> Dict[str, Any]:
+        # top_k in the {"documents", "metadatas"} shape query_marketing_templates returns.
+        top = self.top_k(genre, n_results)
+        return {
+            "documents": [[t['pattern'] for t in top]],
+            "metadatas": [[{"template_id": t['id'], "engagement": t['engagement'],
+                            "best_time": t.get('best_time', '9am')} for t in top]]
+        }
+
+    def templates(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._templates.values())
+
+    def export(self) -> List[Dict[str, Any]]:
+        # Recorded scores only; seed scores come back from the templates themselves.
+        with self._lock:
+            return [{"genre": genre, "template_id": tid, "engagement": score[0], "posts": score[1]}
+                    for (genre, tid), score in self._scores.items()]
+
+    def load(self, scores: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for entry in scores:
+                if entry['template_id'] not in self._templates:
+                    logger.warning(f"Dropping engagement for unknown template {entry['template_id']}")
+                    continue
+                if not math.isfinite(entry['engagement']):
+                    logger.warning(f"Dropping non-finite engagement for template {entry['template_id']}")
+                    continue
+                self._set_score(entry['genre'], entry['template_id'], entry['engagement'], entry['posts'])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "rankings": len(self._rankings),
+                "scored": len(self._scores),
+                "recorded": self.recorded
+            }
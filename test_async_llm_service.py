@@ -0,0 +1,85 @@
+# Tests for the asyncio LLM service.
+
+import threading
+import time
+
+import async_llm_service
+from async_llm_service import AsyncLLMService
+from ollama_client import OllamaClient
+
+
+class FakeLLMService:
+    # Real client, with the Ollama call itself replaced by a slow echo.
+
+    def __init__(self):
+        self.client = OllamaClient(backends=["http://ollama.test"])
+        self.client.cache = None
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+        self.client.generate_uncached = self._generate
+
+    def _generate(self, key, prompt, caller=None, prefix=None, format=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return prompt.upper()
+
+    def is_available(self):
+        return True
+
+
+def test_concurrent_batches_share_one_loop_and_limit(monkeypatch):
+    monkeypatch.setattr(async_llm_service, "AIOHTTP_AVAILABLE", False)
+    llm = FakeLLMService()
+    service = AsyncLLMService(llm, max_concurrency=2)
+    results, errors = {}, []
+
+    def batch(name):
+        try:
+            results[name] = service.generate_batch([f"{name} {i}" for i in range(4)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=batch, args=(name,)) for name in ("a", "b", "c")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    service.close()
+
+    assert errors == []
+    assert results == {name: [f"{name.upper()} {i}" for i in range(4)] for name in ("a", "b", "c")}
+    assert llm.peak == 2
+    assert service.get_stats()["concurrency"]["peak_active"] == 2
+
+
+def test_batch_evaluates_the_prefix_once_and_sends_its_context(monkeypatch):
+    monkeypatch.setattr(async_llm_service, "AIOHTTP_AVAILABLE", False)
+    llm = FakeLLMService()
+    client = OllamaClient(backends=["http://ollama.test"])
+    client.cache = None
+    payloads = []
+
+    def post_generate(backend, payload):
+        payloads.append(payload)
+        if payload["options"].get("num_predict") == 0:
+            return {"response": "", "context": [7, 8, 9]}
+        return {"response": payload["prompt"].strip()}
+
+    client._post_generate = post_generate
+    llm.client = client
+    service = AsyncLLMService(llm)
+    prefix = "You write songs.\n"
+
+    results = service.generate_batch([prefix + f"Song {i}" for i in range(3)], prefix=prefix)
+    service.close()
+
+    assert results == ["Song 0", "Song 1", "Song 2"]
+    evaluations = [p for p in payloads if p["options"].get("num_predict") == 0]
+    assert [p["prompt"] for p in evaluations] == [prefix]
+    generations = [p for p in payloads if p not in evaluations]
+    assert len(generations) == 3
+    assert all(p["context"] == [7, 8, 9] and not p["prompt"].startswith(prefix) for p in generations)
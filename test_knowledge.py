@@ -0,0 +1,148 @@
+# Tests for the ChromaDB-backed knowledge base, run against an in-memory fake of the
+# small part of the chromadb API it uses.
+
+import sys
+import types
+
+import pytest
+
+import knowledge
+import knowledge_simple
+from config import MOOD_BY_TIME
+from embedding_cache import context_queries
+
+
+class FakeEmbeddingFunction:
+    MODEL_NAME = "fake-embedder"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text)), 1.0] for text in input]
+
+
+class FakeCollection:
+
+    def __init__(self, name, metadata=None, embedding_function=None):
+        self.name = name
+        self.metadata = metadata
+        self.embedding_function = embedding_function
+        self.rows = {}
+        self.queries = []
+
+    def count(self):
+        return len(self.rows)
+
+    def add(self, ids, metadatas, documents=None, embeddings=None):
+        for i, track_id in enumerate(ids):
+            self.rows[track_id] = {"document": documents[i] if documents else None, "metadata": metadatas[i]}
+
+    upsert = add
+
+    def update(self, ids, metadatas):
+        for track_id, metadata in zip(ids, metadatas):
+            self.rows[track_id]["metadata"] = metadata
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+    def get(self, ids=None, offset=0, limit=None, include=None):
+        keys = list(ids) if ids is not None else list(self.rows)[offset:None if limit is None else offset + limit]
+        return {"ids": keys, "metadatas": [self.rows[k]["metadata"] for k in keys],
+                "documents": [self.rows[k]["document"] for k in keys]}
+
+    def query(self, n_results, query_embeddings=None, query_texts=None):
+        self.queries.append({"query_embeddings": query_embeddings, "query_texts": query_texts})
+        keys = list(self.rows)[:n_results]
+        return {"ids": [keys], "documents": [[self.rows[k]["document"] for k in keys]],
+                "metadatas": [[self.rows[k]["metadata"] for k in keys]]}
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, metadata=None, embedding_function=None):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, metadata, embedding_function)
+        return self.collections[name]
+
+
+@pytest.fixture
+def fake_chromadb(monkeypatch):
+    client = FakeClient()
+    chromadb = types.ModuleType("chromadb")
+    chromadb.Client = lambda settings: client
+    config = types.ModuleType("chromadb.config")
+    config.Settings = lambda **kwargs: kwargs
+    utils = types.ModuleType("chromadb.utils")
+    utils.embedding_functions = types.SimpleNamespace(DefaultEmbeddingFunction=FakeEmbeddingFunction)
+    for name, module in [("chromadb", chromadb), ("chromadb.config", config), ("chromadb.utils", utils)]:
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(knowledge, "CHROMADB_AVAILABLE", True)
+    return client
+
+
+def test_ensure_store_opens_and_seeds_chromadb(fake_chromadb, tmp_path):
+    kb = knowledge.KnowledgeBase(str(tmp_path))
+    assert kb.get_stats()["backend"] == "pending"
+
+    assert kb._ensure_store()
+    assert kb.get_stats()["backend"] == "chromadb"
+    context = fake_chromadb.collections["music_context"]
+    assert {"genre_jazz", "mood_morning"} <= set(context.rows)
+    assert context.metadata["seed_fingerprint"] == knowledge.seed_fingerprint()
+    kb.close()
+
+    # The seed is skipped while its fingerprint matches
+    context.rows.clear()
+    reopened = knowledge.KnowledgeBase(str(tmp_path))
+    assert reopened._ensure_store()
+    assert not context.rows
+    reopened.close()
+
+
+def test_recent_tracks_follow_timestamps_not_storage_order(fake_chromadb, tmp_path):
+    tracks = fake_chromadb.get_or_create_collection("music_tracks")
+    for i in [3, 0, 4, 1, 2]:
+        tracks.add(ids=[f"track_{i}"], documents=[f"Track {i}"],
+                   metadatas=[{"title": f"Track {i}", "genre": "jazz", "mood": "calm",
+                               "timestamp": f"2026-01-0{i + 1}T00:00:00"}])
+
+    kb = knowledge.KnowledgeBase(str(tmp_path))
+    kb.recent.size = 3
+    assert kb._ensure_store()
+    assert [t["title"] for t in kb.recent.recent_tracks(3)] == ["Track 2", "Track 3", "Track 4"]
+    kb.close()
+
+
+def test_similar_track_queries_use_warmed_embeddings(fake_chromadb, tmp_path):
+    kb = knowledge.KnowledgeBase(str(tmp_path))
+    kb.add_track({"title": "Blue Hour", "genre": "jazz", "mood": "calm", "timestamp": "2026-01-01T00:00:00"})
+    embedded = len(kb.embedder.calls)
+    query = context_queries(MOOD_BY_TIME)[0]
+
+    kb.query_similar_tracks(query, 1)
+    assert fake_chromadb.collections["music_tracks"].queries == [
+        {"query_embeddings": [[float(len(query)), 1.0]], "query_texts": None}]
+    assert len(kb.embedder.calls) == embedded
+    assert kb.query_embeddings.stats()["hits"] == 1
+    kb.close()
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp_path: knowledge.KnowledgeBase(str(tmp_path)),
+    lambda tmp_path: knowledge_simple.KnowledgeBase(journal_dir=None, segment_dir=None)])
+def test_fallback_store_warms_context_queries(tmp_path, monkeypatch, make):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(knowledge, "CHROMADB_AVAILABLE", False)
+    kb = make(tmp_path)
+    queries = context_queries(kb.get('mood_by_time', {}))
+    assert queries and kb.query_embeddings.stats()["entries"] == len(queries)
+
+    kb.query_similar_tracks(queries[-1], 1)
+    assert kb.query_embeddings.stats()["misses"] == 0
+    kb.close()
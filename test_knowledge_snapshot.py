@@ -0,0 +1,34 @@
+# Tests for knowledge base snapshot export/import.
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import knowledge_simple
+from knowledge_simple import KnowledgeBase
+
+
+def _tracks(count: int):
+    genres = ["lofi", "jazz", "ambient"]
+    return [{"title": f"Track {i}", "genre": genres[i % 3], "mood": "calm",
+             "timestamp": f"2026-01-01T00:00:00.{i:06d}"} for i in range(count)]
+
+
+def test_import_close_reopen(tmp_path, monkeypatch):
+    # A snapshot-backed vector index is saved on close and loads again on the next start.
+    source = KnowledgeBase(journal_dir=None, segment_dir=None)
+    source.add_tracks(_tracks(40))
+    source.export_snapshot(str(tmp_path / "kb.snap"))
+    expected = source.query_similar_tracks("jazz calm Track 7", 3)["ids"]
+
+    monkeypatch.setattr(knowledge_simple, "VECTOR_INDEX_PATH", str(tmp_path / "index"))
+    kb = KnowledgeBase(journal_dir=None, segment_dir=None)
+    kb.load_snapshot(str(tmp_path / "kb.snap"))
+    assert kb.vector_index.stats()["memory_mapped"]
+    kb.add_track({"title": "Late Arrival", "genre": "lofi", "mood": "dark"})
+    kb.close()
+
+    reopened = KnowledgeBase(journal_dir=None, segment_dir=None)
+    assert len(reopened.vector_index) == len(kb.vector_index)
+    assert reopened.query_similar_tracks("jazz calm Track 7", 3)["ids"] == expected
+    assert reopened.query_similar_tracks("Late Arrival lofi dark", 1)["documents"][0][0].endswith("Late Arrival")
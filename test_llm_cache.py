@@ -0,0 +1,78 @@
+# Tests for the LLM response cache.
+
+import llm_cache
+from llm_cache import ResponseCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_varies_with_model_temperature_and_format():
+    base = ResponseCache.make_key("llama2", 0.7, "hi")
+    assert base == ResponseCache.make_key("llama2", 0.7, "hi")
+    variants = [ResponseCache.make_key("mistral", 0.7, "hi"), ResponseCache.make_key("llama2", 0.2, "hi"),
+                ResponseCache.make_key("llama2", 0.7, "hi", "json"),
+                ResponseCache.make_key("llama2", 0.7, "hi", {"type": "object"}),
+                ResponseCache.make_key("llama2", 0.7, "hi!")]
+    assert len({base, *variants}) == 6
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    cache = ResponseCache(ttl_seconds=60, variants=1)
+    cache.put("k", "answer")
+
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_serves_only_once_all_variants_are_filled():
+    cache = ResponseCache(variants=2)
+    cache.put("k", "a")
+    assert cache.get("k") is None
+    cache.put("k", "b")
+    cache.put("k", "c")
+    assert {cache.get("k") for _ in range(50)} == {"a", "b"}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2, variants=1)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sqlite_tier_survives_restart_and_eviction(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(max_entries=1, variants=1, path=path)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    # Evicted from memory, reloaded from disk
+    assert cache.get("a") == "1"
+    cache.discard("b")
+
+    reopened = ResponseCache(variants=1, path=path)
+    assert reopened.get("a") == "1"
+    assert reopened.get("b") is None
+    assert reopened.stats()["disk_hits"] == 1 and reopened.stats()["persistent"]
+
+    clock = Clock()
+    clock.now = 1e12
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    assert ResponseCache(variants=1, path=path).get("a") is None
+    assert reopened._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
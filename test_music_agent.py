@@ -0,0 +1,84 @@
+# Tests for batched track generation in the music agent.
+
+import json
+import threading
+import time
+
+from agents.music_agent import MusicAgent
+from ollama_client import OllamaClient
+
+
+class FakeKnowledgeBase:
+
+    def __init__(self):
+        self.tracks = []
+
+    def get(self, key, default=None):
+        return {
+            "genre_characteristics": {"jazz": {}, "lofi": {}, "ambient": {}},
+            "mood_by_time": {"morning": ["calm"], "afternoon": ["calm"], "evening": ["calm"]}
+        }.get(key, default)
+
+    def query_similar_tracks(self, query, n_results=3):
+        return {"documents": [[]]}
+
+    def add_track(self, track):
+        self.tracks.append(track)
+
+    def add_tracks(self, tracks):
+        self.tracks.extend(tracks)
+
+
+class FakeLLMService:
+    # Real client, with the Ollama call itself replaced by a slow fake.
+
+    def __init__(self):
+        self.client = OllamaClient(backends=["http://ollama.test"])
+        self.client.cache = None
+        self.prompts = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+        self.client.generate_uncached = self._generate
+
+    def _generate(self, key, prompt, caller=None, prefix=None, format=None):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        slot = prompt.rsplit("This is track ", 1)[1].split(" ", 1)[0]
+        return json.dumps({"genre": "jazz", "mood": "calm", "title": f"Blue {slot}"})
+
+    def is_available(self):
+        return True
+
+    def register_prefix(self, prefix):
+        pass
+
+    def generate_json(self, prompt, schema, validate, caller=None, prefix=None, response=None):
+        return self.client.generate_json(prompt, schema, validate, caller, prefix, response)
+
+
+def test_generate_tracks_fans_out_llm_calls():
+    kb, llm = FakeKnowledgeBase(), FakeLLMService()
+    agent = MusicAgent(kb, llm)
+
+    tracks = agent.generate_tracks(3)
+
+    assert len(set(llm.prompts)) == 3
+    assert llm.peak > 1
+    assert sorted(t["title"] for t in tracks) == ["Blue 1", "Blue 2", "Blue 3"]
+    assert all(t["generation_method"] == "llm" for t in tracks)
+    assert kb.tracks == tracks
+
+
+def test_unusable_replies_fall_back_to_local_tracks():
+    kb, llm = FakeKnowledgeBase(), FakeLLMService()
+    llm.client.generate_uncached = lambda key, prompt, caller=None, prefix=None, format=None: "no json"
+    agent = MusicAgent(kb, llm)
+
+    tracks = agent.generate_tracks(2) + [agent.generate_track()]
+    assert [t["generation_method"] for t in tracks] == ["fallback"] * 3
+    assert all(t["genre"] in ["jazz", "lofi", "ambient"] for t in tracks)
@@ -0,0 +1,116 @@
+# Tests for Ollama backend routing, against fake_ollama servers on separate ports.
+
+import threading
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+from fake_ollama import FakeOllama, create_app
+from ollama_backends import BackendPool
+
+MODEL = "llama2"
+
+
+class StandIn:
+    # A fake Ollama served on its own port; stop() and start() keep the port.
+
+    def __init__(self, latency_ms: float = 0, port: int = 0):
+        self.fake = FakeOllama([MODEL], latency=f"constant:{latency_ms}", tokens_per_sec=0,
+                               prompt_tokens_per_sec=1e9, load_ms=0, response_tokens=3, seed=1)
+        self.port = port
+        self.start()
+
+    def start(self):
+        self.server = make_server("127.0.0.1", self.port, create_app(self.fake), threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+@pytest.fixture
+def stand_ins():
+    servers = []
+
+    def start(*latencies):
+        servers.extend(StandIn(ms) for ms in latencies)
+        return servers
+
+    yield start
+    for server in servers:
+        try:
+            server.stop()
+        except Exception:
+            pass
+
+
+def _generate(session: requests.Session):
+    def call(backend):
+        response = session.post(f"{backend.url}/api/generate", timeout=(1, 5),
+                                json={"model": MODEL, "prompt": "hi", "stream": False})
+        response.raise_for_status()
+        return backend.url
+    return call
+
+
+def _pool(servers, **kwargs) -> BackendPool:
+    kwargs.setdefault("hedge_percentile", 0)
+    return BackendPool(requests.Session(), MODEL, [s.url for s in servers], **kwargs)
+
+
+def test_calls_go_to_the_least_loaded_backend(stand_ins):
+    a, b = stand_ins(0, 0)
+    pool = _pool([a, b])
+    session = requests.Session()
+    busy, idle = pool.backends
+
+    with pool.track(busy):
+        assert {pool.call(_generate(session)) for _ in range(3)} == {idle.url}
+    # Idle again, busy has served fewer requests and is picked next
+    assert pool.call(_generate(session)) == busy.url
+    assert [b.requests for b in pool.backends] == [2, 3]
+
+
+def test_dead_port_is_ejected_and_readmitted(stand_ins):
+    a, b = stand_ins(0, 0)
+    pool = _pool([a, b], eject_after_failures=2)
+    session = requests.Session()
+    alive, dead = pool.backends
+    alive.requests = 10
+    b.stop()
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            pool.call(_generate(session))
+    assert dead.ejected
+    assert {pool.call(_generate(session)) for _ in range(3)} == {a.url}
+
+    assert pool.refresh()
+    assert dead.ejected and dead.eject_reason.startswith("unreachable")
+
+    b.start()
+    assert pool.refresh()
+    assert not dead.ejected
+    assert pool.call(_generate(session)) == b.url
+
+
+def test_hedge_wins_against_a_slow_backend(stand_ins):
+    slow, fast = stand_ins(800, 0)
+    pool = _pool([slow, fast], hedge_percentile=50, hedge_min_samples=2)
+    for backend in pool.backends:
+        backend.latencies.extend([0.05, 0.05])
+    # Ties on outstanding calls go to the backend with fewer requests: the slow one
+    pool.backends[1].requests = 10
+
+    assert pool.call(_generate(requests.Session())) == fast.url
+    assert pool.stats()["hedged"] == 1
+    assert pool.hedge_wins == 1
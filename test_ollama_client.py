@@ -0,0 +1,57 @@
+# Tests for the Ollama client's circuit breaker handling on streams.
+
+import pytest
+
+from ollama_backends import NoBackendAvailable
+from ollama_client import OllamaClient
+from ollama_health import CircuitBreaker
+
+
+class FakeTransport:
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, url, payload):
+        for chunk in self.chunks:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+
+def _half_open_client(chunks=()) -> OllamaClient:
+    # A client whose breaker lets the next call through as the half-open trial.
+    client = OllamaClient(backends=["http://ollama.test"])
+    client.cache = None
+    client.transport = FakeTransport(chunks)
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client.breaker.record_failure()
+    return client
+
+
+def test_no_backend_fails_the_trial():
+    client = _half_open_client()
+    for backend in client.backends.backends:
+        backend.ejected = True
+    with pytest.raises(NoBackendAvailable):
+        list(client.stream("hi"))
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert client.breaker.failures == 2
+
+
+def test_stream_stopped_before_first_chunk_releases_the_trial():
+    client = _half_open_client([KeyboardInterrupt()])
+    with pytest.raises(KeyboardInterrupt):
+        next(client.stream("hi"))
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert client.breaker.failures == 1
+    # The trial was handed back, so the next call may try again
+    assert client.breaker.allow()
+
+
+def test_stream_closed_after_first_token_closes_the_circuit():
+    client = _half_open_client([{"response": "a"}, {"response": "b"}, {"done": True}])
+    stream = client.stream("hi")
+    assert next(stream) == "a"
+    stream.close()
+    assert client.breaker.state == CircuitBreaker.CLOSED
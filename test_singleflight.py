@@ -0,0 +1,112 @@
+# Tests for single-flight call coalescing.
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _run_together(flight, count, func):
+    # Start `count` threads calling flight.do("k", func); returns their results or errors.
+    outcomes = [None] * count
+    entered = threading.Barrier(count + 1)
+
+    def call(i):
+        entered.wait()
+        try:
+            outcomes[i] = flight.do("k", func)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    entered.wait()
+    return threads, outcomes
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    threads, outcomes = _run_together(flight, 8, work)
+    while flight.stats()["executed"] + flight.stats()["coalesced"] < 8:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes == ["done"] * 8
+    assert calls == [1]
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 7, "coalescing_ratio": 0.875}
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, outcomes = _run_together(flight, 5, fail)
+    while flight.stats()["executed"] + flight.stats()["coalesced"] < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert [type(o) for o in outcomes] == [ValueError] * 5
+    assert flight.stats()["executed"] == 1
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+
+def test_cancelled_leader_leaves_followers_running():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert await follower == "done"
+        assert calls == [1]
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_caller_and_clears_the_key():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError, ValueError]
+        assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 1, "coalescing_ratio": 0.5}
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+# Tests for JSON output schemas, validators and the repair loop.
+
+import pytest
+
+from ollama_client import OllamaClient
+from structured_output import (MAX_POST_LENGTH, extract_json, post_schema, track_schema, track_validator,
+                               validate_post)
+
+GENRES = ["lofi", "jazz", "electronic"]
+MOODS = ["calm", "happy"]
+
+
+def test_track_schema_lists_allowed_values():
+    schema = track_schema(GENRES, MOODS)
+    assert schema["properties"]["genre"]["enum"] == GENRES
+    assert schema["properties"]["mood"]["enum"] == MOODS
+    assert schema["required"] == ["genre", "mood", "title"]
+    assert post_schema()["required"] == ["post", "hashtags"]
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', '```json\n{"a": 1}\n```', 'Sure! {"a": 1} Enjoy.'])
+def test_extract_json_tolerates_wrapping(text):
+    assert extract_json(text) == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ["no json here", "[1, 2]", '{"a": 1', ""])
+def test_extract_json_rejects_non_objects(text):
+    assert extract_json(text) is None
+
+
+def test_track_validator_accepts_and_normalizes():
+    validate = track_validator(GENRES, MOODS)
+    assert validate({"genre": "jazz", "mood": "calm", "title": "Blue Hour"}) == (
+        {"genre": "jazz", "mood": "calm", "title": "Blue Hour"}, [], False)
+    value, errors, repaired = validate({"genre": "Lo-Fi", "mood": "CALM", "title": '"Night Drive"'})
+    assert value == {"genre": "lofi", "mood": "calm", "title": "Night Drive"}
+    assert errors == [] and repaired
+
+
+@pytest.mark.parametrize("data, problem", [
+    ({"mood": "calm", "title": "A"}, "genre"),
+    ({"genre": "polka", "mood": "calm", "title": "A"}, "genre"),
+    ({"genre": "jazz", "mood": 3, "title": "A"}, "mood"),
+    ({"genre": "jazz", "mood": "calm"}, "title"),
+    ({"genre": "jazz", "mood": "calm", "title": None}, "title"),
+    ({"genre": "jazz", "mood": "calm", "title": "one two three four five six seven"}, "title"),
+])
+def test_track_validator_rejects_missing_or_wrong_fields(data, problem):
+    value, errors, _ = track_validator(GENRES, MOODS)(data)
+    assert value is None
+    assert len(errors) == 1 and errors[0].startswith(problem)
+
+
+def test_validate_post():
+    value, errors, repaired = validate_post({"post": "New track out", "hashtags": ["#lofi", "beats"]})
+    assert value["content"] == "New track out #lofi #beats"
+    assert errors == [] and repaired
+
+    value, _, repaired = validate_post({"post": "Chill #lofi", "hashtags": "#lofi #study"})
+    assert value["hashtags"] == ["#study"] and repaired
+
+    for data in [{"hashtags": ["#x"]}, {"post": "", "hashtags": []}, {"post": "x" * MAX_POST_LENGTH, "hashtags": ["#y"]}]:
+        value, errors, _ = validate_post(data)
+        assert value is None and errors
+
+
+def _client(replies):
+    # A client whose generations are served from `replies`, recording each prompt sent.
+    client = OllamaClient(backends=["http://ollama.test"])
+    client.cache = None
+    client.prompts = []
+
+    def generate(prompt, caller=None, prefix=None, format=None):
+        client.prompts.append(prompt)
+        return replies.pop(0)
+
+    client.generate = generate
+    return client
+
+
+def test_generate_json_first_try_and_local_repair():
+    validate = track_validator(GENRES, MOODS)
+    client = _client(['{"genre": "jazz", "mood": "calm", "title": "Blue"}', '{"genre": "JAZZ", "mood": "calm", "title": "Blue"}'])
+    assert client.generate_json("p", {}, validate, caller="t") == {"genre": "jazz", "mood": "calm", "title": "Blue"}
+    assert client.generate_json("p", {}, validate, caller="t")["genre"] == "jazz"
+    totals = client.parse_stats.summary()["callers"]["t"]
+    assert (totals["first_try"], totals["repaired"], totals["generations"]) == (1, 1, 2)
+
+
+def test_generate_json_retries_with_the_errors():
+    client = _client(['not json', '{"genre": "jazz", "mood": "calm", "title": "Blue"}'])
+    value = client.generate_json("make a track", {}, track_validator(GENRES, MOODS), caller="t", max_attempts=2)
+    assert value["title"] == "Blue"
+    assert "reply was not a JSON object" in client.prompts[1] and "make a track" in client.prompts[1]
+    assert client.parse_stats.summary()["callers"]["t"]["retried"] == 1
+
+
+def test_generate_json_gives_up_so_callers_fall_back():
+    client = _client(['{"genre": "polka"}', '{"genre": "polka"}'])
+    assert client.generate_json("p", {}, track_validator(GENRES, MOODS), caller="t", max_attempts=2) is None
+    totals = client.parse_stats.summary()["callers"]["t"]
+    assert (totals["failed"], totals["invalid_fields"], totals["wasted_generations"]) == (1, 2, 2)
+
+    # An Ollama failure is not repaired
+    client = _client([None])
+    assert client.generate_json("p", {}, track_validator(GENRES, MOODS), max_attempts=3) is None
+    assert len(client.prompts) == 1
@@ -0,0 +1,26 @@
+# Tests for engagement-ranked marketing templates.
+
+import pytest
+
+from template_ranking import TemplateRanking, template_id
+
+
+def _ranking():
+    templates = [{"pattern": f"Post {i}", "engagement": i} for i in range(5)]
+    return TemplateRanking(templates), [template_id(t) for t in templates]
+
+
+@pytest.mark.parametrize("engagement", [float("nan"), float("inf"), "-inf"])
+def test_non_finite_engagement_is_rejected(engagement):
+    ranking, ids = _ranking()
+    with pytest.raises(ValueError):
+        ranking.record(ids[0], engagement)
+    ranking.record(ids[0], 10)
+    assert [t["engagement"] for t in ranking.top_k(k=5)] == [5.0, 4, 3, 2, 1]
+    assert ranking.stats()["recorded"] == 1
+
+
+def test_load_drops_non_finite_scores():
+    ranking, ids = _ranking()
+    ranking.load([{"genre": "*", "template_id": ids[0], "engagement": float("nan"), "posts": 1}])
+    assert ranking.export() == []
@@ -0,0 +1,29 @@
+# Tests for track ids and the content-hash index.
+
+import random
+
+from track_dedup import ContentHashIndex, TrackIdColumn, content_hash
+
+
+def test_claims_match_a_dict_across_merges():
+    index, expected = ContentHashIndex(), {}
+    index.MERGE_MIN = 64
+    rng = random.Random(3)
+    for i in range(5000):
+        digest = content_hash({"title": f"Track {rng.randrange(3000)}", "genre": "lofi", "mood": "calm"})
+        track_id = f"track_{i}" if i % 7 else f"legacy_{i}.5"
+        assert index.claim(digest, track_id) == expected.get(digest[:16])
+        expected.setdefault(digest[:16], track_id)
+
+    assert index.export() == expected
+    reloaded = ContentHashIndex()
+    reloaded.load(expected)
+    assert reloaded.export() == expected
+    assert index.stats()["unique_tracks"] == len(expected)
+
+
+def test_id_column_keeps_any_id():
+    ids = TrackIdColumn(base=["track_a"])
+    ids.extend(["track_17", "track_017", "other_5", "track_9"])
+    assert list(ids) == ["track_a", "track_17", "track_017", "other_5", "track_9"]
+    assert ids[-1] == "track_9"
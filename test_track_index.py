@@ -0,0 +1,93 @@
+# Tests for the in-memory track indexes.
+
+import random
+
+import pytest
+
+from track_index import RecentTracksIndex, TrackMetadataIndex
+from track_store import TrackStore
+
+
+def _tracks(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [{
+        "title": f"Track {i}",
+        "genre": rng.choice(["lofi", "jazz", "ambient", "rare"] if i % 50 == 0 else ["lofi", "jazz", "ambient"]),
+        "mood": rng.choice(["calm", "dark"]),
+        # Mostly in arrival order, with repeats and a few late arrivals
+        "timestamp": f"2026-01-01T00:{(i // 3 if rng.random() > 0.05 else rng.randrange(count // 3)) % 60:02d}:00"
+                     f".{i // 180:03d}"
+    } for i in range(count)]
+
+
+def _reference(tracks, filters, time_range, limit, offset):
+    start, end = time_range or (None, None)
+    rows = [r for r, t in enumerate(tracks)
+            if all(t.get(f) == v for f, v in filters.items())
+            and (start is None or t['timestamp'] >= start) and (end is None or t['timestamp'] <= end)]
+    rows.sort(key=lambda r: (tracks[r]['timestamp'], r), reverse=True)
+    return {"tracks": [tracks[r] for r in rows[offset:offset + limit]], "total": len(rows)}
+
+
+@pytest.mark.parametrize("store", [None, TrackStore])
+def test_query_matches_full_scan(store):
+    tracks = _tracks(3000)
+    index = TrackMetadataIndex(store() if store else None)
+    index.add_many(tracks)
+    filters = [{}, {"genre": "jazz"}, {"genre": "rare"}, {"genre": "jazz", "mood": "dark"},
+               {"genre": "missing"}, {"genre": "rare", "mood": "calm"}]
+    ranges = [None, ("2026-01-01T00:10:00", "2026-01-01T00:20:00.999"), ("2026-01-01T00:59", None),
+              (None, "2026-01-01T00:00:00.999")]
+    for f in filters:
+        for time_range in ranges:
+            for limit, offset in [(50, 0), (10, 40), (5, 2990), (0, 0), (100, 900)]:
+                expected = _reference(tracks, f, time_range, limit, offset)
+                assert index.query(f, time_range, limit, offset) == expected, (f, time_range, limit, offset)
+
+
+def test_discarded_rows_leave_every_query():
+    tracks = _tracks(1500, seed=4)
+    index = TrackMetadataIndex()
+    rows = [index.add(t) for t in tracks]
+    gone = set(random.Random(5).sample(rows, 400))
+    for row in gone:
+        index.discard(row)
+    index.discard(next(iter(gone)))
+    kept = [t for r, t in enumerate(tracks) if r not in gone]
+
+    assert len(index) == len(kept)
+    for f in [{}, {"genre": "jazz"}, {"genre": "rare"}, {"genre": "jazz", "mood": "dark"}]:
+        for time_range in [None, ("2026-01-01T00:10:00", "2026-01-01T00:20:00.999")]:
+            for limit, offset in [(50, 0), (10, 400)]:
+                assert index.query(f, time_range, limit, offset) == _reference(kept, f, time_range, limit, offset)
+
+
+class FakeCollection:
+    # Pages in whatever order the rows were stored, like Chroma's get().
+
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+
+    def count(self):
+        return len(self.metadatas)
+
+    def get(self, offset=0, limit=None, include=None):
+        page = self.metadatas[offset:offset + limit]
+        return {"ids": [str(i) for i in range(offset, offset + len(page))], "metadatas": page}
+
+
+def test_recent_index_loads_newest_by_timestamp():
+    tracks = _tracks(300, seed=2)
+    stored = tracks[:]
+    random.Random(3).shuffle(stored)
+    expected = [t for _, t in sorted(enumerate(tracks), key=lambda e: (e[1]['timestamp'], stored.index(e[1])))][-25:]
+
+    recent = RecentTracksIndex(size=25)
+    assert recent.load_from_collection(FakeCollection(stored)) == 25
+    assert recent.recent_tracks(25) == expected
+
+    index = TrackMetadataIndex()
+    index.add_many(stored)
+    from_index = RecentTracksIndex(size=25)
+    from_index.load_from_index(index)
+    assert from_index.recent_tracks(25) == expected
@@ -0,0 +1,45 @@
+# Tests for the append-only track journal.
+
+import pytest
+
+from track_journal import TrackJournal
+
+
+def _journal(directory) -> TrackJournal:
+    return TrackJournal(str(directory), lambda: {}, fsync_batch=1, compact_after=0)
+
+
+def _append_raw(directory, data: bytes):
+    with open(directory / "journal.0.jsonl", "ab") as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("tail", [b'{"a": 3', b'{"a": 3}\n{"a"', b'\xff\xfe garbage\n'])
+def test_append_after_torn_tail_survives_restart(tmp_path, tail):
+    journal = _journal(tmp_path)
+    journal.load()
+    journal.append([{"a": 1}, {"a": 2}])
+    journal.close()
+    _append_raw(tmp_path, tail)
+
+    journal = _journal(tmp_path)
+    journal.load()
+    journal.append([{"a": 4}])
+    journal.close()
+
+    _, records = _journal(tmp_path).load()
+    assert records[:2] == [{"a": 1}, {"a": 2}]
+    assert records[-1] == {"a": 4}
+
+
+def test_unterminated_last_record_is_kept(tmp_path):
+    _append_raw(tmp_path, b'{"a": 1}\n{"a": 2}')
+
+    journal = _journal(tmp_path)
+    _, records = journal.load()
+    assert records == [{"a": 1}, {"a": 2}]
+    journal.append([{"a": 3}])
+    journal.close()
+
+    _, records = _journal(tmp_path).load()
+    assert records == [{"a": 1}, {"a": 2}, {"a": 3}]
@@ -0,0 +1,52 @@
+# Tests for the write-behind track buffer.
+
+from track_dedup import ContentHashIndex, content_hash
+from track_index import TrackMetadataIndex
+from track_writer import TrackWriteBuffer
+
+
+class FlakyCollection:
+    # Fails the first `failures` adds, then stores records in order.
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.records = []
+
+    def add(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unavailable")
+        self.records.extend(records)
+
+
+def test_failed_batch_is_retried_in_order():
+    collection = FlakyCollection(failures=2)
+    writer = TrackWriteBuffer(collection.add, batch_size=2, flush_interval=0, max_attempts=3, retry_delay=0)
+    writer.add([1, 2, 3])
+    assert writer.flush() == 0 and len(writer) == 3
+    writer.add([4])
+    writer.close()
+    assert collection.records == [1, 2, 3, 4]
+    assert writer.stats()["retries"] == 2 and writer.stats()["dropped"] == 0
+
+
+def test_dropped_batch_releases_its_claims():
+    hashes, index = ContentHashIndex(), TrackMetadataIndex()
+    track = {"title": "Night Drive", "genre": "synthwave", "mood": "dark", "timestamp": "2026-01-01T00:00:00"}
+    digest = content_hash(track)
+    assert hashes.claim(digest, "track_1") is None
+    record = ("track_1", track, index.add(track))
+
+    def release(batch):
+        for track_id, stored, row in batch:
+            hashes.release(content_hash(stored), track_id)
+            index.discard(row)
+
+    collection = FlakyCollection(failures=10)
+    writer = TrackWriteBuffer(collection.add, flush_interval=0, on_drop=release, max_attempts=2, retry_delay=0)
+    writer.add([record])
+    writer.close()
+
+    assert collection.records == [] and writer.stats()["dropped"] == 1
+    assert hashes.claim(digest, "track_2") is None
+    assert index.query({"genre": "synthwave"}) == {"tracks": [], "total": 0}
@@ -0,0 +1,107 @@
+# Tests for the NumPy vector index and its on-disk form.
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import knowledge_simple
+from vector_index import VectorIndex
+
+
+def _index(size: int = 2000, dim: int = 128) -> VectorIndex:
+    index = VectorIndex()
+    rng = np.random.default_rng(1)
+    ids = [f"track_{i}" for i in range(size)]
+    index.add(ids, rng.random((size, dim)), [f"doc {i}" for i in ids], [{"title": i} for i in ids])
+    return index
+
+
+def test_save_over_memory_mapped_load(tmp_path):
+    # Saving an index that is still a memory map of vectors.npy must not truncate the file.
+    _index().save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.stats()["memory_mapped"]
+    loaded.save(str(tmp_path))
+
+    reloaded = VectorIndex.load(str(tmp_path))
+    assert len(reloaded) == 2000
+    assert reloaded.query(np.ones(128), 3)["ids"] == _index().query(np.ones(128), 3)["ids"]
+
+
+def test_mismatched_files_are_rejected(tmp_path):
+    _index().save(str(tmp_path))
+    (tmp_path / "tracks.json").write_text(json.dumps({"ids": ["a"], "documents": ["a"], "metadatas": [{}]}))
+    with pytest.raises(ValueError):
+        VectorIndex.load(str(tmp_path))
+
+
+def test_knowledge_base_rebuilds_unreadable_index(tmp_path, monkeypatch):
+    _index().save(str(tmp_path))
+    with open(tmp_path / "vectors.npy", "r+b") as f:
+        f.truncate(4096)
+    monkeypatch.setattr(knowledge_simple, "VECTOR_INDEX_PATH", str(tmp_path))
+
+    kb = knowledge_simple.KnowledgeBase(journal_dir=None, segment_dir=None)
+    kb.add_track({"title": "Night Drive", "genre": "synthwave", "mood": "dark"})
+    assert kb.query_similar_tracks("synthwave dark", 1)["count"] == 1
+
+
+def test_knowledge_base_index_refers_to_stored_tracks(tmp_path, monkeypatch):
+    # Similarity hits resolve through the hot store and cold segments, also after a restart.
+    monkeypatch.setattr(knowledge_simple, "VECTOR_INDEX_PATH", str(tmp_path / "index"))
+
+    def open_kb():
+        return knowledge_simple.KnowledgeBase(str(tmp_path / "kb.json"), journal_dir=str(tmp_path / "journal"),
+                                              segment_dir=str(tmp_path / "segments"), hot_window=10, segment_size=20)
+
+    kb = open_kb()
+    kb.add_tracks([{"title": f"Song {i}", "genre": "lofi", "mood": "calm", "timestamp": f"2026-01-01T00:00:{i:02d}"}
+                   for i in range(50)])
+    assert len(kb.segments) == 2
+    assert kb.vector_index.stats()["track_refs"] and not kb.vector_index.metadatas
+    cold = kb.query_similar_tracks("Song 3", 1)
+    assert cold["metadatas"][0][0]["title"] == "Song 3"
+    assert cold["documents"][0][0].endswith("Song 3")
+    kb.close()
+
+    reopened = open_kb()
+    assert reopened.vector_index.stats()["track_refs"]
+    assert reopened.query_similar_tracks("Song 47", 1)["metadatas"][0][0]["title"] == "Song 47"
+    assert reopened.query_similar_tracks("Song 3", 1)["ids"] == cold["ids"]
+    reopened.close()
+
+
+def test_rebuilt_index_covers_cold_segments(tmp_path):
+    # Without a saved index, a restart re-embeds the cold tier as well as the hot one.
+    def open_kb():
+        return knowledge_simple.KnowledgeBase(str(tmp_path / "kb.json"), journal_dir=str(tmp_path / "journal"),
+                                              segment_dir=str(tmp_path / "segments"), hot_window=10, segment_size=20)
+
+    tracks = [{"title": f"Song {i}", "genre": "lofi", "mood": "calm", "timestamp": f"2026-01-01T00:00:{i:02d}"}
+              for i in range(50)]
+    kb = open_kb()
+    kb.add_tracks(tracks)
+    kb.close()
+
+    reopened = open_kb()
+    assert len(reopened.vector_index) == 50
+    assert reopened.query_similar_tracks("Song 3", 1)["metadatas"][0][0]["title"] == "Song 3"
+    # Cold tracks still count as already indexed
+    reopened.add_track(dict(tracks[3]))
+    assert len(reopened.vector_index) == 50
+    reopened.close()
+
+
+def test_scratch_storage_grows_in_place(tmp_path):
+    index = VectorIndex(initial_capacity=16)
+    index.use_storage(str(tmp_path))
+    rng = np.random.default_rng(2)
+    vectors = rng.random((100, 8))
+    for start in range(0, 100, 10):
+        index.add([f"track_{i}" for i in range(start, start + 10)], vectors[start:start + 10],
+                  [str(i) for i in range(start, start + 10)], [{}] * 10)
+    assert index.stats()["scratch_file"] and index.stats()["memory_mapped"]
+    assert index.query(vectors[42], 1)["ids"] == [["track_42"]]
+    assert index.query(vectors[3], 1)["ids"] == [["track_3"]]
@@ -0,0 +1,50 @@
+# End-to-end tests for the Flask routes, on a throwaway knowledge base.
+
+import pytest
+
+import knowledge
+import knowledge_simple
+import web_app
+from orchestrator import MusicCompany
+
+
+@pytest.fixture
+def client(monkeypatch):
+    kb = knowledge_simple.KnowledgeBase(journal_dir=None, segment_dir=None)
+    monkeypatch.setattr(web_app, "kb", kb)
+    monkeypatch.setattr(web_app, "company", MusicCompany(kb, web_app.llm_service))
+    yield web_app.app.test_client()
+    kb.close()
+
+
+def test_app_uses_the_json_store_without_chromadb():
+    if not knowledge.CHROMADB_AVAILABLE:
+        assert web_app.KnowledgeBase is knowledge_simple.KnowledgeBase
+
+
+def test_generated_track_gets_a_marketing_post(client):
+    track = client.post('/api/generate', json={}).get_json()["track"]
+    recent = client.get('/api/status').get_json()["status"]["recent_tracks"]
+    assert recent > 0
+
+    response = client.post('/api/marketing/create', json={})
+    assert response.status_code == 200
+    post = response.get_json()["post"]
+    assert post["template_id"] is not None
+    assert post["genre"] == track["genre"]
+    assert client.get('/api/marketing/templates').get_json()["templates"]
+
+
+@pytest.mark.parametrize("count", ["two", 0, -1, None, [2]])
+def test_generate_rejects_bad_counts(client, count):
+    response = client.post('/api/generate', json={"count": count})
+    assert response.status_code == 400
+
+
+def test_generate_caps_the_count(client):
+    assert len(client.post('/api/generate', json={"count": 50}).get_json()["tracks"]) == 20
+
+
+@pytest.mark.parametrize("query", ["offset=-3", "limit=-1", "limit=ten"])
+def test_tracks_rejects_bad_paging(client, query):
+    assert client.get(f'/api/tracks?{query}').status_code == 400
@@ -0,0 +1,218 @@
+# Track identity: monotonic ids, and a content-hash index over normalized
+# (title, genre, mood) so repeated tracks are stored and embedded once.
+
+import re
+import time
+import heapq
+import hashlib
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(track: Dict[str, Any]) -> str:
+    # Case, surrounding and repeated whitespace don't make a different track.
+    parts = [re.sub(r'\s+', ' ', str(track.get(field, ''))).strip().casefold()
+             for field in ('title', 'genre', 'mood')]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def id_number(track_id: str, prefix: str = "track") -> Optional[int]:
+    # n for an id TrackIdGenerator could have made ("<prefix>_<n>"), else None.
+    head, _, number = track_id.rpartition('_')
+    if head == prefix and number.isdigit() and str(int(number)) == number and int(number) < 2 ** 63:
+        return int(number)
+    return None
+
+
+class TrackIdGenerator:
+    # "<prefix>_<n>" where n is wall-clock microseconds, bumped past the previous id
+    # so two calls in the same tick (or after a clock step back) never collide.
+
+    def __init__(self, prefix: str = "track"):
+        self.prefix = prefix
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        with self._lock:
+            self._last = max(time.time_ns() // 1000, self._last + 1)
+            return f"{self.prefix}_{self._last}"
+
+    def last_id(self) -> Optional[str]:
+        with self._lock:
+            return f"{self.prefix}_{self._last}" if self._last else None
+
+    def observe(self, track_id: str):
+        # Keep later ids above one already stored, e.g. across restarts.
+        head, _, number = track_id.rpartition('_')
+        if head == self.prefix and number.isdigit():
+            with self._lock:
+                self._last = max(self._last, int(number))
+
+
+class TrackIdColumn(Sequence):
+    # Ids from TrackIdGenerator held as their int64 numbers; any other id is kept as
+    # given. Positions below len(base) read from `base`, e.g. ids mapped from a snapshot.
+
+    def __init__(self, prefix: str = "track", base: Sequence = ()):
+        self.prefix = prefix
+        self._base = base
+        self._numbers = array('q')
+        self._other = {}
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._numbers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("track id index out of range")
+        if index < len(self._base):
+            return self._base[index]
+        index -= len(self._base)
+        other = self._other.get(index)
+        return other if other is not None else f"{self.prefix}_{self._numbers[index]}"
+
+    def append(self, track_id: str):
+        number = id_number(track_id, self.prefix)
+        if number is not None:
+            self._numbers.append(number)
+        else:
+            self._other[len(self._numbers)] = track_id
+            self._numbers.append(0)
+
+    def extend(self, track_ids: Iterable[str]):
+        for track_id in track_ids:
+            self.append(track_id)
+
+
+class ContentHashIndex:
+    # Digests are keyed by their first 64 bits and TrackIdGenerator ids by their number.
+    # New claims go to a dict that is merged into two sorted arrays once it reaches a
+    # sixteenth of their size, so an indexed track costs about 16 bytes plus its share of the dict.
+
+    MERGE_MIN = 4096
+
+    def __init__(self, prefix: str = "track"):
+        self.prefix = prefix
+        self._keys = array('Q')
+        self._values = array('q')
+        # key -> id number, or the id itself when it has no number
+        self._recent = {}
+        # key -> id, for merged ids without a number (their value is -1)
+        self._other = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._recent)
+
+    @staticmethod
+    def _key(digest: str) -> int:
+        return int(digest[:16], 16)
+
+    def _find(self, key: int) -> Optional[str]:
+        # Caller holds self._lock.
+        value = self._recent.get(key)
+        if value is None:
+            i = bisect_left(self._keys, key)
+            if i == len(self._keys) or self._keys[i] != key:
+                return None
+            value = self._values[i]
+            if value < 0:
+                return self._other[key]
+        return value if isinstance(value, str) else f"{self.prefix}_{value}"
+
+    def _put(self, key: int, track_id: str, merge: bool = True):
+        # Caller holds self._lock and has checked that `key` is absent. Bulk loads
+        # pass merge=False and merge once at the end.
+        number = id_number(track_id, self.prefix)
+        self._recent[key] = number if number is not None else track_id
+        if merge and len(self._recent) >= max(self.MERGE_MIN, len(self._keys) // 16):
+            self._merge()
+
+    def _merge(self):
+        recent = []
+        for key, value in sorted(self._recent.items()):
+            if isinstance(value, str):
+                self._other[key] = value
+                value = -1
+            recent.append((key, value))
+        keys, values = array('Q'), array('q')
+        for key, value in heapq.merge(zip(self._keys, self._values), recent):
+            keys.append(key)
+            values.append(value)
+        self._keys, self._values, self._recent = keys, values, {}
+
+    def claim(self, digest: str, track_id: str) -> Optional[str]:
+        # Returns the id already holding `digest`, or records `track_id` for it and returns None.
+        key = self._key(digest)
+        with self._lock:
+            existing = self._find(key)
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self._put(key, track_id)
+            self.misses += 1
+            return None
+
+    def release(self, digest: str, track_id: str):
+        # Forget `digest` if `track_id` still holds it, e.g. when that track was never stored.
+        key = self._key(digest)
+        with self._lock:
+            if self._find(key) != track_id:
+                return
+            if key in self._recent:
+                del self._recent[key]
+                return
+            i = bisect_left(self._keys, key)
+            del self._keys[i]
+            del self._values[i]
+            self._other.pop(key, None)
+
+    def add_many(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        # Rebuild from stored tracks; the first id seen for a hash wins.
+        with self._lock:
+            for track_id, metadata in zip(ids, metadatas):
+                digest = (metadata or {}).get('content_hash') or content_hash(metadata or {})
+                key = self._key(digest)
+                if self._find(key) is None:
+                    self._put(key, track_id, merge=False)
+            self._merge()
+
+    def export(self) -> Dict[str, str]:
+        with self._lock:
+            exported = {f"{key:016x}": self._other[key] if value < 0 else f"{self.prefix}_{value}"
+                        for key, value in zip(self._keys, self._values)}
+            exported.update((f"{key:016x}", value if isinstance(value, str) else f"{self.prefix}_{value}")
+                            for key, value in self._recent.items())
+            return exported
+
+    def load(self, ids: Dict[str, str]):
+        # Digests may be full hex digests or the 16-character keys export() writes.
+        with self._lock:
+            for digest, track_id in ids.items():
+                key = self._key(digest)
+                if self._find(key) is None:
+                    self._put(key, track_id, merge=False)
+            self._merge()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "unique_tracks": len(self._keys) + len(self._recent),
+                "duplicates": self.hits,
+                "new": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
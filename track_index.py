@@ -0,0 +1,239 @@
+# In-memory indexes over stored tracks, kept in step with KnowledgeBase.add_track
+# so hot lookups never scan the whole collection.
+
+import bisect
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import RECENT_INDEX_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+# Rows read per page when rebuilding indexes from a ChromaDB collection
+LOAD_PAGE_SIZE = 5000
+
+
+def track_document(track: Dict[str, Any]) -> str:
+    # Text embedded for a track in every vector store.
+    return f"{track.get('genre', '')} music with {track.get('mood', '')} mood: {track.get('title', '')}"
+
+
+def collection_pages(collection, page_size: int = LOAD_PAGE_SIZE) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+    # (ids, metadatas) pages over a whole collection, without documents or embeddings.
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        results = collection.get(offset=offset, limit=page_size, include=["metadatas"])
+        yield results.get('ids') or [], results.get('metadatas') or []
+
+
+class RecentTracksIndex:
+    # Ring buffer of the most recently added tracks, oldest first. Writers publish a new
+    # tuple (at most `size` long) under the lock; readers take the current one without it.
+
+    def __init__(self, size: int = RECENT_INDEX_SIZE):
+        self.size = max(1, size)
+        self._tracks = ()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def add(self, track: Dict[str, Any]):
+        with self._lock:
+            self._tracks = (self._tracks + (track,))[-self.size:]
+
+    def recent_tracks(self, n: int) -> List[Dict[str, Any]]:
+        tracks = self._tracks
+        return list(tracks[-n:]) if n > 0 else []
+
+    def recent_genres(self, n: int) -> List[str]:
+        return [t['genre'] for t in self.recent_tracks(n) if 'genre' in t]
+
+    def rebuild(self, tracks: List[Dict[str, Any]]):
+        # Replace the contents with `tracks`, ordered by timestamp; only the newest `size` are kept.
+        ordered = sorted(tracks, key=lambda t: str(t.get('timestamp', '')))
+        with self._lock:
+            self._tracks = tuple(ordered[-self.size:])
+
+    def load_from_collection(self, collection) -> int:
+        # Rebuild from a ChromaDB collection in one paged pass. get() promises no row order,
+        # so the newest `size` by timestamp are picked with a bounded heap; on equal
+        # timestamps the record read later counts as newer.
+        tracks = (m for _, metadatas in collection_pages(collection) for m in metadatas)
+        newest = heapq.nlargest(self.size, enumerate(tracks), key=lambda e: (str(e[1].get('timestamp', '')), e[0]))
+        with self._lock:
+            self._tracks = tuple(track for _, track in reversed(newest))
+        return len(self._tracks)
+
+    def load_from_index(self, index: "TrackMetadataIndex") -> int:
+        # Rebuild from an already loaded metadata index's timestamp order, without another
+        # read of the store.
+        tracks = index.query(limit=self.size)["tracks"]
+        with self._lock:
+            self._tracks = tuple(reversed(tracks))
+        return len(self._tracks)
+
+
+class TrackMetadataIndex:
+    # Inverted indexes on FIELDS plus a timestamp-sorted index, so filtered and
+    # time-bounded track lookups touch only matching entries.
+
+    FIELDS = ("genre", "mood", "generation_method")
+
+    def __init__(self, store: Optional[Any] = None):
+        # Rows are appended to `store` (any list-like, e.g. a TrackStore); a plain list by default
+        self._tracks = store if store is not None else []
+        self._postings = {field: {} for field in self.FIELDS}
+        self._times = []
+        self._time_rows = []
+        # Row -> timestamp key, for range checks on rows taken from a posting list
+        self._row_times = []
+        # Rows taken out again by discard(); they keep their place in the store
+        self._discarded = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks) - len(self._discarded)
+
+    def add(self, track: Dict[str, Any]) -> int:
+        # Returns the track's row, for discard().
+        with self._lock:
+            row = len(self._tracks)
+            self._tracks.append(track)
+            for field in self.FIELDS:
+                value = track.get(field)
+                if value is not None:
+                    self._postings[field].setdefault(value, []).append(row)
+
+            # Tracks mostly arrive in time order, so this is usually an append
+            timestamp = str(track.get('timestamp', ''))
+            at = bisect.bisect_right(self._times, timestamp)
+            self._times.insert(at, timestamp)
+            self._time_rows.insert(at, row)
+            self._row_times.append(timestamp)
+            return row
+
+    def discard(self, row: int):
+        # Unindex a row, e.g. a track whose write to the store was given up on.
+        with self._lock:
+            if row in self._discarded:
+                return
+            self._discarded.add(row)
+            track = self._tracks[row]
+            for field in self.FIELDS:
+                values = self._postings[field]
+                posting = values.get(track.get(field))
+                if posting is None:
+                    continue
+                at = bisect.bisect_left(posting, row)
+                if at < len(posting) and posting[at] == row:
+                    del posting[at]
+                    if not posting:
+                        del values[track.get(field)]
+
+            timestamp = self._row_times[row]
+            at = bisect.bisect_left(self._times, timestamp)
+            while self._time_rows[at] != row:
+                at += 1
+            del self._times[at]
+            del self._time_rows[at]
+
+    def add_many(self, tracks: List[Dict[str, Any]]):
+        for track in tracks:
+            self.add(track)
+
+    def load_from_collection(self, collection) -> int:
+        # One paged pass over the collection's metadata at startup.
+        for _, metadatas in collection_pages(collection):
+            self.add_many(metadatas)
+        return len(self)
+
+    def query(self, filters: Optional[Dict[str, Any]] = None, time_range: Optional[Tuple[Any, Any]] = None,
+              limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        # Newest-first tracks matching every filter (equality on FIELDS) and the inclusive
+        # [start, end] timestamp range; either bound may be None. Returns a page plus the total.
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        unknown = set(filters) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported track filter(s): {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            # Posting lists hold rows in ascending order, so membership is a binary search
+            postings = sorted((self._postings[f].get(v, []) for f, v in filters.items()), key=len)
+            start = end = None
+            lo, hi = 0, len(self._time_rows)
+            if time_range:
+                start, end = (timestamp_key(bound) for bound in time_range)
+                lo = bisect.bisect_left(self._times, start) if start is not None else lo
+                hi = bisect.bisect_right(self._times, end) if end is not None else hi
+            span = max(0, hi - lo)
+            stop = offset + max(0, limit)
+
+            if not postings:
+                # The time slice is the answer; _time_rows is oldest first, so the page is reversed
+                total = span
+                page = self._time_rows[max(lo, hi - stop):max(lo, hi - offset)][::-1]
+            elif span <= len(postings[0]):
+                # Drive from the time slice: one newest-first pass counts and pages
+                rows = [r for r in reversed(self._time_rows[lo:hi]) if self._matches(r, postings)]
+                total, page = len(rows), rows[offset:stop]
+            else:
+                # Count from the posting lists, then page by walking the time order newest
+                # first until the page fills, or by sorting the matches when that is cheaper
+                driver, others = postings[0], postings[1:]
+                if others:
+                    member = set(driver).intersection(*others)
+                    matches, contains = sorted(member), member.__contains__
+                else:
+                    matches, contains = driver, lambda row: self._matches(row, postings)
+                if time_range:
+                    row_times = self._row_times
+                    matches = [r for r in matches if (start is None or row_times[r] >= start)
+                               and (end is None or row_times[r] <= end)]
+                total = len(matches)
+                # Sorting costs about two walk steps per match; the walk visits ~span/total rows per hit
+                if 2 * total < stop * span / max(1, total):
+                    # Reversed first so equal timestamps come out newest row first, as in the walk
+                    page = sorted(reversed(matches), key=self._row_times.__getitem__, reverse=True)[offset:stop]
+                else:
+                    page = self._walk(lo, hi, contains, stop)[offset:]
+
+            return {"tracks": [dict(self._tracks[r]) for r in page], "total": total}
+
+    @staticmethod
+    def _matches(row: int, postings: List[List[int]]) -> bool:
+        for posting in postings:
+            at = bisect.bisect_left(posting, row)
+            if at == len(posting) or posting[at] != row:
+                return False
+        return True
+
+    def _walk(self, lo: int, hi: int, contains: Callable[[int], bool], stop: int) -> List[int]:
+        # The first `stop` rows in _time_rows[lo:hi] that pass `contains`, newest first.
+        rows = []
+        time_rows = self._time_rows
+        for at in range(hi - 1, lo - 1, -1):
+            if len(rows) >= stop:
+                break
+            row = time_rows[at]
+            if contains(row):
+                rows.append(row)
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracks": len(self._tracks) - len(self._discarded),
+                "distinct": {field: len(values) for field, values in self._postings.items()}
+            }
+
+
+def timestamp_key(bound: Any) -> Optional[str]:
+    # Timestamps are stored as ISO strings, which sort chronologically.
+    if bound is None:
+        return None
+    return bound.isoformat() if isinstance(bound, datetime) else str(bound)
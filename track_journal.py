@@ -0,0 +1,237 @@
+# Append-only persistence for tracks: each addition is one JSON line in the
+# current journal segment, fsynced in batches (group commit). A background
+# compaction writes the full state to a snapshot and starts a new segment, so
+# startup reads the snapshot and replays only the segments written after it.
+#
+# Layout: snapshot.json holds {"generation": G, "state": {...}} and covers every
+# segment below G; journal.<n>.jsonl segments with n >= G are replayed in order.
+
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import threading
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import JOURNAL_COMPACT_AFTER, JOURNAL_FSYNC_BATCH, JOURNAL_FSYNC_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r'^journal\.(\d+)\.jsonl$')
+
+
+def _json_default(value: Any) -> Any:
+    # Snapshot state may hold lazy views (e.g. TrackStore rows); serialize them as plain JSON.
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Sequence):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class TrackJournal:
+    # `snapshot_state` returns the state to persist; it is called under the journal lock,
+    # so appends made through append(..., apply=...) are either in it or after it.
+
+    SNAPSHOT = "snapshot.json"
+
+    def __init__(self, directory: str, snapshot_state: Callable[[], Dict[str, Any]],
+                 fsync_batch: int = JOURNAL_FSYNC_BATCH, fsync_interval: float = JOURNAL_FSYNC_INTERVAL,
+                 compact_after: int = JOURNAL_COMPACT_AFTER, name: str = "track-journal"):
+        self.directory = directory
+        self.snapshot_state = snapshot_state
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.name = name
+
+        self.generation = 0
+        self._file = None
+        self._unsynced = 0
+        self._since_compact = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.thread = None
+
+        self.appended = 0
+        self.replayed = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.last_compact_ms = 0.0
+        self.load_ms = 0.0
+
+    def _segment_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"journal.{generation}.jsonl")
+
+    def _segments(self) -> List[int]:
+        return sorted(int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if m)
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        # Returns (snapshot state or None, records appended since it) and opens the journal for writing.
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+
+        state = None
+        snapshot_path = os.path.join(self.directory, self.SNAPSHOT)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            state = snapshot['state']
+            self.generation = snapshot['generation']
+
+        records = []
+        for generation in self._segments():
+            if generation < self.generation:
+                # Left behind by a compaction interrupted after its snapshot was written
+                os.remove(self._segment_path(generation))
+                continue
+            records.extend(self._read_segment(generation))
+            self.generation = generation
+
+        self._file = open(self._segment_path(self.generation), 'a', encoding='utf-8')
+        self._since_compact = len(records)
+        self.replayed = len(records)
+        self.load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Track journal loaded: snapshot={'yes' if state is not None else 'no'}, "
+                    f"{len(records)} record(s) replayed in {self.load_ms:.1f}ms")
+        return state, records
+
+    def _read_segment(self, generation: int) -> List[Dict[str, Any]]:
+        path = self._segment_path(generation)
+        with open(path, 'rb') as f:
+            data = f.read()
+        records = []
+        # End of the last intact record; anything after it is a torn write from a crash
+        good_end = position = 0
+        for number, line in enumerate(data.splitlines(keepends=True), 1):
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping unreadable journal line {number} in segment {generation}")
+                continue
+            good_end = position
+        terminated = good_end == 0 or data[good_end - 1:good_end] == b'\n'
+        if data[good_end:].strip() or not terminated:
+            self._repair_tail(path, good_end, terminated)
+        return records
+
+    def _repair_tail(self, path: str, good_end: int, terminated: bool):
+        # Cut the segment back to its last intact record, so the next append starts on a fresh line.
+        logger.warning(f"Truncating torn journal tail in {path} at byte {good_end}")
+        with open(path, 'r+b') as f:
+            f.truncate(good_end)
+            f.seek(good_end)
+            if not terminated:
+                f.write(b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def append(self, records: List[Dict[str, Any]], apply: Optional[Callable[[], None]] = None):
+        # Write records to the journal, then run `apply` (the in-memory update) under the same lock.
+        lines = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+        with self._lock:
+            self._file.write(lines)
+            if apply:
+                apply()
+            self.appended += len(records)
+            self._unsynced += len(records)
+            self._since_compact += len(records)
+            if self._unsynced >= self.fsync_batch:
+                try:
+                    self._sync_locked()
+                except OSError as e:
+                    # Records are written and applied; the next sync retries durability
+                    logger.error(f"Journal fsync failed: {e}")
+            compact = self.compact_after > 0 and self._since_compact >= self.compact_after
+        if compact:
+            self._wake.set()
+
+    def _sync_locked(self):
+        if not self._unsynced:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self.fsyncs += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                with self._lock:
+                    self._sync_locked()
+                    compact = self.compact_after > 0 and self._since_compact >= self.compact_after
+                if compact:
+                    self.compact()
+            except OSError as e:
+                logger.error(f"Track journal maintenance failed: {e}")
+
+    def compact(self):
+        # Start a new segment and snapshot the state as of that switch; older segments are then dropped.
+        with self._compact_lock:
+            started = time.perf_counter()
+            with self._lock:
+                self._sync_locked()
+                state = self.snapshot_state()
+                self._file.close()
+                self.generation += 1
+                generation = self.generation
+                self._file = open(self._segment_path(generation), 'a', encoding='utf-8')
+                self._since_compact = 0
+
+            # The slow O(n) part runs outside the lock, so appends continue meanwhile
+            snapshot_path = os.path.join(self.directory, self.SNAPSHOT)
+            temp_path = snapshot_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"generation": generation, "state": state}, f, ensure_ascii=False, default=_json_default)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, snapshot_path)
+
+            for old in self._segments():
+                if old < generation:
+                    os.remove(self._segment_path(old))
+
+            self.compactions += 1
+            self.last_compact_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"Track journal compacted into generation {generation} in {self.last_compact_ms:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "unsynced": self._unsynced,
+            "since_compaction": self._since_compact,
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+            "last_compact_ms": round(self.last_compact_ms, 2),
+            "load_ms": round(self.load_ms, 2)
+        }
@@ -0,0 +1,228 @@
+# Cold storage for track history. Tracks rolled out of memory are written as
+# immutable, gzip-compressed columnar JSON segment files, so filters run over
+# plain value lists and only matching rows are built; manifest.json keeps one summary
+# per segment (row count, min/max timestamp, per-value counts of the indexed
+# fields), so queries skip segments that can't match and count fully covered
+# ones without opening them. Only the summaries stay in memory.
+#
+# Layout: segment.<n>.json.gz files, n increasing in roll order (oldest first),
+# plus manifest.json = {"archived": <tracks rolled so far>, "next_number": n,
+# "segments": [summary, ...]}.
+
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from track_index import TrackMetadataIndex, timestamp_key
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = TrackMetadataIndex.FIELDS
+# One column each in a segment file; any other track keys go in a per-row "extra" column
+COLUMNS = ("title", "genre", "mood", "timestamp", "generation_method")
+
+
+def summarize(tracks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    timestamps = [str(t.get('timestamp', '')) for t in tracks]
+    summary = {
+        "count": len(tracks),
+        "min_ts": min(timestamps),
+        "max_ts": max(timestamps)
+    }
+    for field in SUMMARY_FIELDS:
+        counts = {}
+        for track in tracks:
+            value = track.get(field)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+        summary[field] = counts
+    return summary
+
+
+class TrackSegmentStore:
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments = []
+        # Tracks rolled into segments since the store was created
+        self.archived = 0
+        # Segment numbers are never reused, even after clear()
+        self.next_number = 0
+        self._lock = threading.Lock()
+
+        self.segments_read = 0
+        self.segments_skipped = 0
+        self.segments_counted = 0
+        self.last_write_ms = 0.0
+        # (file name, columns) of the segment track() read last
+        self._decoded = (None, None)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def load(self) -> "TrackSegmentStore":
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.MANIFEST)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.segments = manifest['segments']
+            self.archived = manifest['archived']
+            self.next_number = manifest.get('next_number', self.segments[-1]['number'] + 1 if self.segments else 0)
+        logger.info(f"Track segments loaded: {len(self.segments)} segment(s), {self.archived} archived track(s)")
+        return self
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def write(self, tracks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Write one segment, then publish it in the manifest; both replaced atomically.
+        if not tracks:
+            raise ValueError("Cannot write an empty track segment")
+        started = time.perf_counter()
+        with self._lock:
+            number = self.next_number
+            name = f"segment.{number}.json.gz"
+            columns = {c: [t.get(c) for t in tracks] for c in COLUMNS}
+            columns["extra"] = [{k: v for k, v in t.items() if k not in COLUMNS} or None for t in tracks]
+            temp_path = self._path(name + ".tmp")
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                json.dump(columns, f, ensure_ascii=False)
+            with open(temp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, self._path(name))
+
+            summary = {"number": number, "file": name, **summarize(tracks)}
+            self._publish(summary)
+        self.last_write_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Rolled {len(tracks)} track(s) into {name} in {self.last_write_ms:.1f}ms")
+        return summary
+
+    def write_raw(self, summary: Dict[str, Any], data: bytes) -> Dict[str, Any]:
+        # Add a segment file copied verbatim (e.g. from a snapshot) under the next number.
+        with self._lock:
+            number = self.next_number
+            name = f"segment.{number}.json.gz"
+            temp_path = self._path(name + ".tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self._path(name))
+            summary = {**summary, "number": number, "file": name}
+            self._publish(summary)
+        return summary
+
+    def _publish(self, summary: Dict[str, Any]):
+        # Caller holds self._lock and has written the segment file.
+        segments = self.segments + [summary]
+        archived = self.archived + summary['count']
+        self._write_manifest(segments, archived, summary['number'] + 1)
+        self.segments, self.archived, self.next_number = segments, archived, summary['number'] + 1
+
+    def clear(self):
+        # Drop every segment, e.g. before a snapshot replaces the track history.
+        with self._lock:
+            self._write_manifest([], 0, self.next_number)
+            for summary in self.segments:
+                try:
+                    os.remove(self._path(summary['file']))
+                except FileNotFoundError:
+                    pass
+            self.segments, self.archived = [], 0
+
+    def _write_manifest(self, segments: List[Dict[str, Any]], archived: int, next_number: int):
+        path = self._path(self.MANIFEST)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"archived": archived, "next_number": next_number, "segments": segments}, f,
+                      ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _columns(self, summary: Dict[str, Any]) -> Dict[str, List[Any]]:
+        with gzip.open(self._path(summary['file']), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def raw(self, summary: Dict[str, Any]) -> bytes:
+        with open(self._path(summary['file']), 'rb') as f:
+            return f.read()
+
+    @classmethod
+    def decode(cls, data: bytes) -> List[Dict[str, Any]]:
+        # Rows of a segment file's contents, as read() returns them.
+        columns = json.loads(gzip.decompress(data))
+        return [cls._row(columns, i) for i in range(len(columns['timestamp']))]
+
+    @staticmethod
+    def _row(columns: Dict[str, List[Any]], i: int) -> Dict[str, Any]:
+        # Absent and None core fields are both stored as null, and both come back absent.
+        row = {c: columns[c][i] for c in COLUMNS if columns[c][i] is not None}
+        row.update(columns["extra"][i] or {})
+        return row
+
+    def read(self, summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+        columns = self._columns(summary)
+        return [self._row(columns, i) for i in range(summary['count'])]
+
+    def track(self, summary: Dict[str, Any], i: int) -> Dict[str, Any]:
+        # One row, e.g. a similarity hit referenced by position. The segment read last stays
+        # decoded, so lookups in one segment (or a scan in roll order) decode it once.
+        name, columns = self._decoded
+        if name != summary['file']:
+            columns = self._columns(summary)
+            self._decoded = (summary['file'], columns)
+            self.segments_read += 1
+        return self._row(columns, i)
+
+    def query(self, filters: Dict[str, Any], time_range: Optional[Tuple[Any, Any]] = None,
+              limit: int = 50, offset: int = 0, segments: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        # Same contract as TrackMetadataIndex.query, newest segment first and newest first within
+        # each. `segments` pins the segment list, so a caller's view stays consistent with its hot tier.
+        start, end = (timestamp_key(bound) for bound in time_range) if time_range else (None, None)
+        tracks, total = [], 0
+        for summary in reversed(self.segments if segments is None else segments):
+            if ((start is not None and summary['max_ts'] < start) or (end is not None and summary['min_ts'] > end)
+                    or any(v not in summary[f] for f, v in filters.items())):
+                self.segments_skipped += 1
+                continue
+
+            covered = (start is None or summary['min_ts'] >= start) and (end is None or summary['max_ts'] <= end)
+            wanted = len(tracks) < limit and total + summary['count'] > offset
+            if covered and len(filters) <= 1 and not wanted:
+                # Paging hasn't reached this segment (or is already full): the summary has the count
+                ((field, value),) = filters.items() if filters else ((None, None),)
+                total += summary[field][value] if field else summary['count']
+                self.segments_counted += 1
+                continue
+
+            self.segments_read += 1
+            columns = self._columns(summary)
+            times = [str(t) if t is not None else '' for t in columns['timestamp']]
+            rows = range(summary['count'])
+            for field, value in filters.items():
+                column = columns[field]
+                rows = [i for i in rows if column[i] == value]
+            if not covered:
+                rows = [i for i in rows if (start is None or times[i] >= start) and (end is None or times[i] <= end)]
+            rows = sorted(rows, key=times.__getitem__, reverse=True)
+            skip = max(0, offset - total)
+            tracks.extend(self._row(columns, i) for i in rows[skip:skip + max(0, limit - len(tracks))])
+            total += len(rows)
+        return {"tracks": tracks, "total": total}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self.segments),
+            "archived_tracks": self.archived,
+            "segments_read": self.segments_read,
+            "segments_skipped": self.segments_skipped,
+            "segments_counted": self.segments_counted,
+            "last_write_ms": round(self.last_write_ms, 2)
+        }
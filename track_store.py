@@ -0,0 +1,220 @@
+# Columnar, append-only track storage. Genre, mood and generation_method are
+# interned to small integer codes, naive ISO timestamps are packed as int64
+# microseconds, and titles share one UTF-8 arena. Rows come back as read-only
+# mapping views, so callers that index tracks like dicts keep working.
+
+import logging
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_FIELDS = ("genre", "mood", "generation_method")
+# Row view key order, matching the dicts MusicAgent builds
+FIELD_ORDER = ("title", "genre", "mood", "timestamp", "generation_method")
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Timestamp column value for "absent or not packable"
+_NO_TIME = -(2 ** 63)
+_MISSING = object()
+
+
+def _pack_timestamp(value: Any) -> int:
+    # Only naive ISO strings that round-trip exactly are packed; anything else stays a string.
+    if not isinstance(value, str):
+        return _NO_TIME
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return _NO_TIME
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return _NO_TIME
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+class TrackRow(Mapping):
+    # Read-only view of one stored track.
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "TrackStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._store._field(self._row, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._store._field(self._row, key)
+        return default if value is _MISSING else value
+
+    def __iter__(self) -> Iterator[str]:
+        store, row = self._store, self._row
+        for key in FIELD_ORDER:
+            if store._field(row, key) is not _MISSING:
+                yield key
+        yield from store._extras.get(row, ())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"TrackRow({dict(self)!r})"
+
+
+class TrackStore(Sequence):
+
+    def __init__(self, tracks: Optional[List[Dict[str, Any]]] = None):
+        # Code 0 means "field absent"; values[code] is the interned string
+        self._values = {field: [None] for field in CATEGORICAL_FIELDS}
+        self._codes = {field: {} for field in CATEGORICAL_FIELDS}
+        self._columns = {field: array('H') for field in CATEGORICAL_FIELDS}
+        self._timestamps = array('q')
+        self._title_ends = array('Q')
+        self._titles = bytearray()
+        self._untitled = set()
+        # row -> fields outside the fixed columns (and timestamps that didn't pack)
+        self._extras = {}
+        self._lock = threading.Lock()
+        if tracks:
+            self.extend(tracks)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TrackRow(self, row) for row in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("track index out of range")
+        return TrackRow(self, index)
+
+    def __iter__(self) -> Iterator[TrackRow]:
+        for row in range(len(self)):
+            yield TrackRow(self, row)
+
+    def append(self, track: Dict[str, Any]):
+        with self._lock:
+            row = len(self._timestamps)
+            extras = {k: v for k, v in track.items() if k not in FIELD_ORDER}
+
+            for field in CATEGORICAL_FIELDS:
+                self._columns[field].append(self._intern(field, track.get(field)))
+
+            title = track.get('title', _MISSING)
+            if isinstance(title, str):
+                self._titles += title.encode('utf-8')
+            else:
+                self._untitled.add(row)
+                if title is not _MISSING:
+                    extras['title'] = title
+            self._title_ends.append(len(self._titles))
+
+            timestamp = track.get('timestamp', _MISSING)
+            packed = _pack_timestamp(timestamp)
+            if packed == _NO_TIME and timestamp is not _MISSING:
+                extras['timestamp'] = timestamp
+            # Appended last: len(self) counts only fully written rows
+            self._timestamps.append(packed)
+
+            if extras:
+                self._extras[row] = extras
+
+    def extend(self, tracks: List[Dict[str, Any]]):
+        for track in tracks:
+            self.append(track)
+
+    def _intern(self, field: str, value: Any) -> int:
+        if value is None:
+            return 0
+        if not isinstance(value, str):
+            value = str(value)
+        code = self._codes[field].get(value)
+        if code is None:
+            code = len(self._values[field])
+            if code > 0xFFFF and self._columns[field].typecode == 'H':
+                self._columns[field] = array('I', self._columns[field])
+            self._codes[field][value] = code
+            self._values[field].append(value)
+        return code
+
+    def _field(self, row: int, key: str) -> Any:
+        column = self._columns.get(key)
+        if column is not None:
+            code = column[row]
+            return self._values[key][code] if code else _MISSING
+        extras = self._extras.get(row)
+        if extras and key in extras:
+            return extras[key]
+        if key == 'title':
+            if row in self._untitled:
+                return _MISSING
+            start = self._title_ends[row - 1] if row else 0
+            return self._titles[start:self._title_ends[row]].decode('utf-8')
+        if key == 'timestamp':
+            packed = self._timestamps[row]
+            return (_EPOCH + packed * _MICROSECOND).isoformat() if packed != _NO_TIME else _MISSING
+        return _MISSING
+
+    def count(self, field: str, value: str) -> int:
+        # Rows whose categorical `field` equals `value`, counted on the code column.
+        code = self._codes[field].get(value)
+        return self._columns[field].count(code) if code else 0
+
+    def values(self, field: str) -> List[str]:
+        return self._values[field][1:]
+
+    def column(self, field: str) -> Iterator[Any]:
+        # Every row's value for a categorical field (None when absent), without building row views.
+        values = self._values[field]
+        return map(values.__getitem__, self._columns[field][:len(self)])
+
+    def prefix(self, length: Optional[int] = None) -> "TrackStorePrefix":
+        # The first `length` rows (default: all current rows) as a stable, copy-free sequence.
+        return TrackStorePrefix(self, len(self) if length is None else length)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self]
+
+    def stats(self) -> Dict[str, Any]:
+        column_bytes = sum(c.itemsize * len(c) for c in self._columns.values())
+        return {
+            "tracks": len(self),
+            "distinct": {field: len(values) - 1 for field, values in self._values.items()},
+            "title_bytes": len(self._titles),
+            "column_bytes": column_bytes + self._timestamps.itemsize * len(self._timestamps)
+                            + self._title_ends.itemsize * len(self._title_ends),
+            "rows_with_extras": len(self._extras)
+        }
+
+
+class TrackStorePrefix(Sequence):
+    # Rows are never modified after append, so a length-bounded view is a consistent snapshot.
+
+    __slots__ = ("_store", "_length")
+
+    def __init__(self, store: TrackStore, length: int):
+        self._store = store
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TrackRow(self._store, row) for row in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("track index out of range")
+        return TrackRow(self._store, index)
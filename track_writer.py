@@ -0,0 +1,187 @@
+# Write-behind buffer for track ingestion: records queue in memory and are
+# written to the vector store in batches, from a daemon thread, on a full
+# batch, on an explicit flush() and at interpreter exit. A failed batch is
+# retried with exponential backoff, holding later records back so writes stay
+# in order, and handed to `on_drop` once it has used up its attempts.
+
+import time
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (TRACK_WRITE_BATCH_SIZE, TRACK_WRITE_FLUSH_INTERVAL, TRACK_WRITE_MAX_ATTEMPTS,
+                    TRACK_WRITE_RETRY_DELAY)
+
+logger = logging.getLogger(__name__)
+
+
+class TrackWriteBuffer:
+    # `write` receives a list of at most `batch_size` queued records per call.
+
+    def __init__(self, write: Callable[[List[Any]], None], batch_size: int = TRACK_WRITE_BATCH_SIZE,
+                 flush_interval: float = TRACK_WRITE_FLUSH_INTERVAL, name: str = "track-writer",
+                 on_drop: Optional[Callable[[List[Any]], None]] = None,
+                 max_attempts: int = TRACK_WRITE_MAX_ATTEMPTS, retry_delay: float = TRACK_WRITE_RETRY_DELAY):
+        self.write = write
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.name = name
+        # Receives each batch given up on, e.g. to release what was reserved for it
+        self.on_drop = on_drop
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+
+        self._pending = []
+        # (batch, attempts so far) waiting to be retried, and when the flusher may retry it
+        self._failed = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        # Held for a whole flush, so flush() returns only after in-flight batches are written
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.thread = None
+
+        self.max_pending = 0
+        self.flushes = 0
+        self.written = 0
+        self.dropped = 0
+        self.retries = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        failed = self._failed
+        return len(self._pending) + (len(failed[0]) if failed else 0)
+
+    def start(self):
+        if self.flush_interval <= 0 or (self.thread and self.thread.is_alive()):
+            return
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        # Stop the flusher and write whatever is still queued, retrying a failed batch
+        # straight away until it is written or dropped.
+        self._stopped.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.flush()
+        while self._failed:
+            self.flush()
+
+    def add(self, records: List[Any]):
+        if not records:
+            return
+        with self._lock:
+            self._pending.extend(records)
+            depth = len(self._pending)
+            self.max_pending = max(self.max_pending, depth)
+
+        if depth >= self.batch_size:
+            if self.thread and self.thread.is_alive():
+                self._wake.set()
+            else:
+                self.flush()
+
+    def pending(self) -> List[Any]:
+        with self._lock:
+            failed = self._failed
+            return (list(failed[0]) if failed else []) + self._pending
+
+    def flush(self) -> int:
+        # Write everything queued so far in batch_size chunks, a batch awaiting retry first
+        # (without waiting out its backoff); returns the number written. Stops at a batch
+        # that fails with attempts left, leaving it and everything after it queued.
+        with self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+                batches = [self._failed] if self._failed else []
+                self._failed = None
+            batches += [(records[i:i + self.batch_size], 0) for i in range(0, len(records), self.batch_size)]
+
+            written = 0
+            for n, (batch, attempts) in enumerate(batches):
+                started = time.perf_counter()
+                try:
+                    self.write(batch)
+                    written += len(batch)
+                except Exception as e:
+                    self.flush_errors += 1
+                    attempts += 1
+                    if attempts < self.max_attempts:
+                        self._requeue(batch, attempts, [r for b, _ in batches[n + 1:] for r in b], e)
+                        break
+                    self._drop(batch, e)
+                finally:
+                    self._record_flush((time.perf_counter() - started) * 1000)
+
+            self.written += written
+            return written
+
+    def discard(self) -> int:
+        # Drop everything still queued, without on_drop, e.g. when the store it was bound for
+        # has been replaced; returns the number of records dropped.
+        with self._flush_lock, self._lock:
+            count = len(self)
+            self._pending, self._failed = [], None
+            return count
+
+    def _requeue(self, batch: List[Any], attempts: int, later: List[Any], error: Exception):
+        # Caller holds self._flush_lock.
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        with self._lock:
+            self._failed = (batch, attempts)
+            self._pending[:0] = later
+        self._retry_at = time.monotonic() + delay
+        self.retries += 1
+        logger.warning(f"Failed to write {len(batch)} buffered tracks (attempt {attempts}/{self.max_attempts}), "
+                       f"retrying in {delay:.1f}s: {error}")
+
+    def _drop(self, batch: List[Any], error: Exception):
+        self.dropped += len(batch)
+        logger.error(f"Dropping {len(batch)} buffered tracks after {self.max_attempts} attempt(s): {error}")
+        if self.on_drop:
+            try:
+                self.on_drop(batch)
+            except Exception as e:
+                logger.error(f"Failed to release {len(batch)} dropped tracks: {e}")
+
+    def _record_flush(self, elapsed_ms: float):
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+
+    def _run(self):
+        while not self._stopped.is_set():
+            backoff = self._retry_at - time.monotonic() if self._failed else 0.0
+            self._wake.wait(max(self.flush_interval, backoff))
+            self._wake.clear()
+            if self._failed and time.monotonic() < self._retry_at:
+                continue
+            if self._pending or self._failed:
+                self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "flushes": self.flushes,
+            "written": self.written,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2)
+        }
@@ -0,0 +1,356 @@
+# In-process vector search for deployments without ChromaDB: track embeddings
+# live in one contiguous NumPy matrix and queries are a single matrix-vector
+# product followed by a partial sort.
+
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from array import array
+from collections import abc
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logging.warning("NumPy not available, fallback similarity search is disabled")
+
+from config import (
+    ANN_ENABLED, ANN_MIN_VECTORS, FALLBACK_EMBEDDER, FALLBACK_EMBEDDING_DIM,
+    FALLBACK_VECTOR_DTYPE, OLLAMA_BASE_URL, OLLAMA_EMBED_MODEL
+)
+
+if NUMPY_AVAILABLE:
+    from ann_index import IVFIndex, save_array
+
+logger = logging.getLogger(__name__)
+
+
+def empty_result() -> Dict[str, List[List[Any]]]:
+    return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+
+class HashingEmbedder:
+    # Deterministic bag-of-words embedding via feature hashing; no model, no network.
+
+    def __init__(self, dim: int = FALLBACK_EMBEDDING_DIM):
+        self.dim = dim
+        self.MODEL_NAME = f"hashing-{dim}"
+
+    def __call__(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                digest = hashlib.md5(word.encode('utf-8')).digest()
+                index = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, index] += 1.0 if digest[4] & 1 else -1.0
+        return vectors
+
+
+class OllamaEmbedder:
+    # Embeddings from Ollama's /api/embed over the shared pooled transport.
+
+    def __init__(self, model: str = OLLAMA_EMBED_MODEL, base_url: str = OLLAMA_BASE_URL):
+        from ollama_client import get_transport
+        self.transport = get_transport()
+        self.base_url = base_url.rstrip('/')
+        self.MODEL_NAME = model
+
+    def __call__(self, texts: List[str]) -> "np.ndarray":
+        response = self.transport.post(f"{self.base_url}/api/embed", {"model": self.MODEL_NAME, "input": texts})
+        response.raise_for_status()
+        return np.asarray(response.json()['embeddings'], dtype=np.float32)
+
+
+class ResolvedColumn(abc.Sequence):
+    # Documents (field 0) or metadatas (field 1) of a reference-backed index, looked up on access.
+
+    def __init__(self, refs: Sequence[int], size: int, resolve: Callable[[int], Tuple[str, Mapping]], field: int):
+        self._refs = refs
+        self._size = size
+        self._resolve = resolve
+        self._field = field
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("vector index row out of range")
+        return self._resolve(self._refs[index])[self._field]
+
+
+def create_embedder(kind: str = FALLBACK_EMBEDDER):
+    if kind == "ollama":
+        return OllamaEmbedder()
+    return HashingEmbedder()
+
+
+class VectorIndex:
+    # Unit-normalised rows in a preallocated matrix that doubles when full, so appends
+    # are amortised O(1) and cosine similarity is a plain dot product.
+
+    # Rows converted to float32 at a time when scoring float16 storage
+    SCORE_BLOCK = 4096
+    # Re-cluster the ANN index once the catalog outgrows its training set this many times
+    ANN_RETRAIN_FACTOR = 4
+
+    def __init__(self, dim: Optional[int] = None, dtype: str = FALLBACK_VECTOR_DTYPE,
+                 initial_capacity: int = 1024, ann: Optional["IVFIndex"] = None,
+                 ann_min_vectors: int = ANN_MIN_VECTORS,
+                 resolve: Optional[Callable[[int], Tuple[str, Mapping[str, Any]]]] = None):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = max(1, initial_capacity)
+        # Approximate search takes over from the exact scan at ann_min_vectors
+        self.ann = ann if ann is not None else (IVFIndex() if ANN_ENABLED else None)
+        self.ann_min_vectors = ann_min_vectors
+
+        self._matrix = None
+        self._size = 0
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        # With `resolve`, a row keeps an integer reference (e.g. the track's position in the
+        # caller's store) instead of its document and metadata; resolve(ref) returns both
+        self.resolve = resolve
+        self.refs = array('q')
+        # With `storage`, the matrix lives in an unlinked scratch file there, memory-mapped and grown in place
+        self.storage = None
+        self._scratch = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: List[str], vectors: Sequence[Sequence[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]], refs: Optional[Sequence[int]] = None):
+        # A reference-backed index stores `refs` and drops `documents` and `metadatas`.
+        if not len(ids):
+            return
+        vectors = self._normalise(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            if self._matrix is None:
+                self.dim = self.dim or vectors.shape[1]
+                self._matrix = self._allocate(max(self.initial_capacity, len(vectors)))
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, index expects {self.dim}")
+
+            first_row = self._size
+            self._reserve(self._size + len(vectors))
+            self._matrix[self._size:self._size + len(vectors)] = vectors
+            self._size += len(vectors)
+            self.ids.extend(ids)
+            if self.resolve is not None:
+                self.refs.extend(refs)
+            else:
+                self.documents.extend(documents)
+                self.metadatas.extend(metadatas)
+            self._update_ann(first_row, vectors)
+
+    def _update_ann(self, first_row: int, vectors: "np.ndarray"):
+        if self.ann is None or self._size < self.ann_min_vectors:
+            return
+        if not self.ann.trained or self._size >= self.ann.trained_on * self.ANN_RETRAIN_FACTOR:
+            started = time.perf_counter()
+            self.ann.train(self._matrix[:self._size])
+            self.ann.add(0, self._matrix[:self._size])
+            logger.info(f"ANN index trained on {self._size} vectors in {time.perf_counter() - started:.1f}s")
+        else:
+            self.ann.add(first_row, vectors)
+
+    def _reserve(self, needed: int):
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        capacity = max(1, capacity)
+        while capacity < needed:
+            capacity *= 2
+        self._matrix = self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> "np.ndarray":
+        # A matrix of `capacity` rows holding the current ones. The scratch file is only ever
+        # extended, so rows already in it stay where they are and older maps stay valid.
+        if self.storage is None:
+            matrix = np.empty((capacity, self.dim), dtype=self.dtype)
+        else:
+            in_place = self._scratch is not None
+            if not in_place:
+                self._scratch = tempfile.TemporaryFile(prefix="vectors.", suffix=".tmp", dir=self.storage)
+            self._scratch.truncate(capacity * self.dim * self.dtype.itemsize)
+            matrix = np.memmap(self._scratch, dtype=self.dtype, mode='r+', shape=(capacity, self.dim))
+            if in_place:
+                return matrix
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+        return matrix
+
+    def use_storage(self, directory: str):
+        # Keep the matrix out of the heap from the next time it grows: the kernel pages it
+        # to a scratch file under `directory` instead. The file is removed when the index goes.
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.storage = directory
+
+    def query(self, vector: Sequence[float], n_results: int = 5, exact: bool = False) -> Dict[str, List[List[Any]]]:
+        # Top-k by cosine similarity, shaped like a ChromaDB query result (distance = 1 - cosine).
+        # Uses the ANN index once it is trained, unless `exact` is set.
+        query = self._normalise(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+
+        with self._lock:
+            size = self._size
+            if not size or n_results <= 0:
+                return empty_result()
+
+            if not exact and self.ann is not None and self.ann.trained:
+                top, top_scores = self.ann.search(self._matrix, query, n_results)
+            else:
+                scores = self._scores(size, query)
+                k = min(n_results, size)
+                top = np.argpartition(-scores, k - 1)[:k] if k < size else np.arange(size)
+                top = top[np.argsort(-scores[top])]
+                top_scores = scores[top]
+
+            ids = [self.ids[i] for i in top]
+            if self.resolve is not None:
+                refs = [self.refs[i] for i in top]
+            else:
+                documents = [self.documents[i] for i in top]
+                metadatas = [self.metadatas[i] for i in top]
+        if self.resolve is not None:
+            # Outside the lock: a lookup may have to read the track from disk
+            entries = [self.resolve(ref) for ref in refs]
+            documents = [document for document, _ in entries]
+            metadatas = [metadata for _, metadata in entries]
+
+        return {
+            'ids': [ids],
+            'documents': [documents],
+            'metadatas': [metadatas],
+            'distances': [[float(1.0 - score) for score in top_scores]]
+        }
+
+    def _scores(self, size: int, query: "np.ndarray") -> "np.ndarray":
+        if self.dtype == np.float32:
+            return self._matrix[:size].dot(query)
+        # float16 has no BLAS path; upcast block by block so memory stays at half size
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, self.SCORE_BLOCK):
+            end = min(start + self.SCORE_BLOCK, size)
+            scores[start:end] = self._matrix[start:end].astype(np.float32).dot(query)
+        return scores
+
+    @staticmethod
+    def _normalise(vectors: "np.ndarray") -> "np.ndarray":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def save(self, directory: str, resolved: bool = False):
+        # vectors.npy plus tracks.json (and ann_*.npy when trained); load() can memory-map them.
+        # Each file is replaced atomically, since the matrix may be a memory map of the old one.
+        # A reference-backed index saves its refs, or with `resolved` the documents and metadatas
+        # they point at, for references that won't outlive the process.
+        os.makedirs(directory, exist_ok=True)
+        size, matrix, ids, documents, metadatas = self.export()
+        matrix = matrix[:size] if matrix is not None else np.empty((0, self.dim or 0), self.dtype)
+        save_array(os.path.join(directory, "vectors.npy"), matrix)
+        if self.resolve is not None and not resolved:
+            tracks = {"ids": list(ids[:size]), "refs": self.refs[:size].tolist()}
+        else:
+            # The lists may be lazy sequences, e.g. records mapped from a knowledge base snapshot
+            tracks = {"ids": list(ids[:size]), "documents": list(documents[:size]),
+                      "metadatas": [dict(m) for m in metadatas[:size]]}
+        path = os.path.join(directory, "tracks.json")
+        with open(path + ".tmp", 'w') as f:
+            json.dump(tracks, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            if self.ann is not None and self.ann.trained:
+                self.ann.save(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, ids: Optional[Sequence[str]] = None,
+             resolve: Optional[Callable[[int], Tuple[str, Mapping[str, Any]]]] = None) -> Optional["VectorIndex"]:
+        # With mmap the matrix stays on disk and pages in on demand; the first
+        # append that outgrows it copies it into memory. A saved reference-backed
+        # index needs `resolve`; its ids are appended to `ids` when given.
+        path = os.path.join(directory, "vectors.npy")
+        if not os.path.exists(path):
+            return None
+        matrix = np.load(path, mmap_mode='r' if mmap else None)
+        with open(os.path.join(directory, "tracks.json")) as f:
+            tracks = json.load(f)
+        columns = [tracks['ids']] + [tracks[k] for k in ("refs", "documents", "metadatas") if k in tracks]
+        if any(len(column) != len(matrix) for column in columns):
+            raise ValueError(f"{directory} has {len(matrix)} vectors but {len(tracks['ids'])} tracks")
+        if ids is not None:
+            ids.extend(tracks['ids'])
+            tracks['ids'] = ids
+
+        ann = IVFIndex.load(directory, mmap) if ANN_ENABLED else None
+        if "refs" in tracks:
+            if resolve is None:
+                raise ValueError(f"{directory} holds track references; loading it needs a resolver")
+            return cls.from_refs(matrix, tracks['ids'], array('q', tracks['refs']), resolve, ann=ann)
+        return cls.from_arrays(matrix, tracks['ids'], tracks['documents'], tracks['metadatas'], ann=ann)
+
+    @classmethod
+    def from_arrays(cls, matrix: Optional["np.ndarray"], ids: Sequence[str], documents: Sequence[str],
+                    metadatas: Sequence[Dict[str, Any]], ann: Optional["IVFIndex"] = None) -> "VectorIndex":
+        # Wrap already normalised rows without copying them; ids/documents/metadatas
+        # can be any sequences that support append and extend.
+        index = cls(dim=matrix.shape[1] or None, dtype=matrix.dtype.name, ann=ann) if matrix is not None else cls()
+        if matrix is not None and len(matrix):
+            index._matrix = matrix
+            index._size = len(matrix)
+        index.ids = ids
+        index.documents = documents
+        index.metadatas = metadatas
+        return index
+
+    @classmethod
+    def from_refs(cls, matrix: Optional["np.ndarray"], ids: Sequence[str], refs: "array",
+                  resolve: Callable[[int], Tuple[str, Mapping[str, Any]]],
+                  ann: Optional["IVFIndex"] = None) -> "VectorIndex":
+        # As from_arrays, for a reference-backed index; `refs` is an int64 array.
+        index = cls.from_arrays(matrix, ids, [], [], ann=ann)
+        index.resolve = resolve
+        index.refs = refs
+        return index
+
+    def export(self) -> Tuple[int, Optional["np.ndarray"], Sequence[str], Sequence[str], Sequence[Dict[str, Any]]]:
+        # (size, matrix, ids, documents, metadatas) as of now. Adds only write rows past
+        # `size` (or into a new matrix), so the first `size` entries stay valid unlocked.
+        # A reference-backed index resolves its documents and metadatas as they are read.
+        with self._lock:
+            if self.resolve is not None:
+                return (self._size, self._matrix, self.ids, ResolvedColumn(self.refs, self._size, self.resolve, 0),
+                        ResolvedColumn(self.refs, self._size, self.resolve, 1))
+            return self._size, self._matrix, self.ids, self.documents, self.metadatas
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self._size,
+            "capacity": len(self._matrix) if self._matrix is not None else 0,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "bytes": int(self._matrix.nbytes) if self._matrix is not None else 0,
+            "memory_mapped": isinstance(self._matrix, np.memmap),
+            "scratch_file": self._scratch is not None,
+            "track_refs": self.resolve is not None,
+            "ann": self.ann.stats() if self.ann is not None else None
+        }
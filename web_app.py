@@ -1,11 +1,15 @@
 # Web interface for Music Generator Company.
 
+import json
 import logging
-from flask import Flask, render_template, request, jsonify
-from datetime import datetime
+import math
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from datetime import datetime, timedelta
 
 try:
-    from knowledge import KnowledgeBase
+    from knowledge import CHROMADB_AVAILABLE, KnowledgeBase
+    if not CHROMADB_AVAILABLE:
+        raise ImportError("chromadb is not installed")
 except ImportError:
     from knowledge_simple import KnowledgeBase
 
@@ -30,6 +34,18 @@ twitter = TwitterService()
 scheduler = Scheduler()
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route('/')
 def index():
     # Flask route
@@ -39,7 +55,18 @@ def index():
 @app.route('/api/generate', methods=['POST'])
 def generate_music():
     # Flask route
+    # Optional {"count": n} generates n tracks (at most 20) with their LLM calls in parallel
+    try:
+        count = int((request.get_json(silent=True) or {}).get('count', 1))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "count must be an integer"}), 400
+    if count < 1:
+        return jsonify({"success": False, "error": "count must be at least 1"}), 400
+    count = min(count, 20)
+    
     try:
+        if count > 1:
+            return jsonify({"success": True, "tracks": company.music_agent.generate_tracks(count)})
         track = company.music_agent.generate_track()
         return jsonify({"success": True, "track": track})
     except Exception as e:
@@ -47,6 +74,23 @@ def generate_music():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/generate/stream', methods=['POST'])
+def generate_music_stream():
+    # Flask route - Server-Sent Events variant of /api/generate
+    def events():
+        try:
+            for event in company.music_agent.stream_track():
+                if "token" in event:
+                    yield _sse("token", event)
+                else:
+                    yield _sse("track", {"success": True, "track": event["track"]})
+        except Exception as e:
+            logger.error(f"Generation stream failed: {e}")
+            yield _sse("error", {"success": False, "error": str(e)})
+    
+    return _sse_response(events())
+
+
 @app.route('/api/ollama/prompt', methods=['POST'])
 def ollama_prompt():
     # Flask route
@@ -65,7 +109,9 @@ def ollama_prompt():
     
     try:
         # Direct Ollama call
-        response = llm_service.llm.invoke(prompt)
+        response = llm_service.generate(prompt, caller="prompt_route")
+        if response is None:
+            return jsonify({"success": False, "error": "Ollama generation failed"}), 502
         return jsonify({
             "success": True,
             "prompt": prompt,
@@ -76,6 +122,34 @@ def ollama_prompt():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/ollama/prompt/stream', methods=['POST'])
+def ollama_prompt_stream():
+    # Flask route - Server-Sent Events variant of /api/ollama/prompt
+    data = request.json
+    prompt = data.get('prompt', '')
+    
+    if not prompt:
+        return jsonify({"success": False, "error": "Prompt is required"}), 400
+    
+    if not llm_service.is_available():
+        return jsonify({
+            "success": False,
+            "error": "Ollama not available. Please install and start Ollama.",
+            "response": None
+        })
+    
+    def events():
+        try:
+            for token in llm_service.stream(prompt, caller="prompt_route"):
+                yield _sse("token", {"token": token})
+            yield _sse("done", {"success": True})
+        except Exception as e:
+            logger.error(f"Ollama prompt stream failed: {e}")
+            yield _sse("error", {"success": False, "error": str(e)})
+    
+    return _sse_response(events())
+
+
 @app.route('/api/marketing/create', methods=['POST'])
 def create_marketing():
     # Flask route
@@ -97,6 +171,45 @@ def create_marketing():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/marketing/templates')
+def get_marketing_templates():
+    # Flask route - ?genre=&k=
+    try:
+        k = min(int(request.args.get('k', 5)), 100)
+        templates = kb.top_marketing_templates(request.args.get('genre'), k)
+        return jsonify({"success": True, "templates": templates})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/marketing/engagement', methods=['POST'])
+def record_marketing_engagement():
+    # Flask route
+    data = request.json or {}
+    template_id = data.get('template_id')
+    
+    if not template_id or data.get('engagement') is None:
+        return jsonify({"success": False, "error": "template_id and engagement are required"}), 400
+    
+    try:
+        engagement = float(data['engagement'])
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "engagement must be a number"}), 400
+    if not math.isfinite(engagement):
+        return jsonify({"success": False, "error": "engagement must be a finite number"}), 400
+    
+    try:
+        kb.record_template_engagement(template_id, engagement, data.get('genre'))
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Recording engagement failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/twitter/schedule', methods=['POST'])
 def schedule_twitter_post():
     # Flask route
@@ -152,6 +265,34 @@ def get_posted():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/tracks')
+def get_tracks():
+    # Flask route - ?genre=&mood=&generation_method=&since=&until=&days=&limit=&offset=
+    try:
+        filters = {f: request.args.get(f) for f in ('genre', 'mood', 'generation_method')}
+        since = request.args.get('since')
+        if request.args.get('days'):
+            since = (datetime.now() - timedelta(days=float(request.args['days']))).isoformat()
+        until = request.args.get('until')
+        limit = min(int(request.args.get('limit', 50)), 500)
+        offset = int(request.args.get('offset', 0))
+        if limit < 0 or offset < 0:
+            return jsonify({"success": False, "error": "limit and offset must not be negative"}), 400
+
+        result = kb.query_tracks(filters, (since, until) if since or until else None, limit, offset)
+        return jsonify({
+            "success": True,
+            "tracks": result['tracks'],
+            "total": result['total'],
+            "limit": limit,
+            "offset": offset
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/operations/run', methods=['POST'])
 def run_operations():
     # Flask route
@@ -170,6 +311,7 @@ def get_status():
         "success": True,
         "status": {
             "ollama_available": llm_service.is_available(),
+            "llm": llm_service.get_stats(),
             "twitter_api": twitter.api_available,
             "pending_posts": len(twitter.get_pending_posts()),
             "recent_tracks": len(kb.get('recent_tracks', [])),
@@ -178,6 +320,20 @@ def get_status():
     })
 
 
+@app.route('/api/metrics')
+def get_metrics():
+    # Flask route
+    return jsonify({
+        "success": True,
+        "metrics": {
+            "generation": llm_service.get_metrics(),
+            "llm": llm_service.get_stats(),
+            "knowledge": kb.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    })
+
+
 def start_scheduler():
     # Check for scheduled posts every minute
     scheduler.add_task(